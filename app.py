@@ -1,34 +1,79 @@
 import datetime
-import firebase_admin
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import pandas as pd
 import plotly.express as px
 import streamlit as st
 from dotenv import load_dotenv
-from firebase_admin import credentials, db
-
-# Load Firebase credentials from Streamlit secrets
-firebase_creds = {
-    "type": st.secrets["firebase"]["FIREBASE_TYPE"],
-    "project_id": st.secrets["firebase"]["FIREBASE_PROJECT_ID"],
-    "private_key_id": st.secrets["firebase"]["FIREBASE_PRIVATE_KEY_ID"],
-    "private_key": st.secrets["firebase"]["FIREBASE_PRIVATE_KEY"].replace('\\n', '\n'),
-    "client_email": st.secrets["firebase"]["FIREBASE_CLIENT_EMAIL"],
-    "client_id": st.secrets["firebase"]["FIREBASE_CLIENT_ID"],
-    "auth_uri": st.secrets["firebase"]["FIREBASE_AUTH_URI"],
-    "token_uri": st.secrets["firebase"]["FIREBASE_TOKEN_URI"],
-    "auth_provider_x509_cert_url": st.secrets["firebase"]["FIREBASE_AUTH_PROVIDER_X509_CERT_URL"],
-    "client_x509_cert_url": st.secrets["firebase"]["FIREBASE_CLIENT_X509_CERT_URL"],
-}
-
-if not firebase_admin._apps:
-    cred = credentials.Certificate(firebase_creds)
-    firebase_admin.initialize_app(cred, {'databaseURL': st.secrets["firebase"]["DB_URL"]})
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+import storage
+from chunks import CHUNKED_LOG_TYPES, decode_series, series_key
+from date_index import index_path, summarize_entry
+from decimate import decimate_df
+from fetch_cache import FetchCache, is_closed_date
+from latest import LATEST_KEY, flatten_snapshot, latest_path
+from rollups import ROLLUP_LOG_TYPES, ROLLUP_TIERS, choose_tier, rollup_df
+from serializers import TIMESTAMP_FORMAT
+
+# Database: Firebase with credentials from Streamlit secrets, or the local
+# database (STORAGE_BACKEND=local, STORAGE_FILE) for running offline
+load_dotenv()
+if storage.is_initialized():
+    pass  # Streamlit reruns this script on every interaction
+elif os.getenv("STORAGE_BACKEND", storage.DEFAULT_BACKEND) == "firebase":
+    firebase_creds = {
+        "type": st.secrets["firebase"]["FIREBASE_TYPE"],
+        "project_id": st.secrets["firebase"]["FIREBASE_PROJECT_ID"],
+        "private_key_id": st.secrets["firebase"]["FIREBASE_PRIVATE_KEY_ID"],
+        "private_key": st.secrets["firebase"]["FIREBASE_PRIVATE_KEY"].replace('\\n', '\n'),
+        "client_email": st.secrets["firebase"]["FIREBASE_CLIENT_EMAIL"],
+        "client_id": st.secrets["firebase"]["FIREBASE_CLIENT_ID"],
+        "auth_uri": st.secrets["firebase"]["FIREBASE_AUTH_URI"],
+        "token_uri": st.secrets["firebase"]["FIREBASE_TOKEN_URI"],
+        "auth_provider_x509_cert_url": st.secrets["firebase"]["FIREBASE_AUTH_PROVIDER_X509_CERT_URL"],
+        "client_x509_cert_url": st.secrets["firebase"]["FIREBASE_CLIENT_X509_CERT_URL"],
+    }
+    storage.init_storage(firebase_creds, st.secrets["firebase"]["DB_URL"])
+else:
+    storage.init_storage()
 
 PC_NAMES = ["sneezy", "dopey", "bashful"]  # Centralize PC names
 DEFAULT_FRIDGE_TYPE = "BlueFors"
+PLOT_POINTS = 1000  # Auto resolution: plot the coarsest rollup tier with at least this many points
+RESOLUTIONS = ["Auto", "Raw"] + list(ROLLUP_TIERS)
+RESOLUTION_HELP = "Auto plots precomputed 1m/10m/1h means when the data is long enough"
+CHART_WIDTH_PX = 1200  # Typical width of a chart in the wide layout
+MAX_TRACE_POINTS = 2 * CHART_WIDTH_PX  # Points per trace after decimation (min/max keeps two per bucket)
+WEBGL_POINTS = 1000  # Traces with more points are drawn with WebGL (scattergl)
+DECIMATION = os.getenv("PLOT_DECIMATION", "minmax")  # "minmax" or "lttb", see decimate.py
+FETCH_THREADS = 8  # Dates of a range (or fridges of the overview) fetched at once
+STALE_MINUTES = 10  # Overview: readings older than this are flagged
 
 # --- Helper Functions ---
+@st.cache_resource
+def get_fetch_cache():
+    """The FetchCache shared by every session and rerun of the app."""
+    return FetchCache()
+
+
+def cached_fetch(func):
+    """Caches a fetch function of (fridge_name, log_date, ...) in the shared FetchCache.
+
+    All the arguments form the cache key. Results for closed dates are kept
+    until evicted; results for today are fetched again after the cache TTL.
+    """
+    @functools.wraps(func)
+    def wrapper(fridge_name, log_date, *args):
+        return get_fetch_cache().get((func.__name__, fridge_name, log_date, *args),
+                                     lambda: func(fridge_name, log_date, *args),
+                                     is_closed_date(log_date))
+    return wrapper
+
+
 def get_fridge_type(pc_name: str) -> str:
     """Gets the fridge type for a given PC name."""
     if pc_name == "dopey":
@@ -49,7 +94,7 @@ def fetch_data_from_firebase(fridge_name: str,
         data_type: "temperature", "pressure", "resistance", "flow_rate", "status", or None for all.
         channel_id:  Channel ID (e.g., "CH1") or None for all.
     """
-    ref = db.reference(f'/{fridge_name}/{log_date}')
+    ref = storage.reference(f'/{fridge_name}/{log_date}')
 
     try:
         if data_type == "status":
@@ -102,25 +147,422 @@ def fetch_data_from_firebase(fridge_name: str,
         return None
 
 
+def fetch_records_since(fridge_name: str, log_date: str, data_type: str = None, channel_id: str = None,
+                        watermarks: dict = None, start: str = None, end: str = None):
+    """Fetches the records of fetch_data_from_firebase from their series' watermark on.
+
+    watermarks maps the channel of a record (None for records without one) to
+    the timestamp to start at, inclusive; series without one start at start,
+    or are fetched in full. With end, only records up to that timestamp
+    (inclusive) are fetched. Returns a list of records, or None if the fetch
+    failed.
+    """
+    watermarks = watermarks or {}
+    ref = storage.reference(f'/{fridge_name}/{log_date}')
+    try:
+        if data_type in ("temperature", "pressure", "resistance") and channel_id is None:
+            channels = ref.child(data_type).get(shallow=True) or {}
+            queries = [(ref.child(data_type).child(channel), channel) for channel in sorted(channels)]
+        elif data_type in ("temperature", "pressure", "resistance"):
+            queries = [(ref.child(data_type).child(channel_id), channel_id)]
+        elif data_type:  # flow_rate, status
+            queries = [(ref.child(data_type), None)]
+        else:  # Triton
+            queries = [(ref, None)]
+        records = []
+        for query_ref, channel in queries:
+            query = query_ref.order_by_child('timestamp')
+            since = watermarks.get(channel) or start
+            if since:
+                query = query.start_at(since)
+            if end:
+                query = query.end_at(end)
+            records.extend(value for value in (query.get() or {}).values()
+                           if isinstance(value, dict) and 'timestamp' in value)
+        return records
+    except Exception as e:
+        st.error(f"Error fetching data from Firebase: {e}")
+        return None
+
+
+def fetch_records(fridge_name: str, log_date: str, data_type: str = None, channel_id: str = None):
+    """fetch_data_from_firebase through the shared cache.
+
+    Once the cached records of today go stale, only the records at or after
+    the latest cached timestamp of each channel are fetched and merged in.
+    """
+    cache = get_fetch_cache()
+    key = ('records', fridge_name, log_date, data_type, channel_id)
+    records, fresh = cache.lookup(key)
+    if fresh:
+        return records
+    if isinstance(records, list) and all(isinstance(record, dict) and 'timestamp' in record for record in records):
+        watermarks = {}
+        for record in records:
+            channel = record.get('channel')
+            watermarks[channel] = max(watermarks.get(channel, ''), record['timestamp'])
+        new_records = fetch_records_since(fridge_name, log_date, data_type, channel_id, watermarks)
+        if new_records is None:
+            return records  # Keep showing what we have; retried on the next rerun
+        # start_at is inclusive, so the records at each watermark come back as well
+        records = [record for record in records
+                   if record['timestamp'] < watermarks[record.get('channel')]] + new_records
+    else:
+        records = fetch_data_from_firebase(fridge_name, log_date, data_type, channel_id)
+    if records:
+        cache.store(key, records, is_closed_date(log_date))
+    return records or None
+
+
+@cached_fetch
+def fetch_window_records(fridge_name: str, log_date: str, data_type: str, start: str, end: str):
+    """Fetches the records of a date between two timestamps (inclusive), filtered by the database."""
+    return fetch_records_since(fridge_name, log_date, data_type, start=start, end=end) or None
+
+
+def records_to_df(data):
+    """Builds the DataFrame plotted for BlueFors data from fetched records, sorted by timestamp."""
+    df = pd.DataFrame(data if isinstance(data, list) else [data])
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df.sort_values('timestamp')
+
+
+@cached_fetch
+def fetch_chunks_df(fridge_name: str, log_date: str, data_type: str):
+    """Fetches a BlueFors log type stored in the chunked layout, or returns None if it is not.
+
+    The blocks are decoded straight into NumPy arrays (see chunks.py) and
+    returned as a DataFrame with the columns of records_to_df.
+    """
+    if data_type not in CHUNKED_LOG_TYPES:
+        return None
+    try:
+        data = storage.reference(f'/{fridge_name}/_chunks/{log_date}/{data_type}').get()
+    except Exception as e:
+        st.error(f"Error fetching data from Firebase: {e}")
+        return None
+    if not isinstance(data, dict) or not data:
+        return None
+    if data_type == "flow_rate":
+        times, values = decode_series(data)
+        return pd.DataFrame({'timestamp': times.astype('datetime64[ns]'), 'value': values})
+    frames = []
+    for channel, blocks in sorted(data.items()):
+        times, values = decode_series(blocks)
+        frames.append(pd.DataFrame({'timestamp': times.astype('datetime64[ns]'), 'value': values,
+                                    'channel': channel}))
+    return pd.concat(frames, ignore_index=True)
+
+
+@cached_fetch
+def get_chunk_series(fridge_name: str, log_date: str):
+    """Lists the Triton columns of a date stored in the chunked layout (empty if none are)."""
+    series = storage.reference(f'/{fridge_name}/_chunks/{log_date}').get(shallow=True)
+    return sorted(series) if isinstance(series, dict) else []
+
+
+@cached_fetch
+def fetch_chunk_series_df(fridge_name: str, log_date: str, series: str):
+    """Fetches one Triton column stored in the chunked layout as a 'Timestamp', series DataFrame."""
+    times, values = decode_series(storage.reference(f'/{fridge_name}/_chunks/{log_date}/{series}').get())
+    return pd.DataFrame({'Timestamp': times.astype('datetime64[ns]'), series: values})
+
+
+@cached_fetch
+def fetch_rollup_df(fridge_name: str, log_date: str, series: str, tier: str):
+    """Fetches the rollups of one tier of a series, or returns None if there are none.
+
+    The DataFrame has the columns of rollups.rollup_df; for a BlueFors T/P/R
+    log type, series is the log type and all its channels are returned, with
+    a 'channel' column.
+    """
+    try:
+        data = storage.reference(f'/{fridge_name}/_rollups/{tier}/{log_date}/{series}').get()
+    except Exception as e:
+        st.error(f"Error fetching data from Firebase: {e}")
+        return None
+    if not isinstance(data, dict) or not data:
+        return None
+    if series in ("temperature", "pressure", "resistance"):
+        df = pd.concat([rollup_df(buckets).assign(channel=channel) for channel, buckets in sorted(data.items())],
+                       ignore_index=True)
+    else:
+        df = rollup_df(data)
+    return df if not df.empty else None
+
+
+def select_rollup_tier(resolution: str, window_seconds: float):
+    """Returns the rollup tier to plot for a Resolution option, or None for the raw data.
+
+    For "Auto", the coarsest tier that still gives PLOT_POINTS points over the
+    time window is chosen, so narrowing the window ends up at the raw data.
+    """
+    if resolution == "Raw":
+        return None
+    if resolution != "Auto":
+        return resolution
+    return choose_tier(window_seconds, PLOT_POINTS)
+
+
 def get_log_dates(fridge_name: str):
-    """Gets all available log dates/filenames for a fridge."""
-    ref = db.reference(f'/{fridge_name}')
-    log_dates = ref.get()
+    """Gets all available log dates/filenames for a fridge, in either storage layout.
 
-    if not log_dates:
+    The list is cached for the cache TTL, as new dates only appear once a day.
+    """
+    return get_fetch_cache().get(('dates', fridge_name), lambda: fetch_log_dates(fridge_name))
+
+
+def fetch_log_dates(fridge_name: str):
+    """Lists the dates with shallow reads, so no data is downloaded.
+
+    Dates come from the top-level keys (node layout) and from the date index
+    and chunk keys, for dates that are only stored as chunks.
+    """
+    ref = storage.reference(f'/{fridge_name}')
+    keys = ref.get(shallow=True)
+
+    if not keys:
         return []  # Return an empty list if no data
-    if isinstance(log_dates, dict):
-        return sorted(log_dates.keys(),
+    if isinstance(keys, dict):
+        dates = {key for key in keys if not key.startswith('_') and key != LATEST_KEY}
+        for listing in ('_index', '_chunks'):
+            if listing in keys:
+                dates.update(ref.child(listing).get(shallow=True) or ())
+        return sorted(dates,
                       key=lambda x: x.replace("_", ""),
                       reverse=True)  # Sort
     else:
-        print(f"Unexpected data format for fridge {fridge_name}: {log_dates}")
+        print(f"Unexpected data format for fridge {fridge_name}: {keys}")
         return []  # Unexpected format.
 
 
+@cached_fetch
+def get_date_summary(fridge_name: str, log_date: str):
+    """Returns the {'count', 'first', 'last'} of a date from the date index, or None if it is not indexed."""
+    try:
+        return summarize_entry(storage.reference(index_path(fridge_name, log_date)).get())
+    except Exception as e:
+        print(f"Error reading the date index of {fridge_name}/{log_date}: {e}")
+        return None
+
+
 # --- Streamlit App ---
 
 
+def date_span(fridge_name: str, log_date: str):
+    """Returns the (first, last) Timestamps a date's data can span, or None if log_date is not a date.
+
+    This is the span in the date index, widened to whole hours (a Triton file
+    can run past midnight), or else the whole day.
+    """
+    summary = get_date_summary(fridge_name, log_date)
+    if summary:
+        first = pd.Timestamp(summary['first']).floor('h')
+        last = pd.Timestamp(summary['last']).ceil('h')
+        return first, max(last, first + pd.Timedelta(hours=1))
+    try:
+        first = pd.Timestamp(datetime.datetime.strptime(log_date, "%y-%m-%d"))
+    except ValueError:
+        return None
+    return first, first + pd.Timedelta(days=1)
+
+
+def select_window(fridge_name: str, log_date: str):
+    """Adds the time window slider for a date; returns the selected (start, end), or None."""
+    span = date_span(fridge_name, log_date)
+    if span is None:
+        return None
+    first, last = span[0].to_pydatetime(), span[1].to_pydatetime()
+    return st.sidebar.slider("Time window", min_value=first, max_value=last, value=(first, last),
+                             step=datetime.timedelta(minutes=1), format="MM-DD HH:mm",
+                             key=f"window/{fridge_name}/{log_date}/{first}/{last}",
+                             help="Narrow the window to see it at full resolution")
+
+
+def select_range(log_dates):
+    """Adds the date and time range inputs; returns (the dates in the range, oldest first, (start, end))."""
+    days = {}
+    for log_date in log_dates:
+        try:
+            days[log_date] = datetime.datetime.strptime(log_date, "%y-%m-%d").date()
+        except ValueError:
+            continue
+    if not days:
+        return [], None
+    first, last = min(days.values()), max(days.values())
+    picked = st.sidebar.date_input("Dates", value=(max(first, last - datetime.timedelta(days=3)), last),
+                                   min_value=first, max_value=last)
+    if not isinstance(picked, (tuple, list)):
+        picked = (picked,)
+    start_day, end_day = (picked[0], picked[-1]) if picked else (last, last)
+    start_time = st.sidebar.time_input("From", datetime.time(0, 0))
+    end_time = st.sidebar.time_input("To", datetime.time(23, 59))
+    window = (datetime.datetime.combine(start_day, start_time),
+              datetime.datetime.combine(end_day, end_time) + datetime.timedelta(seconds=59))
+    return sorted((log_date for log_date, day in days.items() if start_day <= day <= end_day),
+                  key=days.get), window
+
+
+def in_window(df, column, window):
+    """The rows of df whose column falls in the time window (all rows without one)."""
+    if window is None or df is None:
+        return df
+    times = pd.to_datetime(df[column])
+    return df[(times >= window[0]) & (times <= window[1])]
+
+
+def window_bounds(fridge_name: str, log_date: str, window):
+    """Returns the window as (start, end) timestamp strings if it cuts a date's span, else None."""
+    span = date_span(fridge_name, log_date)
+    if window is None or span is None or (window[0] <= span[0] and window[1] >= span[1]):
+        return None
+    return window[0].strftime(TIMESTAMP_FORMAT), window[1].strftime(TIMESTAMP_FORMAT)
+
+
+def fetch_each(load, items):
+    """Calls load(item) for each item (dates, fridges) concurrently; returns the results in order.
+
+    The worker threads are attached to the script run, so Streamlit calls
+    made while loading (errors, cache) work as in the main thread.
+    """
+    if len(items) <= 1:
+        return [load(item) for item in items]
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=min(FETCH_THREADS, len(items)),
+                            initializer=add_script_run_ctx, initargs=(None, ctx)) as executor:
+        return list(executor.map(load, items))
+
+
+def load_bluefors_day(fridge_name: str, log_date: str, data_type: str, tier: str, window):
+    """Loads one date of a BlueFors log type in the time window, or returns None if there is none.
+
+    The rollups of tier are used when given and stored, else the chunked
+    layout, else the records; when the window cuts the date, records are
+    filtered by the database. Rollup rows also have min, max and count
+    columns.
+    """
+    df = fetch_rollup_df(fridge_name, log_date, data_type, tier) if tier else None
+    if df is None:
+        df = fetch_chunks_df(fridge_name, log_date, data_type)
+    if df is None:
+        bounds = window_bounds(fridge_name, log_date, window)
+        if bounds:
+            data = fetch_window_records(fridge_name, log_date, data_type, *bounds)
+        else:
+            data = fetch_records(fridge_name, log_date, data_type)
+        if not data:
+            return None
+        df = records_to_df(data)
+    return in_window(df, 'timestamp', window)
+
+
+def get_triton_keys(fridge_name: str, log_date: str):
+    """Lists the columns of a Triton date, from the chunked layout or the records."""
+    series = get_chunk_series(fridge_name, log_date)
+    if series:
+        return series
+    data = fetch_records(fridge_name, log_date)
+    if not isinstance(data, list):
+        return []
+    return sorted(set().union(*(item for item in data if isinstance(item, dict))) - {'timestamp'})
+
+
+def load_triton_day(fridge_name: str, log_date: str, key: str, tier: str, window):
+    """Loads one date of a Triton column as a 'Timestamp', key DataFrame in the time window, or None.
+
+    Sources are tried as in load_bluefors_day.
+    """
+    series = series_key(key)
+    df = fetch_rollup_df(fridge_name, log_date, series, tier) if tier else None
+    if df is not None:
+        df = df.rename(columns={'timestamp': 'Timestamp', 'value': key})
+    elif series in get_chunk_series(fridge_name, log_date):
+        df = fetch_chunk_series_df(fridge_name, log_date, series).rename(columns={series: key})
+    else:
+        bounds = window_bounds(fridge_name, log_date, window)
+        data = fetch_window_records(fridge_name, log_date, None, *bounds) if bounds \
+            else fetch_records(fridge_name, log_date)
+        rows = [(item.get('timestamp'), item[key]) for item in (data or []) if key in item]
+        if not rows:
+            return None
+        df = pd.DataFrame(rows, columns=['Timestamp', key])
+        df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+        df = df.sort_values('Timestamp')
+    return in_window(df, 'Timestamp', window)
+
+
+def concat_days(frames, time_column):
+    """Merges per-day frames into one frame sorted by time, or returns None if there are none."""
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True).sort_values(time_column, kind='stable', ignore_index=True)
+
+
+def plot_lines(df, x, y, title, color=None, hover_data=None, labels=None):
+    """Plots a line per trace, decimated to MAX_TRACE_POINTS points; long traces are drawn with WebGL."""
+    shown = decimate_df(df, x, y, MAX_TRACE_POINTS, color, DECIMATION)
+    longest = shown.groupby(color).size().max() if color else len(shown)
+    fig = px.line(shown,
+                  x=x,
+                  y=y,
+                  color=color,
+                  hover_data=hover_data,
+                  labels=labels,
+                  render_mode="webgl" if longest > WEBGL_POINTS else "svg",
+                  title=title)
+    st.plotly_chart(fig, use_container_width=True)
+    if len(shown) < len(df):
+        st.caption(f"Showing {len(shown):,} of {len(df):,} points; narrow the time window for full resolution.")
+
+
+def fetch_latest(fridge_name: str):
+    """Fetches a fridge's latest snapshot as {series: {'value', 'timestamp'}}, cached for the cache TTL."""
+    def fetch():
+        try:
+            return flatten_snapshot(storage.reference(latest_path(fridge_name)).get())
+        except Exception as e:
+            print(f"Error fetching the latest readings of {fridge_name}: {e}")
+            return None
+    return get_fetch_cache().get(('latest', fridge_name), fetch)
+
+
+def format_age(seconds):
+    """'42 s', '5 min', '3 h' or '2 d'."""
+    for unit, length in (("d", 86400), ("h", 3600), ("min", 60)):
+        if seconds >= length:
+            return f"{seconds // length:.0f} {unit}"
+    return f"{max(seconds, 0):.0f} s"
+
+
+def overview_page():
+    """Shows the latest readings of every fridge side by side, flagging stale ones.
+
+    The snapshots of all fridges are read concurrently. Ages assume the
+    fridge PCs and the app share a time zone, as the logs are in local time.
+    """
+    st.header("Overview")
+    snapshots = fetch_each(fetch_latest, PC_NAMES)
+    now = pd.Timestamp.now()
+    for column, fridge_name, readings in zip(st.columns(len(PC_NAMES)), PC_NAMES, snapshots):
+        with column:
+            st.subheader(fridge_name)
+            if not readings:
+                st.warning("No latest readings stored for this fridge.")
+                continue
+            df = pd.DataFrame([{'series': series, 'value': reading['value'], 'timestamp': reading['timestamp']}
+                               for series, reading in sorted(readings.items())])
+            ages = (now - pd.to_datetime(df['timestamp'])).dt.total_seconds()
+            df['age'] = ages.map(format_age)
+            df['stale'] = ages > STALE_MINUTES * 60
+            newest = ages.min()
+            if newest > STALE_MINUTES * 60:
+                st.error(f"No new readings for {format_age(newest)}")
+            else:
+                st.success(f"Last reading {format_age(newest)} ago")
+            st.dataframe(df, hide_index=True, use_container_width=True)
+
+
 def main():
     st.set_page_config(page_title="Fridge Monitor", layout="wide")
     st.title("LFL Fridge Monitoring System")
@@ -128,6 +570,11 @@ def main():
     # Sidebar - Logo with link
     st.sidebar.image("lfl_logo.png", use_container_width=True)
 
+    page = st.sidebar.radio("Page", ["Fridge", "Overview"], horizontal=True)
+    if page == "Overview":
+        overview_page()
+        return
+
     # Sidebar for selecting fridge and data type
     selected_fridge = st.sidebar.selectbox("Select Fridge", PC_NAMES)
     fridge_type = get_fridge_type(selected_fridge)
@@ -138,7 +585,25 @@ def main():
         st.warning("No data found for this fridge.")
         return
 
-    selected_log_date = st.sidebar.selectbox("Select Date", log_dates)
+    view = st.sidebar.radio("View", ["Single date", "Date range"], horizontal=True)
+    if view == "Single date":
+        selected_log_date = st.sidebar.selectbox("Select Date", log_dates)
+        summary = get_date_summary(selected_fridge, selected_log_date)
+        if summary:
+            st.sidebar.caption(f"{summary['count']:,} readings, {summary['first']} to {summary['last']}")
+        resolution = st.sidebar.selectbox("Resolution", RESOLUTIONS, help=RESOLUTION_HELP)
+        days = [selected_log_date]
+        window = select_window(selected_fridge, selected_log_date)
+        title_dates = selected_log_date
+    else:
+        # One request per day in the range, fetched concurrently
+        days, window = select_range(log_dates)
+        resolution = st.sidebar.selectbox("Resolution", RESOLUTIONS, help=RESOLUTION_HELP)
+        if not days:
+            st.warning("No data in the selected date range.")
+            return
+        title_dates = days[0] if len(days) == 1 else f"{days[0]} to {days[-1]}"
+    window_seconds = (window[1] - window[0]).total_seconds() if window else 86400 * len(days)
 
     # --- Data Type and Channel Selection (Conditional) ---
     if fridge_type == "BlueFors":
@@ -147,48 +612,45 @@ def main():
         ]
         selected_data_type = st.sidebar.selectbox("Select Data Type",
                                                   data_types)
-        selected_channel = None  # No longer needed, we will process all channels
 
-        # Fetch data based on selection (no channel specified)
-        data = fetch_data_from_firebase(selected_fridge, selected_log_date,
-                                        selected_data_type, selected_channel)
+        # Fetch data based on selection (all channels): rollups if a tier
+        # applies, else from the chunked layout if a date is stored that way
+        tier = None
+        if selected_data_type in ROLLUP_LOG_TYPES:
+            tier = select_rollup_tier(resolution, window_seconds)
+        try:
+            df = concat_days(fetch_each(lambda log_date: load_bluefors_day(selected_fridge, log_date,
+                                                                          selected_data_type, tier, window),
+                                        days),
+                             'timestamp')
+        except (ValueError, KeyError) as e:
+            st.error(
+                f"Error processing timestamps: {e}. Data might be incomplete or in an unexpected format."
+            )
+            return
 
         # --- Data Display and Plotting (BlueFors) ---
-        if data:
+        if df is not None:
             st.subheader(
-                f"{selected_data_type.capitalize()} Data for {selected_fridge} ({selected_log_date})"
+                f"{selected_data_type.capitalize()} Data for {selected_fridge} ({title_dates})"
             )
-            if isinstance(data, list):
-                df = pd.DataFrame(data)
-            else:
-                df = pd.DataFrame([data])
-
-            try:
-                df['timestamp'] = pd.to_datetime(df['timestamp'])
-                df = df.sort_values('timestamp')
-            except (ValueError, KeyError) as e:
-                st.error(
-                    f"Error processing timestamps: {e}. Data might be incomplete or in an unexpected format."
-                )
-                st.dataframe(df)
-                return
+            hover_data = None
+            if 'count' in df.columns:
+                st.caption(f"{tier} means; hover for the min, max and number of readings.")
+                hover_data = ['min', 'max', 'count']
 
             # Plotting (BlueFors - All Channels)
             if selected_data_type != "status" and selected_data_type != "flow_rate":
                 if 'channel' in df.columns and 'value' in df.columns:
                     try:
                         # No need to pivot if channel is already a column
-                        fig = px.line(
-                            df,
-                            x='timestamp',
-                            y='value',
-                            color='channel',
-                            title=
-                            f"{selected_data_type.capitalize()} for All Channels"
-                        )
-                        fig.update_layout(xaxis_title="Timestamp",
-                                          yaxis_title="Value")
-                        st.plotly_chart(fig, use_container_width=True)
+                        plot_lines(df,
+                                   'timestamp',
+                                   'value',
+                                   f"{selected_data_type.capitalize()} for All Channels",
+                                   color='channel',
+                                   hover_data=hover_data,
+                                   labels={'timestamp': "Timestamp", 'value': "Value"})
                     except Exception as e:
                         st.error(
                             "Error plotting all channels. Check your data format"
@@ -204,11 +666,11 @@ def main():
 
             elif selected_data_type == "flow_rate":
                 if 'value' in df.columns:
-                    fig = px.line(df,
-                                  x='timestamp',
-                                  y='value',
-                                  title=f'{selected_data_type} over Time')
-                    st.plotly_chart(fig, use_container_width=True)
+                    plot_lines(df,
+                               'timestamp',
+                               'value',
+                               f'{selected_data_type} over Time',
+                               hover_data=hover_data)
                 else:
                     st.error(
                         "Data format does not support plotting. Missing 'value' column"
@@ -221,74 +683,33 @@ def main():
             st.write("No data available for the selected options.")
 
     elif fridge_type == "Oxford":
-        # Oxford-specific data fetching and display
-        data = fetch_data_from_firebase(selected_fridge, selected_log_date)
-
-        if data:
-            st.subheader(f"Data for {selected_fridge} ({selected_log_date})")
-
-            if isinstance(data, list):
-                data_dict = data[0]  # Oxford data is now handled consistently
-            elif isinstance(data, dict):
-                data_dict = data
-            else:
-                st.write(data)
-                return
-
-            available_keys = list(data_dict.keys())
-            available_keys_no_ts = [
-                key for key in available_keys if key != 'timestamp'
-            ]
-
-            if not available_keys_no_ts:
-                st.write("Only timestamp data available.")
-                return
-
-            selected_key = st.selectbox("Select Data to Display",
-                                        available_keys_no_ts)
-
-            display_data = []
-            timestamps = []
-
-            if isinstance(data, list):
-                for item in data:
-                    if selected_key in item:
-                        display_data.append(item[selected_key])
-                        timestamps.append(item.get('timestamp'))
-            elif isinstance(data, dict):
-                if selected_key in data:
-                    display_data.append(data[selected_key])
-                    timestamps.append(data.get('timestamp'))
-
-            # Display and Plot the selected data (Oxford)
-            if len(display_data) > 0:
-                df = pd.DataFrame({
-                    'Timestamp': timestamps,
-                    selected_key: display_data
-                })
-
-                #Convert to datetime
-                try:
-                    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-                    df = df.sort_values('Timestamp')
-                except (ValueError, KeyError) as e:
-                    st.error(
-                        f"Error processing timestamps: {e}. Data may be incomplete."
-                    )
-                    st.dataframe(df)  # Show even with errors.
-                    return
-                st.write(f"**{selected_key}:**")
-                fig = px.line(df,
-                              x='Timestamp',
-                              y=selected_key,
-                              title=f'{selected_key} over Time')
-                st.plotly_chart(fig, use_container_width=True)
-                # st.dataframe(df)  # Show as table
-            else:
-                st.write("Selected data not available in the fetched data.")
-
-        else:
+        # Columns of the first date; each date is then fetched for the selected column only
+        available_keys = get_triton_keys(selected_fridge, days[0])
+        if not available_keys:
             st.write("No data available for this fridge.")
+            return
+
+        st.subheader(f"Data for {selected_fridge} ({title_dates})")
+        selected_key = st.selectbox("Select Data to Display", available_keys)
+        tier = select_rollup_tier(resolution, window_seconds)
+        df = concat_days(fetch_each(lambda log_date: load_triton_day(selected_fridge, log_date, selected_key,
+                                                                    tier, window),
+                                    days),
+                         'Timestamp')
+        if df is None:
+            st.write("Selected data not available in the fetched data.")
+            return
+
+        st.write(f"**{selected_key}:**")
+        hover_data = None
+        if 'count' in df.columns:
+            st.caption(f"{tier} means; hover for the min, max and number of readings.")
+            hover_data = ['min', 'max', 'count']
+        plot_lines(df,
+                   'Timestamp',
+                   selected_key,
+                   f'{selected_key} over Time',
+                   hover_data=hover_data)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,4 @@
+"""Synthetic log generators and performance benchmarks.
+
+Run from the repository root with ``python -m benchmarks.run``; see run.py.
+"""
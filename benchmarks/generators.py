@@ -0,0 +1,124 @@
+import datetime
+import os
+
+import numpy as np
+
+# Typical readings of each BlueFors channel, as (temperature K, pressure mbar, resistance Ohm)
+BLUEFORS_CHANNELS = {
+    1: (45.0, 1.2e-2, 82.0),      # 50K flange
+    2: (3.2, 4.5e-3, 1250.0),     # 4K flange
+    3: (4.1, 7.0e2, 960.0),       # Magnet
+    4: (0.85, 2.0e-4, 3150.0),    # Still
+    5: (0.06, 5.0e2, 16000.0),    # Cold plate
+    6: (0.012, 1.0e1, 62000.0),   # Mixing chamber
+}
+BLUEFORS_STATUS_NAMES = ([f"v{n}" for n in range(1, 24)]
+                         + ["scroll1", "scroll2", "turbo1", "turbo2", "pulsetube", "compressor", "hs-still", "hs-mc"])
+
+TRITON_TITLES = [
+    "Time(secs)",
+    "P1 Tank (mbar)", "P2 Condense (mbar)", "P3 Still (mbar)", "P4 TurboBack (mbar)", "P5 OVC (mbar)",
+    "PT1 Head T(K)", "PT1 Plate T(K)", "PT2 Head T(K)", "PT2 Plate T(K)",
+    "Still T(K)", "Cold Plate T(K)", "MC Plate Cernox T(K)", "MC RuO2 T(K)",
+    "PT1 Plate R(Ohm)", "PT2 Plate R(Ohm)", "Still R(Ohm)", "Cold Plate R(Ohm)", "MC RuO2 R(Ohm)",
+    "Turbo Speed(Hz)", "Turbo Power(W)", "Still Heater(W)", "MC Heater(W)", "Flow(umol/s)",
+]
+_TITLE_OFFSET = 0x1800 + 32
+_DATA_OFFSET = 0x3000
+
+
+def _series(rng, count, level, noise=0.01):
+    """A slowly drifting, noisy reading around level, always positive."""
+    drift = np.cumsum(rng.normal(0.0, noise / 10, count))
+    return np.abs(level * (1 + drift + rng.normal(0.0, noise, count)))
+
+
+def _times(start, duration, interval):
+    return [start + datetime.timedelta(seconds=s) for s in np.arange(0, duration, interval).tolist()]
+
+
+def _write_lines(file_path, times, fields):
+    with open(file_path, 'w', newline='\n') as f:
+        f.writelines(f"{t.strftime('%y-%m-%d,%H:%M:%S')},{field}\n" for t, field in zip(times, fields))
+
+
+def write_bluefors_day(parent_dir, day, duration=86400, interval=60.0, status_interval=None, seed=0):
+    """Writes one BlueFors date directory ('YY-MM-DD') and returns its name.
+
+    Every channel gets T, P and R files with one reading per `interval` seconds
+    (each channel offset by a second, as the bridge scans them in turn), plus
+    Flowmeter and Channels (valve/pump status) files. Status lines are written
+    every status_interval seconds (default: interval).
+    """
+    rng = np.random.default_rng(seed)
+    log_date = day.strftime('%y-%m-%d')
+    folder = os.path.join(parent_dir, log_date)
+    os.makedirs(folder, exist_ok=True)
+    start = datetime.datetime.combine(day, datetime.time())
+
+    for channel, (temperature, pressure, resistance) in BLUEFORS_CHANNELS.items():
+        times = _times(start + datetime.timedelta(seconds=channel), duration - channel, interval)
+        for letter, level in (('T', temperature), ('P', pressure), ('R', resistance)):
+            values = _series(rng, len(times), level)
+            _write_lines(os.path.join(folder, f"CH{channel} {letter} {log_date}.log"), times,
+                         [f"{value:.6e}" for value in values.tolist()])
+
+    times = _times(start, duration, interval)
+    _write_lines(os.path.join(folder, f"Flowmeter {log_date}.log"), times,
+                 [f"{value:.6e}" for value in _series(rng, len(times), 0.55).tolist()])
+
+    # Status: date, time, a flag, then name,value pairs; a valve occasionally switches
+    times = _times(start, duration, status_interval or interval)
+    states = rng.integers(0, 2, len(BLUEFORS_STATUS_NAMES))
+    fields = []
+    for _ in times:
+        if rng.random() < 0.05:
+            states[rng.integers(len(states))] ^= 1
+        fields.append("1," + ",".join(f"{name},{state}" for name, state in zip(BLUEFORS_STATUS_NAMES, states.tolist())))
+    _write_lines(os.path.join(folder, f"Channels {log_date}.log"), times, fields)
+    return log_date
+
+
+def write_bluefors_logs(parent_dir, days=1, start_day=datetime.date(2022, 7, 20), **kwargs):
+    """Writes `days` consecutive BlueFors date directories; returns their names."""
+    return [write_bluefors_day(parent_dir, start_day + datetime.timedelta(days=n), seed=n, **kwargs)
+            for n in range(days)]
+
+
+def write_triton_vcl(parent_dir, start=datetime.datetime(2024, 1, 19, 14, 19, 20), duration=86400,
+                     interval=10.0, titles=TRITON_TITLES, seed=0):
+    """Writes a Triton .vcl file with one record per `interval` seconds; returns its path.
+
+    The file is named like the fridge software names them ('log YYMMDD HHMMSS.vcl').
+    Titles are 32-byte names from offset 0x1820; records start at 0x3000, each
+    its size in bytes followed by one little-endian double per title.
+    """
+    rng = np.random.default_rng(seed)
+    file_path = os.path.join(parent_dir, f"log {start.strftime('%y%m%d %H%M%S')}.vcl")
+    count = int(np.ceil(duration / interval))
+    records = np.empty((count, len(titles) + 1), dtype='<f8')
+    records[:, 0] = 8 * (len(titles) + 1)
+    records[:, 1] = start.timestamp() + interval * np.arange(count)
+    for column, title in enumerate(titles[1:], start=2):
+        if "(mbar)" in title:
+            level = 10 ** rng.uniform(-6, 3)
+        elif "T(K)" in title:
+            level = 10 ** rng.uniform(-2, 1.7)
+        elif "R(Ohm)" in title:
+            level = 10 ** rng.uniform(2, 4.5)
+        else:
+            level = rng.uniform(0, 1000)
+        records[:, column] = _series(rng, count, level)
+    # Heaters and the turbo are off part of the time, which the uploaders leave out
+    for column, title in enumerate(titles[1:], start=2):
+        if "Heater" in title or "Turbo" in title:
+            records[rng.random(count) < 0.3, column] = 0.0
+
+    with open(file_path, 'wb') as f:
+        f.write(b'\0' * _TITLE_OFFSET)
+        for title in titles:
+            f.write(title.encode('ascii')[:32].ljust(32, b'\0'))
+        f.write(b'\0' * (_DATA_OFFSET - f.tell()))
+        f.write(records.tobytes())
+    return file_path
+
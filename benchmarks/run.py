@@ -0,0 +1,257 @@
+"""Runs the benchmarks and writes the timings as JSON.
+
+Usage, from the repository root:
+
+    python -m benchmarks.run                           # one day of logs, results in benchmark_results.json
+    python -m benchmarks.run --quick                   # two hours of logs, for a fast check
+    python -m benchmarks.run --output new.json --compare old.json
+
+Each benchmark is timed `--repeat` times on freshly generated synthetic logs
+(see generators.py); the JSON records the minimum, median and mean time,
+the number of items processed and the commit and library versions, so runs
+from different commits can be compared with --compare.
+"""
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import storage
+from benchmarks.generators import write_bluefors_logs, write_triton_vcl
+from decimate import METHODS, decimate_df
+from parquet_cache import ParquetCache, cache_enabled
+from parsers import parse, parse_mmap
+from reader import BlueForsLogReader, DayIndex, TritonLogReader
+from ring_buffer import RecentReadings
+from rollups import serialize_rollups_bluefors
+from serializers import serialize_bluefors, serialize_triton
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(func, repeat):
+    """Calls func() repeat times (after one warm-up call); returns (timings, last result)."""
+    result = func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def summarize(timings, items):
+    median = statistics.median(timings)
+    return {
+        'min_s': min(timings),
+        'median_s': median,
+        'mean_s': statistics.fmean(timings),
+        'repeat': len(timings),
+        'items': items,
+        'items_per_s': items / median if items and median else None,
+    }
+
+
+def _count(result):
+    if isinstance(result, tuple):  # parse() returns (titles, data), parse_mmap() (titles, data, offset)
+        return int(np.shape(result[1])[-1]) if len(result[1]) else 0
+    if isinstance(result, (pd.DataFrame, dict, list, DayIndex)):
+        return len(result)
+    return None
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_fallback_parsers():
+    """Loads a separate copy of parsers.py with NumPy blocked, i.e. its pure-Python implementation."""
+    spec = importlib.util.spec_from_file_location("parsers_fallback", os.path.join(REPO_ROOT, "parsers.py"))
+    module = importlib.util.module_from_spec(spec)
+    numpy = sys.modules.get('numpy')
+    sys.modules['numpy'] = None  # Makes 'import numpy' raise ImportError
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        sys.modules['numpy'] = numpy
+    return module
+
+
+def bluefors_benchmarks(log_dir, log_date):
+    """Yields (name, function) pairs over one BlueFors date directory."""
+    log_reader = BlueForsLogReader(log_dir, cache=False)
+    for log_type in ["temperature", "pressure", "resistance", "flow_rate", "status"]:
+        yield f"bluefors_get_logs_{log_type}", lambda log_type=log_type: log_reader.get_logs(log_date, log_type)
+    if cache_enabled():
+        # The warm-up call fills the cache; the timed calls read it back
+        cached_reader = BlueForsLogReader(log_dir, cache=ParquetCache(os.path.join(log_dir, "_cache"), "bench", 0))
+        for log_type in ["temperature", "flow_rate"]:
+            yield (f"bluefors_get_logs_{log_type}_cached",
+                   lambda log_type=log_type: cached_reader.get_logs(log_date, log_type))
+    yield "bluefors_get_latest_entry", lambda: log_reader.get_latest_entry(log_date)
+    yield "bluefors_get_latest_status", lambda: log_reader.get_latest_status(log_date)
+    yield "bluefors_day_index", lambda: log_reader.day_index(log_date)
+    day = log_reader.day_index(log_date)
+    yield "day_index_range", lambda: day.range("temperature/CH6", f"20{log_date} 00:30:00", f"20{log_date} 01:30:00")
+    yield "day_index_resample", lambda: day.resample("temperature/CH6", 60)
+    for log_type in ["temperature", "flow_rate", "status"]:
+        df = log_reader.get_logs(log_date, log_type)
+        yield (f"serialize_bluefors_{log_type}",
+               lambda df=df, log_type=log_type: serialize_bluefors(df, log_type, f"bench/{log_date}"))
+    df = log_reader.get_logs(log_date, "temperature")
+    yield "serialize_rollups_temperature", lambda: serialize_rollups_bluefors(df, "temperature", f"bench/{log_date}")
+
+
+def triton_benchmarks(vcl_path):
+    """Yields (name, function) pairs over one Triton .vcl file."""
+    yield "triton_parse", lambda: parse(vcl_path)
+    yield "triton_parse_mmap", lambda: parse_mmap(vcl_path)
+    fallback = load_fallback_parsers()
+    yield "triton_parse_fallback", lambda: fallback.parse(vcl_path)
+    yield "triton_parse_mmap_fallback", lambda: fallback.parse_mmap(vcl_path)
+    yield "triton_get_df", lambda: TritonLogReader(vcl_path).get_df()
+    df = TritonLogReader(vcl_path).get_df()
+    yield "serialize_triton", lambda: serialize_triton(df, "bench/24-01-19")
+
+
+def monitor_benchmarks(log_dir, log_date):
+    """Yields (name, function) pairs for the live monitor's ring buffers, over one channel of a date."""
+    df = BlueForsLogReader(log_dir, cache=False).get_logs(log_date, "temperature")
+    df = df[df['channel'] == 6]
+    yield "ring_buffer_add", lambda: RecentReadings().add("temperature/CH6", df['timestamp'], df['value'])
+    recent = RecentReadings()
+    recent.add("temperature/CH6", df['timestamp'], df['value'])
+    yield "ring_buffer_metrics", lambda: recent.metrics("temperature/CH6")
+
+
+def app_benchmarks(log_dir, log_date, vcl_path):
+    """Yields (name, function) pairs for the web app reading from a local in-memory database.
+
+    Skipped (with a message) when the app cannot be imported, e.g. without streamlit.
+    """
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ["STORAGE_FILE"] = ":memory:"
+    try:
+        import app
+    except ImportError as e:
+        print(f"Skipping the app benchmarks: {e}")
+        return
+    if not isinstance(storage._storage, storage.LocalStorage):
+        print("Skipping the app benchmarks: the app is not using the local database")
+        return
+
+    log_reader = BlueForsLogReader(log_dir, cache=False)
+    payloads = {}
+    for log_type in ["temperature", "flow_rate"]:
+        payloads.update(serialize_bluefors(log_reader.get_logs(log_date, log_type), log_type, f"bench/{log_date}"))
+    payloads.update(serialize_triton(TritonLogReader(vcl_path).get_df(), "dopey/24-01-19"))
+    storage.reference('/').update(payloads)
+
+    yield "app_fetch_temperature", lambda: app.fetch_data_from_firebase("bench", log_date, "temperature")
+    records = app.fetch_data_from_firebase("bench", log_date, "temperature")
+    yield "app_records_to_df_temperature", lambda: app.records_to_df(records)
+    yield "app_fetch_flow_rate", lambda: app.fetch_data_from_firebase("bench", log_date, "flow_rate")
+    yield "app_fetch_triton", lambda: app.fetch_data_from_firebase("dopey", "24-01-19")
+    df = app.records_to_df(records)
+    for method in METHODS:
+        yield (f"decimate_{method}_temperature",
+               lambda method=method: decimate_df(df, 'timestamp', 'value', app.MAX_TRACE_POINTS, 'channel', method))
+
+
+def run(duration, bluefors_interval, triton_interval, repeat, only=None):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"Generating {duration / 3600:g} h of logs in {tmp_dir}...")
+        log_date = write_bluefors_logs(tmp_dir, days=1, duration=duration, interval=bluefors_interval)[0]
+        vcl_path = write_triton_vcl(tmp_dir, duration=duration, interval=triton_interval)
+
+        benchmarks = [bluefors_benchmarks(tmp_dir, log_date), triton_benchmarks(vcl_path),
+                      monitor_benchmarks(tmp_dir, log_date), app_benchmarks(tmp_dir, log_date, vcl_path)]
+        for group in benchmarks:
+            for name, func in group:
+                if only and not any(pattern in name for pattern in only):
+                    continue
+                timings, result = measure(func, repeat)
+                results[name] = summarize(timings, _count(result))
+                print(f"{name:36s} median {results[name]['median_s'] * 1000:10.2f} ms"
+                      f"  ({results[name]['items']} items)")
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    """Prints the change of each median against a previous results file; returns the regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    regressions = []
+    for name, result in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            print(f"{name:36s} new")
+            continue
+        ratio = result['median_s'] / previous['median_s']
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  SLOWER"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{name:36s} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default='benchmark_results.json', help="JSON file to write the results to")
+    parser.add_argument('--quick', action='store_true', help="Use two hours of logs instead of a day")
+    parser.add_argument('--duration', type=float, help="Hours of logs to generate (default 24)")
+    parser.add_argument('--bluefors-interval', type=float, default=10.0, help="Seconds between BlueFors readings")
+    parser.add_argument('--triton-interval', type=float, default=10.0, help="Seconds between Triton records")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per benchmark")
+    parser.add_argument('--only', nargs='*', help="Run only the benchmarks whose name contains one of these")
+    parser.add_argument('--compare', help="Previous results file to compare with")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Relative slowdown reported as a regression by --compare (default 0.1)")
+    args = parser.parse_args(argv)
+
+    duration = 3600 * (args.duration or (2 if args.quick else 24))
+    results = run(duration, args.bluefors_interval, args.triton_interval, args.repeat, args.only)
+    output = {
+        'meta': {
+            'commit': _git_commit(),
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'duration_s': duration,
+            'bluefors_interval_s': args.bluefors_interval,
+            'triton_interval_s': args.triton_interval,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
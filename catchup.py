@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_BATCH = 20000  # Readings uploaded per cycle while catching up
+DEFAULT_MAX_PENDING = 200000  # Outbox writes still to send before catching up waits
+DEFAULT_INTERVAL = 1.0  # Seconds between cycles while catching up
+
+# Catch-up
+# --------
+# The monitor uploads every line of the logs, not only the latest reading.
+# On its first cycle for a date (or Triton file) it reads the files from the
+# start and keeps the readings newer than the manifest watermark of their
+# channel: after an outage, that is everything written while it was down.
+# Dates (or files) between the last one in the manifest and the current one
+# are uploaded through the backfill (upload_all_logs.upload_with_manifest),
+# one per cycle, once the current one has caught up.
+#
+# A long outage leaves a large backlog, so it is uploaded in batches of
+# CATCHUP_BATCH readings, oldest first across channels, every
+# CATCHUP_INTERVAL seconds, and not at all while the outbox has more than
+# CATCHUP_MAX_PENDING writes left to send (so the outbox cap is not reached
+# and new readings are not stuck behind the whole backlog). When the backlog
+# is empty the monitor is back to tailing the files, a few lines per cycle.
+
+
+def catchup_interval():
+    """Seconds between cycles while there is a backlog, from CATCHUP_INTERVAL."""
+    return float(os.getenv("CATCHUP_INTERVAL", DEFAULT_INTERVAL))
+
+
+def missed_sources(recorded, sources, current):
+    """Returns the sources (dates or files) from the last recorded one up to, not including, current.
+
+    recorded and sources are sorted names; nothing is missed without a
+    recorded source (a new installation, where the backfill is run by hand).
+    """
+    if not recorded:
+        return []
+    return [source for source in sources if recorded[-1] <= source < current]
+
+
+class Backlog:
+    """Readings read from the logs but not uploaded yet, handed out oldest first.
+
+    Readings are kept per key (e.g. (date, log_type, channel)) as DataFrames
+    with a timestamp column, in time order. The batch size and the outbox
+    bound default to the CATCHUP_BATCH and CATCHUP_MAX_PENDING environment
+    variables.
+    """
+
+    def __init__(self, batch_size=None, max_pending=None):
+        self.batch_size = batch_size or int(os.getenv("CATCHUP_BATCH", DEFAULT_BATCH))
+        self.max_pending = max_pending or int(os.getenv("CATCHUP_MAX_PENDING", DEFAULT_MAX_PENDING))
+        self._frames = {}
+
+    def __len__(self):
+        return sum(len(df) for df in self._frames.values())
+
+    def add(self, key, df):
+        if df.empty:
+            return
+        queued = self._frames.get(key)
+        self._frames[key] = df if queued is None else pd.concat([queued, df], ignore_index=True)
+
+    def take(self, pending=0):
+        """Returns {key: DataFrame} of about batch_size of the oldest readings.
+
+        Returns {} while the writer has more than max_pending writes to send.
+        Readings sharing the cut-off timestamp all go in the same batch.
+        """
+        if not self._frames or pending > self.max_pending:
+            return {}
+        if len(self) <= self.batch_size:
+            taken, self._frames = self._frames, {}
+            return taken
+        timestamps = np.concatenate([df['timestamp'].to_numpy(dtype='datetime64[ns]') for df in self._frames.values()])
+        cutoff = np.partition(timestamps, self.batch_size - 1)[self.batch_size - 1]
+        taken = {}
+        for key, df in list(self._frames.items()):
+            count = int(np.searchsorted(df['timestamp'].to_numpy(dtype='datetime64[ns]'), cutoff, 'right'))
+            if not count:
+                continue
+            taken[key] = df.iloc[:count]
+            if count == len(df):
+                del self._frames[key]
+            else:
+                self._frames[key] = df.iloc[count:].reset_index(drop=True)
+        return taken
@@ -0,0 +1,328 @@
+import argparse
+import base64
+import calendar
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+import storage
+from db_writer import BatchWriter
+from serializers import KEY_FORMAT, series_key, triton_timestamps
+
+DEFAULT_LAYOUT = "nodes"
+LAYOUTS = ("nodes", "chunks", "both")
+DEFAULT_CHUNK_MINUTES = 10
+CHUNKED_LOG_TYPES = ["temperature", "pressure", "resistance", "flow_rate"]
+
+# Chunked layout
+# --------------
+# Instead of one node per sample, each series (a BlueFors log type and channel,
+# or a Triton column) is split into fixed time blocks:
+#
+#   /{pc}/_chunks/{date}/{type}/{CHn}/{block}   (BlueFors T/P/R)
+#   /{pc}/_chunks/{date}/flow_rate/{block}      (BlueFors flowmeter)
+#   /{pc}/_chunks/{date}/{column}/{block}       (Triton)
+#
+# where {block} is the block start as a node key ('2022-07-20_10_00_00'). A
+# block holds segments 's{offset}': {'t': int32 offsets in seconds from the
+# block start, 'v': float64 values}, both little-endian and base64-encoded,
+# and single points 'p{offset}': value appended by the live monitor until the
+# block is compacted into a segment. Readers merge all of them by time.
+
+
+def storage_layout():
+    """Returns the layout written by the uploaders: STORAGE_LAYOUT, "nodes" by default."""
+    layout = os.getenv("STORAGE_LAYOUT", DEFAULT_LAYOUT)
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown STORAGE_LAYOUT {layout!r}, expected one of {', '.join(LAYOUTS)}")
+    return layout
+
+
+def chunk_seconds():
+    """Returns the length of a block in seconds, from CHUNK_MINUTES."""
+    return int(float(os.getenv("CHUNK_MINUTES", DEFAULT_CHUNK_MINUTES)) * 60)
+
+
+def chunks_path(base_path):
+    """Returns the chunk path of a '{pc}/{date}' base path of the node layout."""
+    pc, log_date = base_path.strip('/').split('/', 1)
+    return f"{pc}/_chunks/{log_date}"
+
+
+def _to_seconds(timestamps):
+    """Naive timestamps as int64 seconds, counted as if they were UTC."""
+    return pd.to_datetime(pd.Series(timestamps)).to_numpy(dtype='datetime64[s]').astype(np.int64)
+
+
+def _block_key(block_start):
+    return pd.Timestamp(int(block_start), unit='s').strftime(KEY_FORMAT)
+
+
+def _block_start(block_key):
+    return calendar.timegm(datetime.datetime.strptime(block_key, KEY_FORMAT).timetuple())
+
+
+# --- Encoding ---
+
+def encode_segment(offsets, values):
+    return {
+        't': base64.b64encode(np.asarray(offsets, dtype='<i4').tobytes()).decode('ascii'),
+        'v': base64.b64encode(np.asarray(values, dtype='<f8').tobytes()).decode('ascii'),
+    }
+
+
+def serialize_series(series_path, timestamps, values, block_seconds=None):
+    """Builds {segment path: segment} writes of one series, one segment per block.
+
+    A segment is keyed by the offset of its first sample, so uploading the same
+    rows again overwrites the same segments.
+    """
+    block_seconds = block_seconds or chunk_seconds()
+    seconds = _to_seconds(timestamps)
+    values = np.asarray(values, dtype=float)
+    keep = ~np.isnan(values)
+    seconds, values = seconds[keep], values[keep]
+    if seconds.size == 0:
+        return {}
+    order = np.argsort(seconds, kind='stable')
+    seconds, values = seconds[order], values[order]
+    block_starts = seconds - seconds % block_seconds
+    starts, first_rows = np.unique(block_starts, return_index=True)
+    payloads = {}
+    for block_start, rows in zip(starts.tolist(), np.split(np.arange(seconds.size), first_rows[1:])):
+        offsets = seconds[rows] - block_start
+        payloads[f"{series_path}/{_block_key(block_start)}/s{offsets[0]}"] = encode_segment(offsets, values[rows])
+    return payloads
+
+
+def serialize_chunks_bluefors(df, log_type, base_path, block_seconds=None):
+    """Chunked counterpart of serializers.serialize_bluefors, for the T/P/R and flow rate logs."""
+    if df.empty or log_type not in CHUNKED_LOG_TYPES:
+        return {}
+    base = chunks_path(base_path)
+    if log_type == "flow_rate":
+        return serialize_series(f"{base}/flow_rate", df['timestamp'], df['flow_rate'], block_seconds)
+    payloads = {}
+    for channel, channel_df in df.groupby('channel'):
+        payloads.update(serialize_series(f"{base}/{log_type}/CH{channel}", channel_df['timestamp'],
+                                         channel_df['value'], block_seconds))
+    return payloads
+
+
+def serialize_chunks_triton(df, base_path, block_seconds=None):
+    """Chunked counterpart of serializers.serialize_triton; zero readings are left out as there."""
+    seconds = pd.to_numeric(df['Time(secs)'], errors='coerce')
+    df = df[seconds.notna()]
+    if df.empty:
+        return {}
+    base = chunks_path(base_path)
+    timestamps = triton_timestamps(df['Time(secs)'].to_numpy())
+    payloads = {}
+    for column in df.columns:
+        if column == 'Time(secs)':
+            continue
+        values = df[column].to_numpy(dtype=float)
+        keep = values != 0
+        payloads.update(serialize_series(f"{base}/{series_key(column)}", timestamps[keep], values[keep],
+                                         block_seconds))
+    return payloads
+
+
+# --- Decoding ---
+
+def decode_series(blocks):
+    """Decodes {block key: block} of one series into (datetime64[s] times, float64 values).
+
+    Samples are sorted by time; when a time appears more than once (a point
+    that was also compacted into a segment), the last one read is kept.
+    """
+    times, values = [], []
+    for block_key, block in (blocks or {}).items():
+        if not isinstance(block, dict):
+            continue
+        block_start = _block_start(block_key)
+        point_offsets, point_values = [], []
+        for key, item in block.items():
+            if key.startswith('s') and isinstance(item, dict):
+                times.append(block_start + np.frombuffer(base64.b64decode(item['t']), dtype='<i4').astype(np.int64))
+                values.append(np.frombuffer(base64.b64decode(item['v']), dtype='<f8'))
+            elif key.startswith('p'):
+                point_offsets.append(int(key[1:]))
+                point_values.append(float(item))
+        if point_offsets:
+            times.append(block_start + np.array(point_offsets, dtype=np.int64))
+            values.append(np.array(point_values, dtype=float))
+    if not times:
+        return np.empty(0, dtype='datetime64[s]'), np.empty(0)
+    times, values = np.concatenate(times), np.concatenate(values)
+    # Sort by time, keeping the last of equal times
+    order = np.lexsort((np.arange(times.size), times))
+    times, values = times[order], values[order]
+    last = np.append(times[1:] != times[:-1], True)
+    return times[last].astype('datetime64[s]'), values[last]
+
+
+# --- Live appends ---
+
+class ChunkAppender:
+    """Appends live readings to the open block of each series through a writer.
+
+    Each reading is one small 'p{offset}' write, and each append_many call
+    one segment per block. When a series moves on to a new block, the open
+    block is rewritten as a single segment, and the points and segments this
+    appender wrote to it are deleted in the same batch. Points written before
+    a restart are left as they are; readers merge them anyway.
+    """
+
+    def __init__(self, writer, block_seconds=None):
+        self.writer = writer
+        self.block_seconds = block_seconds or chunk_seconds()
+        self._open = {}  # series path -> _OpenBlock
+
+    def _open_block(self, series_path, block_start):
+        """Returns the open block of a series starting at block_start, compacting the previous one."""
+        open_block = self._open.get(series_path)
+        if open_block is not None and open_block.start != block_start:
+            self._compact(series_path, open_block)
+            open_block = None
+        if open_block is None:
+            open_block = self._open[series_path] = _OpenBlock(block_start)
+        return open_block
+
+    def append(self, series_path, timestamp, value):
+        seconds = int(_to_seconds([timestamp])[0])
+        open_block = self._open_block(series_path, seconds - seconds % self.block_seconds)
+        offset = seconds - open_block.start
+        self.writer.set(f"{series_path}/{_block_key(open_block.start)}/p{offset}", float(value))
+        open_block.offsets.append(offset)
+        open_block.values.append(float(value))
+        open_block.points.add(offset)
+
+    def append_many(self, series_path, timestamps, values):
+        """Appends readings in time order (e.g. a catch-up) as one segment per block instead of a point each.
+
+        The readings of the open block and of the last block are kept with
+        it, so its compaction includes them and replaces their segments.
+        """
+        seconds = _to_seconds(timestamps)
+        values = np.asarray(values, dtype=float)
+        keep = ~np.isnan(values)
+        seconds, values = seconds[keep], values[keep]
+        if not seconds.size:
+            return
+        self.writer.update(serialize_series(series_path, seconds.astype('datetime64[s]'), values,
+                                            self.block_seconds))
+        block_starts = seconds - seconds % self.block_seconds
+        open_block = self._open.get(series_path)
+        for block_start in dict.fromkeys(block_starts.tolist()):
+            if block_start != block_starts[-1] and (open_block is None or block_start != open_block.start):
+                continue  # Complete, written as one segment
+            in_block = block_starts == block_start
+            open_block = self._open_block(series_path, block_start)
+            offsets = (seconds[in_block] - block_start).tolist()
+            open_block.segments.add(offsets[0])
+            open_block.offsets.extend(offsets)
+            open_block.values.extend(values[in_block].tolist())
+
+    def _compact(self, series_path, open_block):
+        block_path = f"{series_path}/{_block_key(open_block.start)}"
+        order = np.argsort(open_block.offsets, kind='stable')
+        offsets, values = np.asarray(open_block.offsets)[order], np.asarray(open_block.values)[order]
+        self.writer.set(f"{block_path}/s{offsets[0]}", encode_segment(offsets, values))
+        for offset in open_block.segments - {int(offsets[0])}:
+            self.writer.set(f"{block_path}/s{offset}", None)
+        for offset in open_block.points:
+            self.writer.set(f"{block_path}/p{offset}", None)
+
+    def compact_all(self):
+        """Compacts every open block, e.g. when the monitor moves on to a new date."""
+        for series_path, open_block in self._open.items():
+            self._compact(series_path, open_block)
+        self._open = {}
+
+
+class _OpenBlock:
+    """The readings a ChunkAppender wrote to a block, and the keys they were written under."""
+
+    def __init__(self, start):
+        self.start = start
+        self.offsets = []
+        self.values = []
+        self.points = set()  # Offsets written as 'p{offset}'
+        self.segments = set()  # Offsets written as 's{offset}'
+
+
+# --- Migration from the node layout ---
+
+def _records(data):
+    return [record for record in (data or {}).values() if isinstance(record, dict) and 'timestamp' in record]
+
+
+def migrate_date(pc, log_date, writer, fridge_type="BlueFors", delete=False, block_seconds=None):
+    """Writes the chunks of one date stored in the node layout; returns the number of samples.
+
+    With delete=True, the date's nodes (except status, which is not chunked)
+    are removed once the chunks are written.
+    """
+    base_path = f"{pc}/{log_date}"
+    payloads = {}
+    if fridge_type == "Oxford":
+        df = pd.DataFrame(_records(storage.reference(base_path).get()))
+        if not df.empty:
+            timestamps = pd.to_datetime(df.pop('timestamp'))
+            for column in df.columns:
+                values = pd.to_numeric(df[column], errors='coerce')
+                present = values.notna()
+                payloads.update(serialize_series(f"{chunks_path(base_path)}/{series_key(column)}",
+                                                 timestamps[present], values[present], block_seconds))
+    else:
+        for log_type in CHUNKED_LOG_TYPES:
+            data = storage.reference(f"{base_path}/{log_type}").get()
+            if log_type == "flow_rate":
+                series = {"flow_rate": _records(data)}
+            else:
+                series = {f"{log_type}/{channel}": _records(records) for channel, records in (data or {}).items()}
+            for series_name, records in series.items():
+                if records:
+                    df = pd.DataFrame(records)
+                    payloads.update(serialize_series(f"{chunks_path(base_path)}/{series_name}",
+                                                     df['timestamp'], pd.to_numeric(df['value'], errors='coerce'),
+                                                     block_seconds))
+    writer.update(payloads)
+    if not writer.flush():
+        print(f"Writing the chunks of {base_path} failed; the nodes are kept")
+        return 0
+    if delete:
+        if fridge_type == "Oxford":
+            status = None
+        else:
+            status = storage.reference(f"{base_path}/status").get()
+        storage.reference(base_path).set({'status': status} if status else None)
+    return sum(len(np.frombuffer(base64.b64decode(segment['t']), dtype='<i4')) for segment in payloads.values())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Copies data stored one node per sample into the chunked layout.")
+    parser.add_argument('pc', help="Fridge PC name, e.g. sneezy")
+    parser.add_argument('dates', nargs='*', help="Dates to migrate (default: all)")
+    parser.add_argument('--oxford', action='store_true', help="The fridge is an Oxford/Triton system")
+    parser.add_argument('--delete', action='store_true', help="Delete the per-sample nodes once migrated")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    storage.init_storage(os.getenv('CRED_FILE'), os.getenv('DB_URL'))
+
+    dates = args.dates or sorted(key for key in (storage.reference(args.pc).get(shallow=True) or {})
+                                 if not key.startswith('_') and key != "latest")  # See latest.py
+    writer = BatchWriter()
+    for log_date in dates:
+        count = migrate_date(args.pc, log_date, writer, "Oxford" if args.oxford else "BlueFors", args.delete)
+        print(f"{args.pc}/{log_date}: {count} samples written as chunks")
+    writer.report()
+
+
+if __name__ == "__main__":
+    main()
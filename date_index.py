@@ -0,0 +1,99 @@
+import pandas as pd
+
+from chunks import series_key
+from serializers import TIMESTAMP_FORMAT, triton_timestamps
+
+# Date index
+# ----------
+# The uploaders keep a small summary of every date next to the data:
+#
+#   /{pc}/_index/{date}/{source}: {'count', 'first', 'last'}
+#
+# where {source} is the BlueFors log type ('temperature', 'flow_rate', ...)
+# or the Triton file the date's records come from, 'count' the number of
+# readings stored (one per row of a BlueFors log, one per Triton record) and
+# 'first'/'last' their first and last timestamp. A shallow read of _index
+# lists the dates without downloading any data.
+
+
+def index_path(pc, log_date=None):
+    """Returns /{pc}/_index, or the index entry of one date."""
+    return f"{pc}/_index/{log_date}" if log_date else f"{pc}/_index"
+
+
+def _entry(timestamps):
+    return {
+        'count': int(len(timestamps)),
+        'first': timestamps.min().strftime(TIMESTAMP_FORMAT),
+        'last': timestamps.max().strftime(TIMESTAMP_FORMAT),
+    }
+
+
+def serialize_index_bluefors(df, log_type, base_path):
+    """Builds the index write of one BlueFors log type from all the rows of its date.
+
+    As the entry is recomputed from the whole log, uploading a date again
+    (or only its new rows) leaves it exact.
+    """
+    if log_type != "status":
+        df = df[df['flow_rate' if log_type == "flow_rate" else 'value'].notna()]
+    if df.empty:
+        return {}
+    pc, log_date = base_path.strip('/').split('/', 1)
+    return {f"{index_path(pc, log_date)}/{log_type}": _entry(df['timestamp'])}
+
+
+def serialize_index_triton(df, base_path, file_name):
+    """Builds the index write of one Triton file from all its records.
+
+    Records with only zero or NaN readings are not counted, as they are not
+    uploaded.
+    """
+    seconds = pd.to_numeric(df['Time(secs)'], errors='coerce')
+    readings = df.drop(columns=['Time(secs)'])
+    df = df[seconds.notna() & (readings.notna() & (readings != 0)).any(axis=1)]
+    if df.empty:
+        return {}
+    pc, log_date = base_path.strip('/').split('/', 1)
+    timestamps = pd.Series(triton_timestamps(df['Time(secs)'].to_numpy()))
+    return {f"{index_path(pc, log_date)}/{series_key(file_name)}": _entry(timestamps)}
+
+
+class IndexWriter:
+    """Keeps the date index up to date for live readings, through a writer.
+
+    The entry of each (date, source) is kept in memory and rewritten with
+    every reading. Nothing is read back from the database: after a start,
+    the monitor also counts the readings it had already uploaded (see
+    log_to_db.restore_bluefors), so the entry is rebuilt from the logs.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self._entries = {}  # entry path -> {'count', 'first', 'last'}
+
+    def add(self, base_path, source, timestamps):
+        """Counts readings of one source, given their timestamp strings."""
+        if not timestamps:
+            return
+        pc, log_date = base_path.strip('/').split('/', 1)
+        path = f"{index_path(pc, log_date)}/{series_key(source)}"
+        entry = self._entries.get(path)
+        if entry is None:
+            entry = self._entries[path] = {'count': 0, 'first': min(timestamps), 'last': max(timestamps)}
+        entry['count'] += len(timestamps)
+        entry['first'] = min(entry['first'], min(timestamps))
+        entry['last'] = max(entry['last'], max(timestamps))
+        self.writer.set(path, dict(entry))
+
+
+def summarize_entry(entry):
+    """Sums the per-source index entries of one date into {'count', 'first', 'last'}, or None."""
+    sources = [source for source in (entry or {}).values() if isinstance(source, dict) and 'count' in source]
+    if not sources:
+        return None
+    return {
+        'count': sum(source['count'] for source in sources),
+        'first': min(source['first'] for source in sources),
+        'last': max(source['last'] for source in sources),
+    }
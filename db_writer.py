@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import storage
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_BATCH_SECONDS = 5.0
+
+
+class BatchWriter:
+    """Groups single-node writes into multi-path update() calls.
+
+    Each set(path, value) is queued under its full path (e.g.
+    'sneezy/22-07-20/temperature/CH1/2022-07-20_10_00_00'). The queue is sent
+    as one update() on the root reference once it holds batch_size paths, or
+    when a write arrives more than max_delay seconds after the oldest queued one.
+    Call flush() (or use the writer as a context manager) to send the rest.
+    The limits default to the UPLOAD_BATCH_SIZE and UPLOAD_BATCH_SECONDS
+    environment variables.
+
+    With max_workers > 1, full batches are sent from a thread pool while the
+    caller keeps queueing; at most 2 * max_workers batches are in flight, so
+    set() blocks instead of buffering without limit when uploads fall behind.
+    """
+
+    def __init__(self, ref=None, batch_size=None, max_delay=None, max_workers=1):
+        self.ref = ref if ref is not None else storage.reference('/')
+        self.batch_size = batch_size or int(os.getenv("UPLOAD_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+        self.max_delay = max_delay if max_delay is not None else float(
+            os.getenv("UPLOAD_BATCH_SECONDS", DEFAULT_BATCH_SECONDS))
+        self.pending = {}
+        self.first_pending_time = None
+        self.batches_sent = 0
+        self.points_sent = 0
+        self.failed_batches = []  # (number of points, first path, exception) per failed batch
+        self._failures_seen = 0  # len(failed_batches) at the end of the previous flush
+        self._batches_dispatched = 0  # Batches are numbered in dispatch order from 0
+        self._finished = set()  # Numbers of the batches sent or failed
+        self._failed = set()  # Numbers of the batches that failed
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers) if max_workers > 1 else None
+        self._slots = threading.BoundedSemaphore(2 * max_workers)
+        self._in_flight = set()
+
+    def set(self, path, value):
+        """Queues value to be written at path, flushing if a limit is reached."""
+        if not self.pending:
+            self.first_pending_time = time.monotonic()
+        self.pending[path.strip('/')] = value
+        if (len(self.pending) >= self.batch_size
+                or time.monotonic() - self.first_pending_time >= self.max_delay):
+            self._dispatch()
+
+    def update(self, payloads):
+        """Queues many writes at once from a {path: value} dict."""
+        for path, value in payloads.items():
+            self.set(path, value)
+
+    def flush(self):
+        """Sends the queued writes and waits for all batches in flight.
+
+        Returns False if a batch failed since the previous flush, including
+        batches sent while the writes were being queued.
+        """
+        self._dispatch()
+        with self._lock:
+            in_flight = list(self._in_flight)
+        wait(in_flight)
+        with self._lock:
+            failures = len(self.failed_batches)
+        succeeded = failures == self._failures_seen
+        self._failures_seen = failures
+        return succeeded
+
+    def next_batch(self):
+        """Number of the batch the next set() will go into."""
+        return self._batches_dispatched
+
+    def last_batch(self):
+        """Number of the batch holding the last write queued (next_batch() - 1 if none is pending)."""
+        return self._batches_dispatched if self.pending else self._batches_dispatched - 1
+
+    def batches_status(self, first, last):
+        """Returns None while batches first..last are not all finished, then True if none of them failed.
+
+        Lets a caller confirm the writes of one file (between next_batch()
+        before and last_batch() after queueing them) without flush(), which
+        waits for every batch in flight.
+        """
+        with self._lock:
+            if any(number not in self._finished for number in range(first, last + 1)):
+                return None
+            return not any(number in self._failed for number in range(first, last + 1))
+
+    def close(self):
+        """Flushes, then stops the upload threads."""
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def _dispatch(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        self.first_pending_time = None
+        number = self._batches_dispatched
+        self._batches_dispatched += 1
+        if self._executor is None:
+            self._send(batch, number)
+            return
+        self._slots.acquire()
+        future = self._executor.submit(self._send, batch, number)
+        with self._lock:
+            self._in_flight.add(future)
+        future.add_done_callback(self._batch_done)
+
+    def _batch_done(self, future):
+        with self._lock:
+            self._in_flight.discard(future)
+        self._slots.release()
+
+    def _send(self, batch, number):
+        try:
+            self.ref.update(batch)
+        except Exception as e:
+            first_path = next(iter(batch))
+            print(f"Batch of {len(batch)} writes starting at {first_path} failed: {e}")
+            with self._lock:
+                self.failed_batches.append((len(batch), first_path, e))
+                self._failed.add(number)
+                self._finished.add(number)
+            return
+        with self._lock:
+            self.batches_sent += 1
+            self.points_sent += len(batch)
+            self._finished.add(number)
+
+    def report(self):
+        """Prints how many points were sent and which batches failed."""
+        print(f"Sent {self.points_sent} points in {self.batches_sent} batches.")
+        if self.failed_batches:
+            failed_points = sum(count for count, _, _ in self.failed_batches)
+            print(f"{len(self.failed_batches)} batches ({failed_points} points) failed:")
+            for count, first_path, error in self.failed_batches:
+                print(f"  {count} points starting at {first_path}: {error}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PayloadCollector(dict):
+    """Stands in for a BatchWriter to gather {path: value} payloads, e.g. in a worker process."""
+
+    def set(self, path, value):
+        self[path.strip('/')] = value
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+# Decimation
+# ----------
+# Plotting a day of one-second data per channel is far more points than a
+# chart has pixels. Before plotting, each trace is cut down to a few points
+# per pixel column:
+#
+#   minmax: split the trace into equal-count buckets and keep the minimum and
+#           maximum of each, in time order. Spikes always survive.
+#   lttb:   Largest-Triangle-Three-Buckets keeps the one point per bucket that
+#           forms the largest triangle with its neighbours' points; closer to
+#           the shape of the line for the same number of points.
+
+METHODS = ("minmax", "lttb")
+
+
+def _bucket_edges(size, buckets):
+    """Edges of `buckets` equal-count buckets over rows 1..size-2 (the end points are always kept)."""
+    return np.linspace(1, size - 1, buckets + 1).astype(np.int64)
+
+
+def minmax_indices(y, max_points):
+    """Row indices keeping the min and max of each bucket, for at most max_points rows."""
+    y = np.asarray(y, dtype=float)
+    size = y.size
+    if size <= max_points or max_points < 4:
+        return np.arange(size)
+    edges = _bucket_edges(size, (max_points - 2) // 2)
+    starts = edges[:-1]
+    lengths = np.diff(edges)
+    starts, lengths = starts[lengths > 0], lengths[lengths > 0]
+    # Position of the min/max within each bucket, from a padded 2-D view
+    width = int(lengths.max())
+    rows = starts[:, None] + np.arange(width)[None, :]
+    valid = np.arange(width)[None, :] < lengths[:, None]
+    values = y[np.minimum(rows, size - 1)]
+    filled = np.nan_to_num(values, nan=np.inf)
+    low = np.where(valid, filled, np.inf).argmin(axis=1)
+    filled = np.nan_to_num(values, nan=-np.inf)
+    high = np.where(valid, filled, -np.inf).argmax(axis=1)
+    picked = np.concatenate(([0], starts + np.minimum(low, high), starts + np.maximum(low, high), [size - 1]))
+    return np.unique(picked)
+
+
+def lttb_indices(x, y, max_points):
+    """Row indices chosen by Largest-Triangle-Three-Buckets, max_points of them.
+
+    x must be sorted and numeric (e.g. int64 nanoseconds).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    size = y.size
+    if size <= max_points or max_points < 3:
+        return np.arange(size)
+    edges = _bucket_edges(size, max_points - 2)
+    # The third point of each triangle is the mean of the next bucket
+    sums_x = np.add.reduceat(x, edges[:-1])
+    sums_y = np.add.reduceat(y, edges[:-1])
+    counts = np.diff(edges)
+    means_x = np.append(sums_x[1:len(counts)] / np.maximum(counts[1:], 1), x[-1])
+    means_y = np.append(sums_y[1:len(counts)] / np.maximum(counts[1:], 1), y[-1])
+
+    picked = np.empty(max_points, dtype=np.int64)
+    picked[0], picked[-1] = 0, size - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if end <= start:
+            picked[bucket + 1] = previous
+            continue
+        # Twice the triangle areas; the constant factor does not change the argmax
+        areas = np.abs((x[previous] - means_x[bucket]) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (means_y[bucket] - y[previous]))
+        previous = start + int(np.nanargmax(areas)) if not np.isnan(areas).all() else start
+        picked[bucket + 1] = previous
+    return np.unique(picked)
+
+
+def decimate_df(df, x, y, max_points, group=None, method="minmax"):
+    """Decimates each trace of a DataFrame sorted by x to at most max_points rows.
+
+    With group, every value of that column (e.g. 'channel') is a separate
+    trace. Returns the kept rows, in their original order.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown decimation method {method!r}, expected one of {', '.join(METHODS)}")
+    if len(df) <= max_points:
+        return df
+    traces = [df] if group is None else [trace for _, trace in df.groupby(group, sort=False)]
+    kept = []
+    for trace in traces:
+        if method == "lttb":
+            times = pd.to_datetime(trace[x]).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+            rows = lttb_indices(times, trace[y].to_numpy(dtype=float), max_points)
+        else:
+            rows = minmax_indices(trace[y].to_numpy(dtype=float), max_points)
+        kept.append(trace.iloc[rows])
+    return pd.concat(kept).sort_index() if len(kept) > 1 else kept[0]
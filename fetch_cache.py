@@ -0,0 +1,117 @@
+import datetime
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+DEFAULT_TTL = 60  # seconds
+DEFAULT_MAX_MB = 256
+
+
+def is_closed_date(log_date, today=None):
+    """True for a 'YY-MM-DD' date before yesterday, whose data no longer changes.
+
+    Yesterday is still treated as open: the fridge PC may be in another time
+    zone than the app, and the live monitor's outbox may still be catching up
+    after an outage. Anything that is not a date (e.g. a Triton file name) is
+    treated as open.
+    """
+    try:
+        day = datetime.datetime.strptime(log_date, "%y-%m-%d").date()
+    except (TypeError, ValueError):
+        return False
+    return day < (today or datetime.date.today()) - datetime.timedelta(days=1)
+
+
+def estimate_size(value):
+    """Rough size in bytes of a cached value, for the memory budget."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, list) and value:
+        # Records fetched from the database all look alike; size one and scale
+        return sys.getsizeof(value) + len(value) * estimate_size(value[0])
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sys.getsizeof(k) + estimate_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class FetchCache:
+    """LRU cache of data fetched by the web app, under a memory budget.
+
+    Entries of closed dates (see is_closed_date) never expire and are only
+    evicted, least recently used first, when the cached data exceeds max_mb
+    megabytes. Entries of open dates are fresh for ttl seconds; after that,
+    lookup() still returns them so the caller can fetch only what is newer
+    and store() the merged result. The TTL and budget default to the
+    APP_CACHE_TTL and APP_CACHE_MB environment variables.
+
+    The cache is shared by all sessions of the app, which Streamlit runs in
+    separate threads, so it is guarded by a lock.
+    """
+
+    def __init__(self, ttl=None, max_mb=None):
+        self.ttl = float(ttl if ttl is not None else os.getenv("APP_CACHE_TTL", DEFAULT_TTL))
+        self.max_bytes = int((max_mb or float(os.getenv("APP_CACHE_MB", DEFAULT_MAX_MB))) * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (value, size, fetched_at, closed)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, key):
+        """Returns (value, fresh) for a key, or (None, False) if it is not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            self._entries.move_to_end(key)
+            value, _, fetched_at, closed = entry
+            fresh = closed or time.monotonic() - fetched_at < self.ttl
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return value, fresh
+
+    def store(self, key, value, closed=False):
+        """Caches a value (replacing any previous one) and evicts entries over the budget."""
+        size = estimate_size(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            if size > self.max_bytes:
+                return value  # Would evict everything else; don't keep it
+            self._entries[key] = (value, size, time.monotonic(), closed)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size, _, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+        return value
+
+    def get(self, key, fetch, closed=False):
+        """Returns the cached value of a key, calling fetch() when it is missing or stale.
+
+        None results are not cached, so a failed fetch is retried next time.
+        """
+        value, fresh = self.lookup(key)
+        if fresh:
+            return value
+        value = fetch()
+        if value is not None:
+            self.store(key, value, closed)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Returns (entries, megabytes cached, hits, misses)."""
+        with self._lock:
+            return len(self._entries), self._bytes / 1024 / 1024, self.hits, self.misses
@@ -0,0 +1,108 @@
+import pandas as pd
+
+import storage
+from chunks import series_key
+from serializers import TIMESTAMP_FORMAT, triton_timestamps
+
+LATEST_KEY = "latest"
+
+# Latest snapshot
+# ---------------
+# The uploaders keep the last reading of every series of a fridge in one
+# small node:
+#
+#   /{pc}/latest/{type}/{CHn}: {'value', 'timestamp'}   (BlueFors T/P/R)
+#   /{pc}/latest/flow_rate: {'value', 'timestamp'}      (BlueFors flowmeter)
+#   /{pc}/latest/{column}: {'value', 'timestamp'}       (Triton)
+#
+# so the current state of every fridge can be read without fetching a day of
+# data. Each series is written on its own path, so writers never clobber
+# each other's series.
+
+
+def latest_path(pc):
+    return f"{pc}/{LATEST_KEY}"
+
+
+def _reading(timestamp, value):
+    return {'value': float(value), 'timestamp': pd.Timestamp(timestamp).strftime(TIMESTAMP_FORMAT)}
+
+
+def serialize_latest_bluefors(df, log_type, pc):
+    """Builds the snapshot writes of the last reading of each channel in a DataFrame from get_logs."""
+    if df.empty or log_type == "status":
+        return {}
+    if log_type == "flow_rate":
+        df = df[df['flow_rate'].notna()]
+        if df.empty:
+            return {}
+        last = df.loc[df['timestamp'].idxmax()]
+        return {f"{latest_path(pc)}/flow_rate": _reading(last['timestamp'], last['flow_rate'])}
+    df = df[df['value'].notna()]
+    last_rows = df.loc[df.groupby('channel')['timestamp'].idxmax()]
+    return {f"{latest_path(pc)}/{log_type}/CH{channel}": _reading(timestamp, value)
+            for channel, timestamp, value in zip(last_rows['channel'], last_rows['timestamp'], last_rows['value'])}
+
+
+def serialize_latest_triton(df, pc):
+    """Builds the snapshot writes of the last non-zero reading of each column in a DataFrame from get_df."""
+    seconds = pd.to_numeric(df['Time(secs)'], errors='coerce')
+    df = df[seconds.notna()].sort_values('Time(secs)')
+    payloads = {}
+    for column in df.columns:
+        if column == 'Time(secs)':
+            continue
+        readings = df.loc[df[column].notna() & (df[column] != 0), ['Time(secs)', column]]
+        if not readings.empty:
+            timestamp = triton_timestamps([readings['Time(secs)'].iloc[-1]])[0]
+            payloads[f"{latest_path(pc)}/{series_key(column)}"] = _reading(timestamp, readings[column].iloc[-1])
+    return payloads
+
+
+def flatten_snapshot(snapshot, prefix=""):
+    """Returns {series: {'value', 'timestamp'}} of a /{pc}/latest node ('temperature/CH1', 'flow_rate', ...)."""
+    readings = {}
+    for key, node in (snapshot or {}).items():
+        if not isinstance(node, dict):
+            continue
+        if 'timestamp' in node:
+            readings[prefix + key] = node
+        else:
+            readings.update(flatten_snapshot(node, f"{prefix}{key}/"))
+    return readings
+
+
+class LatestSnapshot:
+    """Keeps backfills from moving /{pc}/latest back in time.
+
+    The stored snapshot is read once, and newer() then drops the snapshot
+    writes that are not newer than what is stored (or already written), so
+    uploading old dates leaves the latest readings alone.
+    """
+
+    def __init__(self, pc):
+        self.pc = pc
+        self._timestamps = None  # series -> timestamp of the stored reading
+
+    def _load(self):
+        try:
+            snapshot = storage.reference(latest_path(self.pc)).get()
+        except Exception as e:
+            print(f"Could not read {latest_path(self.pc)}: {e}")
+            snapshot = None
+        return {series: reading['timestamp'] for series, reading in flatten_snapshot(snapshot).items()}
+
+    def newer(self, payloads):
+        """Returns payloads without the snapshot writes that would not advance their series."""
+        if self._timestamps is None:
+            self._timestamps = self._load()
+        prefix = latest_path(self.pc) + '/'
+        kept = {}
+        for path, value in payloads.items():
+            if path.startswith(prefix) and isinstance(value, dict):
+                series = path[len(prefix):]
+                if value['timestamp'] <= self._timestamps.get(series, ''):
+                    continue
+                self._timestamps[series] = value['timestamp']
+            kept[path] = value
+        return kept
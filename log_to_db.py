@@ -1,12 +1,24 @@
 import os
 import time
+from collections import deque
 
-import firebase_admin
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
-from firebase_admin import credentials, db
 
-from reader import BlueForsLogReader, TritonLogReader  # Import both readers
+from catchup import Backlog, catchup_interval, missed_sources
+from chunks import ChunkAppender, chunks_path, series_key, storage_layout
+from date_index import IndexWriter
+from latest import LatestSnapshot, latest_path
+from manifest import UploadManifest
+from outbox import Outbox
+from serializers import TIMESTAMP_FORMAT, format_timestamps, serialize_bluefors, serialize_triton, triton_timestamps
+from storage import init_storage
+from watcher import PollingWatcher, create_watcher
+from reader import BlueForsLogTailer, TritonLogTailer  # Import both readers
+from ring_buffer import RecentReadings, metrics_enabled
+from rollups import ROLLUP_LOG_TYPES, RollupWriter, rollups_enabled
+from upload_all_logs import list_sources, triton_log_date, upload_with_manifest
 
 
 # --- Helper Function to Determine Fridge Type ---
@@ -18,66 +30,244 @@ def get_fridge_type(pc_name: str) -> str:
 
 # --- Upload Functions ---
 
-def upload_data_bluefors(data, log_date):
-    """Uploads data from BlueForsLogReader to Firestore, avoiding duplicates."""
-    ref = db.reference(f'/{PC_NAME}/{log_date}')
-
-    for log_type, channels in data.items():
-        if log_type == 'flow_rate':
-            timestamp_str = channels['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-            value = channels['value']
-            # Use timestamp as part of the key, and .set()
-            ref.child('flow_rate').child(timestamp_str.replace(":", "_")).set({
-                'timestamp': timestamp_str,
-                'value': float(value)
-            })
-        else:
-            for channel, channel_data in channels.items():
-                timestamp_str = channel_data['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-                value = channel_data['value']
-                # Use timestamp as part of the key, and .set()
-                ref.child(log_type).child(channel).child(timestamp_str.replace(":", "_")).set({
-                    'timestamp': timestamp_str,
-                    'value': float(value),
-                    'channel': channel  # Include channel here
-                })
-
-def upload_data_triton(data, log_file_name):
-    """Uploads data from TritonLogReader to Firestore, avoiding duplicates, and filtering zeros."""
-    log_date = log_file_name.replace(" ", "_").replace(".", "_").split('_')[1]
-    log_date = f"{log_date[:2]}-{log_date[2:4]}-{log_date[4:6]}"
-    ref = db.reference(f'/{PC_NAME}/{log_date}')
-    timestamp_str = data['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-
-    data_to_upload = {'timestamp': timestamp_str}
-
-    for key, value in data.items():
-        if key != 'timestamp':
-            if isinstance(value, (int, float, str, bool)):
-                if isinstance(value, (int, float)) and value == 0:
-                    continue
-                data_to_upload[key] = value
-            elif isinstance(value, np.number):
-                if float(value) == 0:
-                    continue
-                data_to_upload[key] = float(value)
+def upload_status_bluefors(df, log_date, writer, manifest=None):
+    """Uploads BlueFors status lines (e.g. from BlueForsLogTailer.get_status_changes), avoiding duplicates.
+
+    Status stays one node per line in every layout (see chunks.py). Returns
+    the (source, log_type, channel, timestamp) of the lines queued.
+    """
+    queued = []
+    for path, payload in serialize_bluefors(df, "status", f'{PC_NAME}/{log_date}').items():
+        if manifest and not manifest.is_newer(PC_NAME, log_date, 'status', '', payload['timestamp']):
+            continue
+        writer.set(path, payload)
+        queued.append((log_date, 'status', '', payload['timestamp']))
+    return queued
+
+def upload_readings_bluefors(readings, writer, appender=None, nodes=True, rollups=None, index=None, recent=None,
+                             latest=None):
+    """Uploads every BlueFors reading of a batch, e.g. from a Backlog of BlueForsLogTailer.read_new_readings.
+
+    readings is {(log_date, log_type, channel): DataFrame of timestamp and
+    value}, in time order, with channel '' for the flow rate. Each reading
+    is written as its own node (unless nodes is False) and, given a
+    ChunkAppender, RollupWriter and IndexWriter, to the chunked layout, the
+    rollups and the date index, a channel at a time: one segment per block of
+    the chunked layout and one write per rollup bucket and date index entry.
+    The latest snapshot (see latest.py) gets the last reading of each
+    channel, through the LatestSnapshot if given, so readings older than the
+    stored ones leave it alone. Given a RecentReadings, the readings are also
+    added to its ring buffers. Returns the (source, log_type, channel,
+    timestamp) of the last reading of each channel.
+    """
+    queued = []
+    index_timestamps = {}
+    snapshot = {}
+    for (log_date, log_type, channel), df in readings.items():
+        if df.empty:
+            continue
+        base_path = f'{PC_NAME}/{log_date}'
+        series = f"{log_type}/{channel}" if channel else log_type
+        timestamp_str = df['timestamp'].iloc[-1].strftime(TIMESTAMP_FORMAT)
+        snapshot[f"{latest_path(PC_NAME)}/{series}"] = {'value': float(df['value'].iloc[-1]),
+                                                        'timestamp': timestamp_str}
+        if appender:
+            appender.append_many(f"{chunks_path(base_path)}/{series}", df['timestamp'], df['value'])
+        if rollups and log_type in ROLLUP_LOG_TYPES:
+            rollups.add_many(base_path, series, df['timestamp'], df['value'])
+        if recent:
+            recent.add(series, df['timestamp'], df['value'])
+        if nodes:
+            if log_type == 'flow_rate':
+                frame = df.rename(columns={'value': 'flow_rate'})
             else:
-                try:
-                    data_to_upload[key] = str(value)
-                except:
-                    print(f"Could not convert value for {key} to string. Skipping.")
+                frame = df.assign(channel=int(channel[2:]))
+            writer.update(serialize_bluefors(frame, log_type, base_path))
+        if index:
+            index_timestamps.setdefault((base_path, log_type), []).extend(format_timestamps(df['timestamp'])[0].tolist())
+        queued.append((log_date, log_type, channel, timestamp_str))
+    for (base_path, log_type), timestamps in index_timestamps.items():
+        index.add(base_path, log_type, timestamps)
+    writer.update(latest.newer(snapshot) if latest else snapshot)
+    return queued
 
-    if len(data_to_upload) > 1:
-        # Use timestamp as part of the key, and .set()
-        ref.child(timestamp_str.replace(":", "_")).set(data_to_upload)
-    else:
-        print("No non-zero data to upload (besides timestamp).")
+def new_triton_records(df, watermark=None):
+    """Adds a timestamp column to records from TritonLogTailer.read_new_records and splits them at watermark.
+
+    Returns (records up to watermark, records after it); with no watermark,
+    every record is after it.
+    """
+    seconds = pd.to_numeric(df['Time(secs)'], errors='coerce')
+    df = df[seconds.notna()]
+    df = df.assign(timestamp=pd.Series(triton_timestamps(df['Time(secs)'].to_numpy()), index=df.index))
+    if not watermark:
+        return df.iloc[:0], df.reset_index(drop=True)
+    # Keys have one-second resolution, so skip the whole watermark second
+    newer = (df['timestamp'] >= pd.Timestamp(watermark) + pd.Timedelta(seconds=1)).to_numpy()
+    return df[~newer].reset_index(drop=True), df[newer].reset_index(drop=True)
+
+def restore_bluefors(readings, rollups=None, index=None):
+    """Counts the BlueFors readings uploaded before the monitor started in the rollups and the date index.
+
+    readings is as in upload_readings_bluefors, but holds the readings of
+    the first read of a date that are not newer than the manifest. The date
+    index entries are rewritten with them counted, and the current rollup
+    buckets continue from them, so neither is read back from the database.
+    """
+    index_timestamps = {}
+    for (log_date, log_type, channel), df in readings.items():
+        if df.empty:
+            continue
+        base_path = f'{PC_NAME}/{log_date}'
+        if rollups and log_type in ROLLUP_LOG_TYPES:
+            rollups.restore_many(base_path, f"{log_type}/{channel}" if channel else log_type, df['timestamp'],
+                                 df['value'])
+        if index:
+            index_timestamps.setdefault((base_path, log_type), []).extend(
+                format_timestamps(df['timestamp'])[0].tolist())
+    for (base_path, log_type), timestamps in index_timestamps.items():
+        index.add(base_path, log_type, timestamps)
+
+def restore_triton(readings, rollups=None, index=None):
+    """Counts the Triton records uploaded before the monitor started, as restore_bluefors does.
+
+    readings is as in upload_records_triton.
+    """
+    for (log_file_name, _, _), df in readings.items():
+        base_path = f'{PC_NAME}/{triton_log_date(log_file_name)}'
+        kept = pd.Series(False, index=df.index)
+        for column in df.columns:
+            if column in ('Time(secs)', 'timestamp'):
+                continue
+            values = df[column].to_numpy(dtype=float)
+            keep = (values != 0) & ~np.isnan(values)  # As in serializers.serialize_triton
+            kept |= keep
+            if rollups and keep.any():
+                rollups.restore_many(base_path, series_key(column), df['timestamp'][keep], values[keep])
+        if index and kept.any():
+            index.add(base_path, log_file_name, format_timestamps(df['timestamp'][kept])[0].tolist())
+
+def upload_records_triton(readings, writer, appender=None, nodes=True, rollups=None, index=None, recent=None,
+                          latest=None):
+    """Uploads every Triton record of a batch, e.g. from a Backlog of new_triton_records, filtering zeros.
+
+    readings is {(log_file_name, 'triton', ''): DataFrame of records with a
+    timestamp column}, in time order. Layouts as in upload_readings_bluefors.
+    Returns the (source, log_type, channel, timestamp) of the last record of each file.
+    """
+    queued = []
+    snapshot = {}
+    for (log_file_name, log_type, channel), df in readings.items():
+        base_path = f'{PC_NAME}/{triton_log_date(log_file_name)}'
+        records = df.drop(columns=['timestamp'])
+        kept = pd.Series(False, index=df.index)
+        for column in records.columns:
+            if column == 'Time(secs)':
+                continue
+            values = records[column].to_numpy(dtype=float)
+            keep = (values != 0) & ~np.isnan(values)  # As in serializers.serialize_triton
+            if not keep.any():
+                continue
+            kept |= keep
+            timestamps, values = df['timestamp'][keep], values[keep]
+            snapshot[f"{latest_path(PC_NAME)}/{series_key(column)}"] = {
+                'value': float(values[-1]), 'timestamp': timestamps.iloc[-1].strftime(TIMESTAMP_FORMAT)}
+            if appender:
+                appender.append_many(f"{chunks_path(base_path)}/{series_key(column)}", timestamps, values)
+            if rollups:
+                rollups.add_many(base_path, series_key(column), timestamps, values)
+            if recent:
+                recent.add(series_key(column), timestamps, values)
+        if not kept.any():
+            continue
+        if nodes:
+            writer.update(serialize_triton(records, base_path))
+        timestamps = format_timestamps(df['timestamp'][kept])[0].tolist()
+        if index:
+            index.add(base_path, log_file_name, timestamps)
+        queued.append((log_file_name, log_type, channel, timestamps[-1]))
+    writer.update(latest.newer(snapshot) if latest else snapshot)
+    return queued
+
+class LatencyStats:
+    """Delay between a log file write (its mtime) and the database acknowledging the readings.
+
+    The readings of an upload are acknowledged once the outbox batch holding
+    the last of them is sent. The report also shows how many queued writes
+    the database has not acknowledged yet.
+    """
 
-def main(LOGS_FOLDER="logs"):
-    """Main loop to continuously monitor logs and upload data."""
-    processed_dates = set()
+    def __init__(self, outbox, report_interval=600):
+        self.outbox = outbox
+        self.report_interval = report_interval
+        self.samples = []
+        self.waiting = deque()  # (outbox id of the last write, earliest write time) per upload not acknowledged yet
+        self.last_report_time = time.monotonic()
+
+    def record(self, write_times):
+        """Records one upload of the changes written at write_times (file mtimes), just queued in the outbox."""
+        if write_times:
+            self.waiting.append((self.outbox.last_id(), min(write_times)))
+        self._match_acks()
+        if time.monotonic() - self.last_report_time >= self.report_interval:
+            self.report()
+
+    def _match_acks(self):
+        for acked_id, acknowledged_at in self.outbox.take_acks():
+            while self.waiting and self.waiting[0][0] <= acked_id:
+                self.samples.append(acknowledged_at - self.waiting.popleft()[1])
+
+    def report(self):
+        self.last_report_time = time.monotonic()
+        self._match_acks()
+        if self.samples:
+            samples = sorted(self.samples)
+            print(f"Log write -> database latency over {len(samples)} uploads: "
+                  f"median {samples[len(samples) // 2]:.2f} s, mean {sum(samples) / len(samples):.2f} s, "
+                  f"max {samples[-1]:.2f} s")
+        print(f"Outbox: {self.outbox.points_sent} writes sent, {self.outbox.pending()} waiting")
+        self.samples = []
+
+def main(LOGS_FOLDER="logs", mode=None):
+    """Main loop to continuously monitor logs and upload data.
+
+    In "events" mode (MONITOR_MODE, the default) the active BlueFors date
+    directory or Triton .vcl file is watched with inotify (or polled every
+    second where inotify is not available) and changes are uploaded as soon as
+    they are written. In "poll" mode the files are checked every 60 seconds.
+    Either way, nothing is parsed or uploaded while the files are unchanged.
+
+    Readings are queued in a local outbox (see outbox.Outbox) and sent from a
+    background thread, so a network outage or a restart delays them instead of
+    losing them, and never holds up reading the logs.
+
+    Every line of the logs is uploaded, not only the latest reading: the
+    first cycle reads the files from the start and uploads what is newer than
+    the manifest, and the dates or files missed while the monitor was down
+    are caught up on as well, throttled (see catchup.py).
+    """
+    mode = mode or os.getenv("MONITOR_MODE", "events")
+    watcher = create_watcher() if mode == "events" else PollingWatcher(interval=60)
+    writer = Outbox().start()  # Durable queue, sent in the background
+    layout = storage_layout()  # One node per reading, chunks (see chunks.py) or both
+    appender = ChunkAppender(writer) if layout != "nodes" else None
+    rollups = RollupWriter(writer) if rollups_enabled() else None  # 1m/10m/1h min/max/mean, see rollups.py
+    index = IndexWriter(writer)  # Per-date counts and time bounds, see date_index.py
+    recent = RecentReadings() if metrics_enabled() else None  # Ring buffers for rolling metrics, see ring_buffer.py
+    latency = LatencyStats(writer)
+    changes = None  # File changes since the last upload; None to upload regardless
     start_time = time.localtime()  # Record the start time
     latest_log_file = None  # Track the latest log file
+    fridge_type = get_fridge_type(PC_NAME)
+    bluefors_reader = BlueForsLogTailer(LOGS_FOLDER)  # Keeps file offsets across cycles
+    triton_reader = None  # Follows the active .vcl file
+    tailed_source = None  # Date or file being tailed
+    manifest = UploadManifest()  # Remembers what was sent across restarts
+    latest = LatestSnapshot(PC_NAME)  # Keeps the uploads of old readings from moving /latest back
+    backlog = Backlog()  # Readings read but not uploaded yet
+    missed = []  # Dates or files to catch up on through the backfill
+    restoring = False  # Whether the next read of the tailed source is its first
+    queued = []
 
     while True:
         present_time = time.localtime()  # Get current time
@@ -87,10 +277,13 @@ def main(LOGS_FOLDER="logs"):
         if current_date != time.strftime("%Y-%m-%d", start_time):
             latest_log_file = None  # Reset log file tracking
             start_time = present_time  # Update start time to the new day
+            if appender:
+                appender.compact_all()  # The previous day's blocks are complete
 
         # Find the latest log file if needed
         if latest_log_file is None:
-            if get_fridge_type(PC_NAME) == "Oxford":
+            changes = None
+            if fridge_type == "Oxford":
                 log_files = [f for f in os.listdir(LOGS_FOLDER) if f.endswith('.vcl')]
                 log_files.sort(reverse=True)  # Most recent first
                 if log_files:
@@ -110,40 +303,98 @@ def main(LOGS_FOLDER="logs"):
                     print("No log directories found.")
                     time.sleep(60)
                     continue
+            watcher.watch([os.path.join(LOGS_FOLDER, latest_log_file)])
+            if latest_log_file != tailed_source:
+                if tailed_source is None:  # What was written while the monitor was down
+                    missed = missed_sources(manifest.sources(PC_NAME), list_sources(fridge_type, LOGS_FOLDER),
+                                            latest_log_file)
+                else:  # Lines written to the previous one after its last cycle
+                    missed.append(tailed_source)
+                if missed:
+                    print(f"Catching up on {len(missed)} earlier log {'files' if fridge_type == 'Oxford' else 'dates'}")
+                tailed_source = latest_log_file
+                restoring = True  # The first read also returns what was uploaded before; see restore_bluefors
+                if fridge_type == "Oxford":
+                    triton_reader = TritonLogTailer(os.path.join(LOGS_FOLDER, latest_log_file))
 
-        # Process the latest log file
-        if get_fridge_type(PC_NAME) == "Oxford":
-            log_file_path = os.path.join(LOGS_FOLDER, latest_log_file)
-            try:
-                log_reader = TritonLogReader(log_file_path)
-                latest_data = log_reader.get_latest_entry()
-                if latest_data:
-                    upload_data_triton(latest_data, latest_log_file)
-                else:
-                    print("No data found in the latest log file.")
-            except Exception as e:
-                print(f"Error processing {latest_log_file}: {e}")
-        else:  # Assume BlueFors
-            try:
-                log_reader = BlueForsLogReader(LOGS_FOLDER)
-                latest_data = log_reader.get_latest_entry(latest_log_file)
-                if latest_data:
-                    upload_data_bluefors(latest_data, latest_log_file)
-                else:
-                    print(f"No data found for {latest_log_file}")
-            except Exception as e:
-                print(f"Error processing {latest_log_file}: {e}")
+        # Skip the work entirely while the files are unchanged and nothing is left to catch up on
+        if changes is None or changes or backlog or missed:
+            # Read everything new in the latest log file
+            if fridge_type == "Oxford":
+                try:
+                    watermark = manifest.watermark(PC_NAME, latest_log_file, 'triton', '')
+                    key = (latest_log_file, 'triton', '')
+                    uploaded, records = new_triton_records(triton_reader.read_new_records(), watermark)
+                    if restoring:
+                        restore_triton({key: uploaded}, rollups, index)
+                        restoring = False
+                    backlog.add(key, records)
+                except Exception as e:
+                    print(f"Error processing {latest_log_file}: {e}")
+            else:  # Assume BlueFors
+                try:
+                    recorded = manifest.get_source(PC_NAME, latest_log_file)
+                    uploaded = {}
+                    for (log_type, channel), df in bluefors_reader.read_new_readings(latest_log_file).items():
+                        watermark = (recorded.get((log_type, channel)) or {}).get('last_timestamp')
+                        key = (latest_log_file, log_type, channel)
+                        if watermark:
+                            newer = df['timestamp'] > pd.Timestamp(watermark)
+                            uploaded[key] = df[~newer]
+                            df = df[newer]
+                        backlog.add(key, df)
+                    if restoring:
+                        restore_bluefors(uploaded, rollups, index)
+                        restoring = False
+                    # Only status lines that change a valve, pump or switch are uploaded
+                    status_changes = bluefors_reader.get_status_changes(latest_log_file)
+                    queued += upload_status_bluefors(status_changes, latest_log_file, writer, manifest)
+                except Exception as e:
+                    print(f"Error processing {latest_log_file}: {e}")
+
+            # Upload the oldest readings, a batch at a time and only while the outbox keeps up
+            pending = writer.pending()
+            batch = backlog.take(pending)
+            if batch:
+                upload = upload_records_triton if fridge_type == "Oxford" else upload_readings_bluefors
+                try:
+                    queued += upload(batch, writer, appender, layout != "chunks", rollups, index, recent, latest)
+                    if recent:
+                        writer.update(recent.serialize_metrics(PC_NAME))
+                except Exception as e:
+                    print(f"Error uploading {len(batch)} channels: {e}")
+            if batch and backlog:
+                print(f"Catching up: {len(backlog)} readings left")
+            if not backlog and missed and pending <= backlog.max_pending:
+                name = missed.pop(0)
+                print(f"Catching up on {name}")
+                try:
+                    upload_with_manifest(fridge_type, LOGS_FOLDER, name, writer, manifest, latest)
+                except Exception as e:
+                    print(f"Error processing {name}: {e}")
+
+            if writer.flush():  # Commit this cycle's readings to the outbox
+                last_sent = {}
+                for source, log_type, channel, timestamp_str in queued:
+                    key = (source, log_type, channel)
+                    last_sent[key] = max(last_sent.get(key, timestamp_str), timestamp_str)
+                for (source, log_type, channel), timestamp_str in last_sent.items():
+                    if log_type == 'status':  # Only the changes are sent
+                        manifest.record_live(PC_NAME, source, log_type, channel, timestamp_str)
+                    else:
+                        manifest.record_complete(PC_NAME, source, log_type, channel, timestamp_str)
+                if queued:
+                    latency.record(list((changes or {}).values()))
+            queued = []
 
-        time.sleep(60)  # Check for new logs every 60 seconds
+        # Wake up at least every 60 seconds to notice the date change, sooner while catching up
+        changes = watcher.wait(catchup_interval() if backlog or missed else 60)
 
 if __name__ == "__main__":
     load_dotenv()
 
-    # --- Firebase Setup ---
-    cred = credentials.Certificate(os.getenv('CRED_FILE'))
-    firebase_admin.initialize_app(cred, {
-        'databaseURL': os.getenv('DB_URL')
-    })
+    # --- Database Setup (Firebase, or the local database if STORAGE_BACKEND=local) ---
+    init_storage(os.getenv('CRED_FILE'), os.getenv('DB_URL'))
 
     PC_NAME = os.getenv("PC_NAME")
     FRIDGE_TYPE = os.getenv("FRIDGE_TYPE")
@@ -0,0 +1,136 @@
+import os
+import sqlite3
+import threading
+
+DEFAULT_MANIFEST_FILE = "upload_manifest.sqlite"
+
+
+def file_fingerprint(file_path):
+    """Returns (size, mtime) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime
+
+
+class UploadManifest:
+    """Local SQLite record of what has already been uploaded.
+
+    Rows are keyed by (pc, source, log_type, channel), where source is the
+    BlueFors date directory or the Triton file name and channel is '' for
+    log types without channels. Each row holds:
+
+    - last_timestamp: every row up to this 'YYYY-MM-DD HH:MM:SS' timestamp has
+      been uploaded (advanced by the backfill),
+    - size/mtime: fingerprint of the source file when it was last read, so
+      unchanged files can be skipped without parsing them,
+    - live_timestamp: the latest reading sent by the live monitor.
+
+    The monitor uploads every line it reads, so it advances last_timestamp as
+    well (record_complete), without touching the fingerprint.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("UPLOAD_MANIFEST", DEFAULT_MANIFEST_FILE)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS uploads (
+                pc TEXT NOT NULL,
+                source TEXT NOT NULL,
+                log_type TEXT NOT NULL,
+                channel TEXT NOT NULL DEFAULT '',
+                last_timestamp TEXT,
+                size INTEGER,
+                mtime REAL,
+                live_timestamp TEXT,
+                PRIMARY KEY (pc, source, log_type, channel)
+            )""")
+        self._conn.commit()
+
+    def get(self, pc, source, log_type, channel=''):
+        """Returns the manifest row as a dict, or None if nothing was recorded."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_timestamp, size, mtime, live_timestamp FROM uploads "
+                "WHERE pc = ? AND source = ? AND log_type = ? AND channel = ?",
+                (pc, source, log_type, channel)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('last_timestamp', 'size', 'mtime', 'live_timestamp'), row))
+
+    def get_source(self, pc, source):
+        """Returns {(log_type, channel): row dict} for every row of a date or file."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT log_type, channel, last_timestamp, size, mtime, live_timestamp FROM uploads "
+                "WHERE pc = ? AND source = ?", (pc, source)).fetchall()
+        return {(row[0], row[1]): dict(zip(('last_timestamp', 'size', 'mtime', 'live_timestamp'), row[2:]))
+                for row in rows}
+
+    def sources(self, pc):
+        """Returns the sorted names of the dates or files with anything recorded for a PC."""
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT source FROM uploads WHERE pc = ? ORDER BY source",
+                                      (pc,)).fetchall()
+        return [row[0] for row in rows]
+
+    def watermark(self, pc, source, log_type, channel=''):
+        """Returns the timestamp up to which everything was uploaded, or None."""
+        row = self.get(pc, source, log_type, channel)
+        return row['last_timestamp'] if row else None
+
+    def is_unchanged(self, pc, source, log_type, channel, file_path):
+        """True if file_path has the fingerprint recorded by the last completed upload."""
+        row = self.get(pc, source, log_type, channel)
+        if row is None or row['size'] is None:
+            return False
+        return file_fingerprint(file_path) == (row['size'], row['mtime'])
+
+    def is_newer(self, pc, source, log_type, channel, timestamp_str):
+        """True if timestamp_str is after everything already sent, live or by backfill."""
+        row = self.get(pc, source, log_type, channel)
+        if row is None:
+            return True
+        return all(sent is None or timestamp_str > sent for sent in (row['last_timestamp'], row['live_timestamp']))
+
+    def record(self, pc, source, log_type, channel, last_timestamp, fingerprint):
+        """Records that every row up to last_timestamp of a file with fingerprint was uploaded."""
+        size, mtime = fingerprint if fingerprint else (None, None)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO uploads (pc, source, log_type, channel, last_timestamp, size, mtime) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (pc, source, log_type, channel) DO UPDATE SET "
+                "last_timestamp = MAX(COALESCE(last_timestamp, excluded.last_timestamp), "
+                "COALESCE(excluded.last_timestamp, last_timestamp)), "
+                "size = excluded.size, mtime = excluded.mtime",
+                (pc, source, log_type, channel, last_timestamp, size, mtime))
+            self._conn.commit()
+
+    def record_live(self, pc, source, log_type, channel, timestamp_str):
+        """Records the latest reading sent by the live monitor."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO uploads (pc, source, log_type, channel, live_timestamp) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (pc, source, log_type, channel) DO UPDATE SET "
+                "live_timestamp = MAX(COALESCE(live_timestamp, excluded.live_timestamp), excluded.live_timestamp)",
+                (pc, source, log_type, channel, timestamp_str))
+            self._conn.commit()
+
+    def record_complete(self, pc, source, log_type, channel, timestamp_str):
+        """Records that every reading up to timestamp_str was sent by the live monitor."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO uploads (pc, source, log_type, channel, last_timestamp, live_timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (pc, source, log_type, channel) DO UPDATE SET "
+                "last_timestamp = MAX(COALESCE(last_timestamp, excluded.last_timestamp), excluded.last_timestamp), "
+                "live_timestamp = MAX(COALESCE(live_timestamp, excluded.live_timestamp), excluded.live_timestamp)",
+                (pc, source, log_type, channel, timestamp_str, timestamp_str))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,237 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import storage
+from db_writer import DEFAULT_BATCH_SIZE
+
+DEFAULT_OUTBOX_FILE = "outbox.sqlite"
+DEFAULT_MAX_MB = 500
+MAX_ACKS = 10000  # Acknowledged batches remembered for take_acks()
+
+
+class Outbox:
+    """Durable on-disk queue between the log readers and the database.
+
+    Producers queue writes with set()/update() and make them durable with
+    flush(), which only commits to a local SQLite file and never waits for
+    the network. A background thread (start()) sends the queued writes in the
+    order they were queued, batch_size at a time, as multi-path update()
+    calls, and deletes them once they are acknowledged. Failed batches are
+    retried with exponential backoff, and writes still queued at exit are sent
+    after a restart. A batch the database rejects (e.g. for an invalid key)
+    would fail forever, so it is sent again one write at a time, and the
+    writes rejected on their own are moved to the dead_letter table of the
+    outbox file, with the error, instead of holding up the queue.
+
+    The payloads queued are capped at max_mb megabytes; past it, the oldest
+    writes are dropped (with a warning) to make room. The file, cap and batch
+    size default to the OUTBOX_FILE, OUTBOX_MAX_MB and UPLOAD_BATCH_SIZE
+    environment variables.
+    """
+
+    def __init__(self, path=None, ref=None, batch_size=None, max_mb=None,
+                 min_backoff=1.0, max_backoff=300.0, idle_interval=1.0):
+        self.path = path or os.getenv("OUTBOX_FILE", DEFAULT_OUTBOX_FILE)
+        self.ref = ref
+        self.batch_size = batch_size or int(os.getenv("UPLOAD_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+        self.max_bytes = int((max_mb or float(os.getenv("OUTBOX_MAX_MB", DEFAULT_MAX_MB))) * 1024 * 1024)
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.idle_interval = idle_interval
+        self.points_sent = 0
+        self.points_dropped = 0
+        self.points_rejected = 0
+        self._conn = self._connect()
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                queued_at REAL NOT NULL
+            )""")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS dead_letter (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                value TEXT NOT NULL,
+                queued_at REAL NOT NULL,
+                rejected_at REAL NOT NULL,
+                error TEXT NOT NULL
+            )""")
+        self._conn.commit()
+        self._bytes_lock = threading.Lock()  # _queued_bytes is changed by producers and the sender thread
+        self._queued_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM outbox").fetchone()[0]
+        self._last_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM outbox").fetchone()[0]
+        self._acks = deque(maxlen=MAX_ACKS)  # (id of the last write, time) per acknowledged batch
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    # --- Producer side ---
+
+    def set(self, path, value):
+        """Queues value to be written at path; call flush() to make it durable."""
+        value = json.dumps(value)
+        size = len(path) + len(value)
+        cursor = self._conn.execute("INSERT INTO outbox (path, value, size, queued_at) VALUES (?, ?, ?, ?)",
+                                    (path.strip('/'), value, size, time.time()))
+        self._last_id = cursor.lastrowid
+        with self._bytes_lock:
+            self._queued_bytes += size
+
+    def update(self, payloads):
+        """Queues many writes at once from a {path: value} dict."""
+        for path, value in payloads.items():
+            self.set(path, value)
+
+    def flush(self):
+        """Commits the queued writes to disk and wakes the sender. Returns True once they are durable."""
+        if self._queued_bytes > self.max_bytes:
+            self._drop_oldest()
+        self._conn.commit()
+        self._wakeup.set()
+        return True
+
+    def _drop_oldest(self):
+        with self._bytes_lock:
+            # The running total is only an estimate (rows may be sent meanwhile); recount before dropping anything
+            queued_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM outbox").fetchone()[0]
+            freed, dropped, last_id = 0, 0, None
+            if queued_bytes > self.max_bytes:
+                for row_id, size in self._conn.execute("SELECT id, size FROM outbox ORDER BY id"):
+                    if queued_bytes - freed <= self.max_bytes:
+                        break
+                    freed += size
+                    dropped += 1
+                    last_id = row_id
+            if last_id is not None:
+                self._conn.execute("DELETE FROM outbox WHERE id <= ?", (last_id,))
+                self.points_dropped += dropped
+                print(f"Outbox is over {self.max_bytes / 1024 / 1024:.0f} MB: dropped the {dropped} oldest writes")
+            self._queued_bytes = queued_bytes - freed
+
+    def last_id(self):
+        """Returns the id of the last write queued; ids increase in queueing order."""
+        return self._last_id
+
+    def pending(self):
+        """Returns the number of writes not yet acknowledged by the database."""
+        return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    # --- Sender side ---
+
+    def start(self):
+        """Starts sending the queue from a background thread."""
+        if self._thread is None:
+            if self.ref is None:
+                self.ref = storage.reference('/')
+            self._thread = threading.Thread(target=self._drain, name="outbox-sender", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stops the sender after its current batch; queued writes stay on disk."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _drain(self):
+        conn = self._connect()
+        backoff = 0
+        while not self._stop.is_set():
+            rows = []
+            try:
+                rows = conn.execute("SELECT id, path, value, size FROM outbox ORDER BY id LIMIT ?",
+                                    (self.batch_size,)).fetchall()
+                if not rows:
+                    self._wakeup.wait(self.idle_interval)
+                    self._wakeup.clear()
+                    continue
+                try:
+                    # Later writes to the same path win, as they would if sent one by one
+                    self.ref.update({path: json.loads(value) for _, path, value, _ in rows})
+                except Exception as e:
+                    if not _rejected(e):
+                        raise
+                    print(f"Outbox: the database rejected a batch of {len(rows)} writes ({e}), "
+                          f"sending them one at a time")
+                    rejected = self._send_each(conn, rows)
+                else:
+                    rejected = 0
+                acknowledged_at = time.time()
+                # If this fails (e.g. "database is locked") the batch is sent again, which rewrites the same values
+                conn.executemany("DELETE FROM outbox WHERE id = ?", [(row[0],) for row in rows])
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                backoff = min(max(2 * backoff, self.min_backoff), self.max_backoff)
+                action = f"sending {len(rows)} writes" if rows else "reading the queue"
+                print(f"Outbox: {action} failed ({e}), retrying in {backoff:.0f} s")
+                self._stop.wait(backoff)
+                continue
+            if backoff:
+                print("Outbox: database reachable again")
+                backoff = 0
+            with self._bytes_lock:
+                self._queued_bytes -= sum(row[3] for row in rows)
+            self.points_sent += len(rows) - rejected
+            self.points_rejected += rejected
+            self._acks.append((rows[-1][0], acknowledged_at))
+        conn.close()
+
+    def _send_each(self, conn, rows):
+        """Sends the writes of a rejected batch one at a time, moving those rejected to dead_letter.
+
+        Returns how many were rejected; raises if one fails for another reason.
+        """
+        rejected = 0
+        for row_id, path, value, _ in rows:
+            try:
+                self.ref.update({path: json.loads(value)})
+            except Exception as e:
+                if not _rejected(e):
+                    raise
+                conn.execute("INSERT OR REPLACE INTO dead_letter (id, path, value, queued_at, rejected_at, error) "
+                             "SELECT id, path, value, queued_at, ?, ? FROM outbox WHERE id = ?",
+                             (time.time(), f"{e}", row_id))
+                print(f"Outbox: the database rejected the write to {path} ({e}); moved it to dead_letter")
+                rejected += 1
+        return rejected
+
+    def take_acks(self):
+        """Returns and forgets the (id of the last write, time) of each batch acknowledged since the last call.
+
+        Ids are those returned by last_id(); only the latest MAX_ACKS batches are kept.
+        """
+        acks = []
+        while self._acks:
+            acks.append(self._acks.popleft())
+        return acks
+
+    def close(self, timeout=None):
+        self.flush()
+        self.stop(timeout)
+        self._conn.close()
+
+
+def _rejected(error):
+    """True if the database refused the writes themselves, so sending them again cannot succeed."""
+    if isinstance(error, (ValueError, TypeError)):  # Invalid keys or values (LocalStorage, firebase_admin checks)
+        return True
+    try:
+        from firebase_admin import exceptions
+    except ImportError:
+        return False
+    return isinstance(error, exceptions.InvalidArgumentError)  # HTTP 400, e.g. a key with '/' or '.'
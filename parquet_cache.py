@@ -0,0 +1,175 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from manifest import file_fingerprint
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # The cache is optional; without pyarrow the readers parse every time
+    pa = pq = None
+
+DEFAULT_CACHE_DIR = "parquet_cache"
+SETTLE_SECONDS = 300  # Files modified more recently than this are still being written
+
+# Parquet cache
+# -------------
+# BlueForsLogReader keeps what it parses from a log file as a Parquet file:
+#
+#   {cache dir}/{pc}/{date}/{log file name}.parquet
+#
+# with typed columns (float64 values, int64 channels, datetime64 timestamps)
+# and the source path, size and mtime in the file's metadata. A reader that
+# finds a cache file whose source path, size and mtime still match the log
+# file reads the columns back instead of parsing the text; any change to the
+# log file (or a log file of the same name elsewhere) makes it parse and
+# replace the cache file. Files that are still being written (modified in the
+# last SETTLE_SECONDS) are not cached.
+#
+# Triton .vcl files are not cached: they are already binary records that
+# parsers.parse maps straight into an array, faster than reading Parquet.
+
+
+def cache_enabled():
+    """True if pyarrow is installed, unless PARQUET_CACHE=0."""
+    return pq is not None and os.getenv("PARQUET_CACHE", "1") != "0"
+
+
+class ParquetCache:
+    """Parquet copies of parsed log files, keyed by source path, size and mtime.
+
+    root defaults to the PARQUET_CACHE_DIR environment variable and pc (the
+    fridge partition) to PC_NAME.
+    """
+
+    def __init__(self, root=None, pc=None, settle_seconds=SETTLE_SECONDS):
+        if pq is None:
+            raise ImportError("The Parquet cache needs pyarrow (pip install pyarrow)")
+        self.root = root or os.getenv("PARQUET_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.pc = pc or os.getenv("PC_NAME") or "local"
+        self.settle_seconds = settle_seconds
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    def path_of(self, file_path):
+        """Cache file of a log file, in the partition of its date directory."""
+        log_date = os.path.basename(os.path.dirname(os.path.abspath(file_path)))
+        return os.path.join(self.root, self.pc, log_date, os.path.basename(file_path) + ".parquet")
+
+    @staticmethod
+    def _key(file_path, fingerprint):
+        size, mtime = fingerprint
+        return {b'source': os.path.abspath(file_path).encode(), b'size': str(size).encode(),
+                b'mtime': repr(mtime).encode()}
+
+    def load(self, file_path):
+        """Returns the cached DataFrame of a log file, or None if it is missing or out of date."""
+        fingerprint = file_fingerprint(file_path)
+        if fingerprint is None:
+            return None
+        try:
+            parquet_file = pq.ParquetFile(self.path_of(file_path))
+        except (OSError, pa.ArrowException):
+            self.misses += 1
+            return None
+        metadata = parquet_file.schema_arrow.metadata or {}
+        key = self._key(file_path, fingerprint)
+        if any(metadata.get(field) != value for field, value in key.items()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return parquet_file.read().to_pandas()
+
+    def store(self, file_path, df):
+        """Caches the DataFrame parsed from a log file, unless the file is still being written."""
+        fingerprint = file_fingerprint(file_path)
+        if fingerprint is None or df.empty or not df.columns.is_unique:  # Parquet needs unique column names
+            return
+        if time.time() - fingerprint[1] < self.settle_seconds:
+            return
+        path = self.path_of(file_path)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                                   **self._key(file_path, fingerprint)})
+            pq.write_table(table, temp_path)
+            os.replace(temp_path, path)  # Readers never see a half-written file
+            self.stored += 1
+        except (OSError, ValueError, pa.ArrowException) as e:
+            print(f"Could not cache {file_path}: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+
+_default_cache = None
+
+
+def default_cache():
+    """Returns the cache shared by the readers of this process, or None if it is off."""
+    global _default_cache
+    if _default_cache is None and cache_enabled():
+        _default_cache = ParquetCache()
+    return _default_cache
+
+
+# --- Bulk conversion ---
+
+BLUEFORS_LOG_TYPES = ["temperature", "pressure", "resistance", "flow_rate", "status"]
+
+
+def convert_date(parent_dir, log_date, root=None, pc=None):
+    """Parses the logs of one BlueFors date directory into the cache; returns (log_date, files cached)."""
+    from reader import BlueForsLogReader
+
+    cache = ParquetCache(root, pc)
+    log_reader = BlueForsLogReader(parent_dir, cache=cache)
+    for log_type in BLUEFORS_LOG_TYPES:
+        log_reader.get_logs(log_date, log_type)
+    return log_date, cache.stored
+
+
+def convert_all(parent_dir, workers=None, root=None, pc=None):
+    """Fills the cache from every BlueFors date directory of a log directory, in parallel processes."""
+    names = sorted(name for name in os.listdir(parent_dir) if os.path.isdir(os.path.join(parent_dir, name)))
+    print(f"Caching {len(names)} dates from {parent_dir} with {workers or os.cpu_count()} processes")
+    total = 0
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(convert_date, parent_dir, name, root, pc) for name in names]
+        for future in as_completed(futures):
+            try:
+                name, stored = future.result()
+            except Exception as e:
+                print(f"Error caching a date: {e}")
+                continue
+            total += stored
+            if stored:
+                print(f"{name}: {stored} files cached")
+    print(f"{total} files cached")
+    return total
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Parses BlueFors log files into the local Parquet cache.")
+    parser.add_argument('logs_dir', nargs='?', default=os.getenv("LOGFILE_DIR", "logs"),
+                        help="Log directory (default: LOGFILE_DIR)")
+    parser.add_argument('--workers', type=int, help="Parse processes (default: number of CPUs)")
+    args = parser.parse_args(argv)
+    if not cache_enabled():
+        print("The Parquet cache is off (pyarrow is not installed, or PARQUET_CACHE=0)")
+        return 1
+    convert_all(args.logs_dir, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
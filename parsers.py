@@ -1,18 +1,74 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import struct
 from pathlib import Path
 from typing import BinaryIO, Final, Optional
 
 _MAX_CHANNELS_COUNT: Final[int] = 52
+_DATA_OFFSET: Final[int] = 0x3000
 
-__all__ = ['parse']
+__all__ = ['parse', 'parse_from', 'parse_last', 'parse_mmap']
+
+
+def _call_with_file(filename, func):
+    if isinstance(filename, (str, Path)):
+        f_in: BinaryIO
+        with (filename.open('rb') if isinstance(filename, Path) else open(filename, 'rb')) as f_in:
+            return func(f_in)
+    return func(filename)
+
+
+def _read_record_size(file_handle: BinaryIO) -> Optional[int]:
+    """Return the size in bytes of the fixed-size records, or None if there are none yet."""
+    file_handle.seek(_DATA_OFFSET)
+    data_size_data: bytes = file_handle.read(8)
+    if len(data_size_data) < 8:
+        return None
+    return int(round(struct.unpack_from('<d', data_size_data)[0]))
+
+
+def _last_records_offset(file_handle: BinaryIO, record_size: int, count: int) -> int:
+    """Return the offset of the `count`-th complete record counted back from EOF."""
+    file_handle.seek(0, 2)
+    records_count: int = (file_handle.tell() - _DATA_OFFSET) // record_size
+    return _DATA_OFFSET + max(0, records_count - count) * record_size
+
+
+def _check_offset(offset: Optional[int], record_size: int) -> int:
+    if offset is None:
+        return _DATA_OFFSET
+    if offset < _DATA_OFFSET or (offset - _DATA_OFFSET) % record_size:
+        raise ValueError(f'Offset {offset} is not at a record boundary')
+    return offset
 
 
 try:
     import numpy as np
     from numpy.typing import NDArray
 
+    def _split_records(data: NDArray[np.float64]) -> tuple[NDArray[np.float64], Optional[int]]:
+        """Reshape the flat data into one row per record.
+
+        Every record starts with its own size in bytes, so the sizes of all the records
+        are compared at once through a strided view. Returns the rows preceding the first
+        faulty or truncated record, and the index (in items) of that record, or None
+        if all the data is consistent.
+        """
+        if data.size == 0:
+            return data.reshape((0, 1)), None
+        record_items: int = int(round(data[0] / data.itemsize))
+        if record_items < 1:
+            return data[:0].reshape((0, 1)), 0
+        records_count: int = data.size // record_items
+        sizes: NDArray[np.float64] = data[:records_count * record_items:record_items]
+        faulty: NDArray[np.intp] = np.flatnonzero(np.round(sizes / data.itemsize) != record_items)
+        if faulty.size:
+            records_count = int(faulty[0])
+        elif records_count * record_items == data.size:
+            return data.reshape((records_count, record_items)), None
+        return data[:records_count * record_items].reshape((records_count, record_items)), records_count * record_items
+
     def parse(filename: str | Path | BinaryIO) -> tuple[list[str], NDArray[np.float64]]:
         def _parse(file_handle: BinaryIO) -> tuple[list[str], NDArray[np.float64]]:
             file_handle.seek(0x1800 + 32)
@@ -22,18 +78,14 @@ try:
             file_handle.seek(0x3000)
             # noinspection PyTypeChecker
             dt: np.dtype = np.dtype(np.float64).newbyteorder('<')
-            data: NDArray[np.float64] = np.frombuffer(file_handle.read(), dtype=dt)
-            i: int = 0
-            data_item_size: Optional[int] = None
-            while i < data.size:
-                if data_item_size is None:
-                    data_item_size = int(round(data[i] / dt.itemsize))
-                elif int(round(data[i] / dt.itemsize)) != data_item_size:
-                    raise RuntimeError('Inconsistent data: some records are faulty')
-                i += int(round(data[i] / dt.itemsize))
-            if data_item_size is None:
+            buffer: bytes = file_handle.read()
+            data: NDArray[np.float64] = np.frombuffer(buffer, dtype=dt, count=len(buffer) // dt.itemsize)
+            if data.size == 0:
                 return [], np.empty(0)
-            return titles, data.reshape((data_item_size, -1), order='F')[1:(len(titles) + 1)].astype(np.float64)
+            records, faulty_index = _split_records(data)
+            if faulty_index is not None:
+                raise RuntimeError('Inconsistent data: some records are faulty')
+            return titles, records[:, 1:(len(titles) + 1)].T.astype(np.float64)
 
         if isinstance(filename, BinaryIO):
             return _parse(filename)
@@ -41,37 +93,189 @@ try:
         with (filename.open('rb') if isinstance(filename, Path) else open(filename, 'rb')) as f_in:
             return _parse(f_in)
 
-except ImportError:
-    import struct
+    def parse_mmap(filename: str | Path | BinaryIO) -> tuple[list[str], NDArray[np.float64], Optional[int]]:
+        """Parse the file without copying it, through a read-only memory map.
 
-    def parse(filename: str | Path | BinaryIO) -> tuple[list[str], list[list[float]]]:
-        def _parse(file_handle: BinaryIO) -> tuple[list[str], list[list[float]]]:
+        The returned data is a view over the mapped file, so the file stays mapped
+        while the data is referenced. Instead of rejecting a damaged file, the data
+        is cut at the first faulty or truncated record, whose file offset is returned
+        as the third item (None if every record is consistent).
+        """
+        def _parse(file_handle: BinaryIO) -> tuple[list[str], NDArray[np.float64], Optional[int]]:
             file_handle.seek(0x1800 + 32)
-            titles: list[str] = list(map(lambda s: s.strip(b'\0').decode('ascii'),
-                                         struct.unpack_from('<' + '32s' * (_MAX_CHANNELS_COUNT - 1),
-                                                            file_handle.read((_MAX_CHANNELS_COUNT - 1) * 32))))
+            titles: list[str] = [file_handle.read(32).strip(b'\0').decode('ascii')
+                                 for _ in range(_MAX_CHANNELS_COUNT - 1)]
             titles = list(filter(None, titles))
-            file_handle.seek(0x3000)
-            data: list[list[float]] = [[] for _ in range(len(titles))]
-            while True:
-                data_size_data: bytes = file_handle.read(double_size)
-                if not data_size_data:
-                    break
-                data_size: int = int(struct.unpack_from('<d', data_size_data)[0]) - double_size
-                line_data: bytes = file_handle.read(data_size)
-                if len(line_data) != data_size:
-                    raise IOError('Corrupted or incomplete data found')
-                count: int = len(line_data) // double_size
-                if count != len(titles):
-                    raise RuntimeError(f'Do not know how to process {count} channels')
-                for index, item in enumerate(struct.unpack_from(f'<{len(titles)}d', line_data)):
-                    data[index].append(item)
+            # noinspection PyTypeChecker
+            dt: np.dtype = np.dtype(np.float64).newbyteorder('<')
+            file_handle.seek(0, 2)
+            items_count: int = max(0, file_handle.tell() - _DATA_OFFSET) // dt.itemsize
+            if items_count == 0:
+                return titles, np.empty((len(titles), 0)), None
+            data: NDArray[np.float64] = np.memmap(file_handle, dtype=dt, mode='r',
+                                                  offset=_DATA_OFFSET, shape=(items_count,))
+            records, faulty_index = _split_records(data)
+            if faulty_index is None and (file_handle.tell() - _DATA_OFFSET) % dt.itemsize:
+                faulty_index = items_count
+            faulty_offset: Optional[int] = None if faulty_index is None else _DATA_OFFSET + faulty_index * dt.itemsize
+            return titles, records[:, 1:(len(titles) + 1)].T, faulty_offset
+
+        return _call_with_file(filename, _parse)
+
+    def _parse_records(file_handle: BinaryIO, offset: Optional[int],
+                       count: Optional[int]) -> tuple[list[str], NDArray[np.float64], int]:
+        file_handle.seek(0x1800 + 32)
+        titles: list[str] = [file_handle.read(32).strip(b'\0').decode('ascii')
+                             for _ in range(_MAX_CHANNELS_COUNT - 1)]
+        titles = list(filter(None, titles))
+        record_size: Optional[int] = _read_record_size(file_handle)
+        if record_size is None:
+            return titles, np.empty((len(titles), 0)), _DATA_OFFSET
+        if count is not None:
+            offset = _last_records_offset(file_handle, record_size, count)
+        offset = _check_offset(offset, record_size)
+        file_handle.seek(offset)
+        buffer: bytes = file_handle.read()
+        # A trailing partial record is still being written: leave it for the next call
+        records_count: int = len(buffer) // record_size
+        # noinspection PyTypeChecker
+        dt: np.dtype = np.dtype(np.float64).newbyteorder('<')
+        data: NDArray[np.float64] = np.frombuffer(buffer, dtype=dt, count=records_count * record_size // dt.itemsize)
+        data = data.reshape((records_count, record_size // dt.itemsize))
+        if np.any(np.round(data[:, 0]) != record_size):
+            raise RuntimeError('Inconsistent data: some records are faulty')
+        return (titles, data[:, 1:(len(titles) + 1)].T.astype(np.float64),
+                offset + records_count * record_size)
+
+    def parse_from(filename: str | Path | BinaryIO,
+                   offset: Optional[int] = None) -> tuple[list[str], NDArray[np.float64], int]:
+        """Parse the complete records starting at `offset` (the first record by default).
+
+        Returns the titles, the data, and the offset to pass to the next call
+        to continue with the records appended in the meantime.
+        """
+        return _call_with_file(filename, lambda file_handle: _parse_records(file_handle, offset, None))
+
+    def parse_last(filename: str | Path | BinaryIO,
+                   count: int = 1) -> tuple[list[str], NDArray[np.float64], int]:
+        """Parse only the last `count` complete records, seeking back from EOF."""
+        return _call_with_file(filename, lambda file_handle: _parse_records(file_handle, None, count))
+
+except ImportError:
+    import mmap
+    import sys
+    from array import array
+
+    def _read_titles(file_handle: BinaryIO) -> list[str]:
+        file_handle.seek(0x1800 + 32)
+        titles: list[str] = list(map(lambda s: s.strip(b'\0').decode('ascii'),
+                                     struct.unpack_from('<' + '32s' * (_MAX_CHANNELS_COUNT - 1),
+                                                        file_handle.read((_MAX_CHANNELS_COUNT - 1) * 32))))
+        return list(filter(None, titles))
+
+    def _read_columns(file_handle: BinaryIO, titles_count: int, record_size: int) -> tuple[list[array], int]:
+        """Read all the complete records from the current position into one array per channel.
+
+        The data is read in bulk and split into columns with strided slicing of a single
+        array, so no Python code runs per record. Returns the columns and the number of
+        bytes consumed.
+        """
+        double_size: Final[int] = array('d').itemsize
+        if record_size != (titles_count + 1) * double_size:
+            raise RuntimeError(f'Do not know how to process {record_size // double_size - 1} channels')
+        buffer: bytes = file_handle.read()
+        records_count: int = len(buffer) // record_size
+        values: array = array('d')
+        values.frombytes(memoryview(buffer)[:records_count * record_size])
+        if sys.byteorder != 'little':
+            values.byteswap()
+        record_items: int = titles_count + 1
+        if values[::record_items] != array('d', [float(record_size)]) * records_count:
+            raise RuntimeError('Inconsistent data: some records are faulty')
+        return [values[index::record_items] for index in range(1, record_items)], records_count * record_size
+
+    def parse(filename: str | Path | BinaryIO) -> tuple[list[str], list[array]]:
+        def _parse(file_handle: BinaryIO) -> tuple[list[str], list[array]]:
+            titles: list[str] = _read_titles(file_handle)
+            record_size: Optional[int] = _read_record_size(file_handle)
+            if record_size is None:
+                return titles, [array('d') for _ in range(len(titles))]
+            file_handle.seek(0, 2)
+            if (file_handle.tell() - _DATA_OFFSET) % record_size:
+                raise IOError('Corrupted or incomplete data found')
+            file_handle.seek(_DATA_OFFSET)
+            data, _ = _read_columns(file_handle, len(titles), record_size)
             return titles, data
 
-        double_size: Final[int] = struct.calcsize('<d')
+        return _call_with_file(filename, _parse)
 
-        if isinstance(filename, BinaryIO):
-            return _parse(filename)
-        f_in: BinaryIO
-        with (filename.open('rb') if isinstance(filename, Path) else open(filename, 'rb')) as f_in:
-            return _parse(f_in)
\ No newline at end of file
+    def _parse_records(file_handle: BinaryIO, offset: Optional[int],
+                       count: Optional[int]) -> tuple[list[str], list[array], int]:
+        titles: list[str] = _read_titles(file_handle)
+        record_size: Optional[int] = _read_record_size(file_handle)
+        if record_size is None:
+            return titles, [array('d') for _ in range(len(titles))], _DATA_OFFSET
+        if count is not None:
+            offset = _last_records_offset(file_handle, record_size, count)
+        offset = _check_offset(offset, record_size)
+        file_handle.seek(offset)
+        # A trailing partial record is still being written: it is left for the next call
+        data, consumed = _read_columns(file_handle, len(titles), record_size)
+        return titles, data, offset + consumed
+
+    def parse_from(filename: str | Path | BinaryIO,
+                   offset: Optional[int] = None) -> tuple[list[str], list[array], int]:
+        """Parse the complete records starting at `offset` (the first record by default).
+
+        Returns the titles, the data, and the offset to pass to the next call
+        to continue with the records appended in the meantime.
+        """
+        return _call_with_file(filename, lambda file_handle: _parse_records(file_handle, offset, None))
+
+    def parse_last(filename: str | Path | BinaryIO,
+                   count: int = 1) -> tuple[list[str], list[array], int]:
+        """Parse only the last `count` complete records, seeking back from EOF."""
+        return _call_with_file(filename, lambda file_handle: _parse_records(file_handle, None, count))
+
+    def parse_mmap(filename: str | Path | BinaryIO) -> tuple[list[str], list[memoryview | array], Optional[int]]:
+        """Parse the file without copying it, through a read-only memory map.
+
+        Each column is a strided memoryview over the mapped file (a byte-swapped
+        array copy on big-endian machines). As with NumPy, the data is cut at the
+        first faulty or truncated record, whose file offset is returned as the
+        third item (None if every record is consistent).
+        """
+        def _parse(file_handle: BinaryIO) -> tuple[list[str], list[memoryview | array], Optional[int]]:
+            titles: list[str] = _read_titles(file_handle)
+            double_size: Final[int] = array('d').itemsize
+            file_handle.seek(0, 2)
+            file_size: int = file_handle.tell()
+            items_count: int = max(0, file_size - _DATA_OFFSET) // double_size
+            if items_count == 0:
+                return titles, [array('d') for _ in range(len(titles))], None
+            mapped: mmap.mmap = mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+            values: memoryview | array = memoryview(mapped)[_DATA_OFFSET:_DATA_OFFSET + items_count * double_size]
+            values = values.cast('d')
+            if sys.byteorder != 'little':
+                values = array('d', values)
+                values.byteswap()
+            record_items: int = int(round(values[0] / double_size))
+            if record_items < 1:
+                return titles, [array('d') for _ in range(len(titles))], _DATA_OFFSET
+            records_count: int = items_count // record_items
+            sizes: list[float] = values[:records_count * record_items:record_items].tolist()
+            faulty_record: Optional[int] = None
+            if sizes.count(float(record_items * double_size)) != records_count:  # Only scan damaged files
+                faulty_record = next((index for index, size in enumerate(sizes)
+                                      if round(size / double_size) != record_items), None)
+            faulty_index: Optional[int] = None
+            if faulty_record is not None:
+                records_count = faulty_record
+                faulty_index = records_count * record_items
+            elif records_count * record_items != items_count or (file_size - _DATA_OFFSET) % double_size:
+                faulty_index = records_count * record_items
+            faulty_offset: Optional[int] = None if faulty_index is None else _DATA_OFFSET + faulty_index * double_size
+            values = values[:records_count * record_items]
+            return titles, [values[index::record_items] for index in range(1, len(titles) + 1)], faulty_offset
+
+        return _call_with_file(filename, _parse)
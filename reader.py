@@ -1,30 +1,109 @@
+import io
 import os
-import sys
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pandas as pd
 
-from parsers import parse
+from parquet_cache import default_cache
+from parsers import parse, parse_from
+from serializers import parse_log_timestamps
+from status_log import StatusTailer, parse_status_lines, read_status
+
+LAST_LINE_BLOCK = 4096  # Bytes read at a time when looking for the last line of a log
+
+
+def read_last_line(file_path, block_size=LAST_LINE_BLOCK):
+    """Returns (last complete line, offset after it) of a text log, reading backwards from EOF.
+
+    Only the final block is read (more only if a line is longer than a block),
+    so the time does not depend on the length of the file. A trailing line
+    without newline is still being written and is left out. Returns (None, 0)
+    if the file is missing or has no complete line.
+    """
+    try:
+        f = open(file_path, 'rb')
+    except OSError:
+        return None, 0
+    with f:
+        position = f.seek(0, os.SEEK_END)
+        data = b''
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            data = f.read(size) + data
+            complete = data[:data.rfind(b'\n') + 1]
+            lines = complete.split(b'\n')[:-1]
+            if position > 0:
+                lines = lines[1:]  # The first line may start before this block
+            for line in reversed(lines):
+                if line.strip():
+                    return line.decode('ascii', errors='ignore').strip(), position + len(complete)
+    return None, 0
+
+
+def parse_log_lines(source, columns):
+    """Parses T/P/R or flowmeter lines (a path or a file object) into a DataFrame with a timestamp column."""
+    df = pd.read_csv(source, header=None, names=columns, delimiter=",", dtype={'date': object, 'time': object})
+    df['timestamp'] = parse_log_timestamps(df['date'].to_numpy(), df['time'].to_numpy())
+    if df['timestamp'].isna().any():  # Malformed lines
+        df = df[df['timestamp'].notna()].reset_index(drop=True)
+    return df.drop(columns=['date', 'time'])
+
+
+def _reading_entry(elements):
+    """{'value', 'timestamp'} of the split fields of a T/P/R or flowmeter line; raises ValueError."""
+    if len(elements) < 3:
+        raise ValueError(f"Expected date, time and value, got {','.join(elements)!r}")
+    return {
+        'value': float(elements[2]),
+        'timestamp': pd.to_datetime(f"{elements[0]} {elements[1]}", format='%y-%m-%d %H:%M:%S')
+    }
 
 
 # BlueFors Log Reader
 class BlueForsLogReader:
-    def __init__(self, folder_path):
+    def __init__(self, folder_path, cache=True):
+        """cache: a ParquetCache, True for the default one (see parquet_cache.py) or False to always parse."""
         self.folder_path = os.path.abspath(folder_path)
+        self.cache = default_cache() if cache is True else (cache or None)
+
+    def _read_cached(self, file_path, parse_file):
+        """Returns parse_file(file_path), served from the Parquet cache while the file is unchanged."""
+        if self.cache is not None:
+            df = self.cache.load(file_path)
+            if df is not None:
+                return df
+        df = parse_file(file_path)
+        if self.cache is not None:
+            self.cache.store(file_path, df)
+        return df
 
     def read_log_file(self, file_path, columns):
         """Reads a log file into a pandas DataFrame."""
+        return self._read_cached(file_path, lambda path: self._parse_log_file(path, columns))
+
+    def _parse_log_file(self, file_path, columns):
         if not os.path.exists(file_path):
             print(f"File not found: {file_path}")
             return pd.DataFrame()
         try:
-            df = pd.read_csv(file_path, header=None, names=columns, delimiter=",")
-            df['timestamp'] = pd.to_datetime(df['date'] + ' ' + df['time'], format='%y-%m-%d %H:%M:%S')
-            return df.drop(columns=['date', 'time'])
+            return parse_log_lines(file_path, columns)
         except Exception as e:
             print(f"Error reading {file_path}: {e}")
             return pd.DataFrame()
 
+    def get_file_path(self, log_date, log_type, channel=None):
+        """Returns the path of the log file of a log type (and channel number, for T/P/R)."""
+        if log_type in ["temperature", "pressure", "resistance"]:
+            file_name = f"CH{channel} {log_type[0].upper()} {log_date}.log"
+        elif log_type == "status":
+            file_name = f"Channels {log_date}.log"
+        else:  # flowmeter / flow_rate
+            file_name = f"Flowmeter {log_date}.log"
+        return os.path.join(self.folder_path, log_date, file_name)
+
     def get_logs(self, log_date, log_type):
         """Retrieve logs for the specified type."""
         folder = os.path.join(self.folder_path, log_date)
@@ -41,41 +120,8 @@ class BlueForsLogReader:
 
         elif log_type == "status":
             file_name = f"Channels {log_date}.log"
-            file_path = os.path.join(folder, file_name)
-            try:
-                # Read all lines from the file
-                with open(file_path, 'r') as f:
-                    lines = f.readlines()
-                    if not lines:
-                        print(f"No data found in {file_path}")
-                        return pd.DataFrame()
-
-                # Extract the last row for headers
-                last_row = lines[-1].strip().split(",")
-                raw_headers = last_row[2::2]  # Extract every second element starting from index 2 (skipping values)
-                headers = ['timestamp'] + raw_headers  # Add 'timestamp' as the first column
-
-                # Prepare a list for data
-                data = []
-
-                # Iterate over each line and extract values
-                for line in lines:
-                    elements = line.strip().split(",")
-                    timestamp = f"{elements[0]} {elements[1]}"  # Combine date and time
-                    values = elements[2::2]  # Extract odd-numbered elements for values
-                    data.append([timestamp] + values)
-
-                # Create a DataFrame
-                df = pd.DataFrame(data, columns=headers)
-
-                # Convert timestamp to datetime
-                df['timestamp'] = pd.to_datetime(df['timestamp'], format='%y-%m-%d %H:%M:%S')
-
-                return df
-            except Exception as e:
-                print(f"Error reading {file_path}: {e}")
-                return pd.DataFrame()
-        elif log_type == "flowmeter":
+            return self._read_cached(os.path.join(folder, file_name), read_status)
+        elif log_type in ("flowmeter", "flow_rate"):
             file_name = f"Flowmeter {log_date}.log"
             file_path = os.path.join(folder, file_name)
             return self.read_log_file(file_path, ['date', 'time', 'flow_rate'])
@@ -87,39 +133,272 @@ class BlueForsLogReader:
         file_path = os.path.join(folder, file_name)
         return self.read_log_file(file_path, ['date', 'time', 'flow_rate'])
 
+    def day_index(self, log_date):
+        """Reads the T/P/R and flowmeter files of a date concurrently into a DayIndex."""
+        return DayIndex(self, log_date)
+
     def get_latest_entry(self, log_date):
+        """Retrieves the latest entry for temperature, resistance, pressure, and flow rate.
+
+        Only the last line of each file is read (see read_last_line), so this
+        takes the same time early and late in the day. The logs are written in
+        time order, so the last line is the latest reading.
+        """
+        latest_data = {}
+        for log_type in ["temperature", "resistance", "pressure", "flow_rate"]:
+            for channel in (range(1, 7) if log_type != "flow_rate" else [None]):
+                file_path = self.get_file_path(log_date, log_type, channel)
+                line, _ = read_last_line(file_path)
+                if line is None:
+                    continue
+                try:
+                    entry = _reading_entry(line.split(","))
+                except ValueError as e:
+                    print(f"Error parsing {file_path}: {e}")
+                    continue
+                if channel is None:
+                    latest_data[log_type] = entry
+                else:
+                    latest_data.setdefault(log_type, {})[f'CH{channel}'] = entry
+        return latest_data
 
-            """Retrieves the latest entry for temperature, resistance, pressure, and flow rate."""
+    def get_latest_status(self, log_date):
+        """Returns the state of the valves, pumps and switches in the last status line, with its timestamp.
 
-            latest_data = {}
+        Like get_latest_entry, only the end of the file is read. Returns {} if
+        there is no status line.
+        """
+        file_path = self.get_file_path(log_date, "status")
+        line, _ = read_last_line(file_path)
+        if line is None:
+            return {}
+        try:
+            df = parse_status_lines(line.encode('ascii'))
+        except Exception as e:
+            print(f"Error parsing {file_path}: {e}")
+            return {}
+        return df.iloc[-1].to_dict() if not df.empty else {}
+
+# Day Index
+class DayIndex:
+    """All T/P/R and flowmeter readings of one BlueFors date, read once.
+
+    The files are read concurrently (through the reader, so from the Parquet
+    cache when it holds them) into three arrays of the whole day: float64
+    values, datetime64 timestamps and the series of each reading
+    ('temperature/CH1', ..., 'flow_rate'). Rows are sorted by series, then
+    by time, and spans maps each series to its rows, so the latest reading of
+    a series is its last row and a time range is found with searchsorted.
+    Channels are sampled at different times, so the series are kept one
+    after the other rather than as columns of one frame.
+    """
+
+    LOG_TYPES = ["temperature", "pressure", "resistance"]
+
+    def __init__(self, log_reader, log_date, max_workers=None):
+        self.log_date = log_date
+        files = [(f"{log_type}/CH{channel}", log_reader.get_file_path(log_date, log_type, channel), 'value')
+                 for log_type in self.LOG_TYPES for channel in range(1, 7)]
+        files.append(("flow_rate", log_reader.get_file_path(log_date, "flow_rate"), 'flow_rate'))
+
+        def read(file):
+            series, file_path, column = file
+            return series, log_reader.read_log_file(file_path, ['date', 'time', column]), column
+
+        with ThreadPoolExecutor(max_workers or len(files)) as pool:
+            frames = list(pool.map(read, files))
+
+        self.spans = {}
+        timestamps, values = [], []
+        start = 0
+        for series, df, column in frames:
+            if df.empty:
+                continue
+            series_timestamps = df['timestamp'].to_numpy(dtype='datetime64[ns]')
+            series_values = df[column].to_numpy(dtype=np.float64)
+            if (np.diff(series_timestamps) < np.timedelta64(0)).any():
+                order = np.argsort(series_timestamps, kind='stable')
+                series_timestamps, series_values = series_timestamps[order], series_values[order]
+            timestamps.append(series_timestamps)
+            values.append(series_values)
+            self.spans[series] = (start, start + len(series_values))
+            start += len(series_values)
+        self.timestamps = np.concatenate(timestamps) if timestamps else np.empty(0, dtype='datetime64[ns]')
+        self.values = np.concatenate(values) if values else np.empty(0)
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def series(self):
+        return list(self.spans)
+
+    def _bounds(self, series, start=None, end=None):
+        """Rows of a series between start and end (inclusive), found by binary search."""
+        first, last = self.spans[series]
+        timestamps = self.timestamps[first:last]
+        low = first + (np.searchsorted(timestamps, np.datetime64(pd.Timestamp(start), 'ns'), 'left')
+                       if start is not None else 0)
+        high = first + (np.searchsorted(timestamps, np.datetime64(pd.Timestamp(end), 'ns'), 'right')
+                        if end is not None else last - first)
+        return low, high
+
+    def latest(self):
+        """Returns {series: (timestamp, value)} of the last reading of every series."""
+        return {series: (pd.Timestamp(self.timestamps[last - 1]), float(self.values[last - 1]))
+                for series, (_, last) in self.spans.items()}
+
+    def latest_entry(self):
+        """The latest readings, in the format of BlueForsLogReader.get_latest_entry."""
+        latest_data = {}
+        for series, (timestamp, value) in self.latest().items():
+            entry = {'value': value, 'timestamp': timestamp}
+            if series == "flow_rate":
+                latest_data['flow_rate'] = entry
+            else:
+                log_type, channel = series.split('/')
+                latest_data.setdefault(log_type, {})[channel] = entry
+        return latest_data
 
-            # Temperature, Resistance, and Pressure (for each channel)
-            for log_type in ["temperature", "resistance", "pressure"]:
-                df = self.get_logs(log_date, log_type)
-                if not df.empty:
-                    latest_data[log_type] = {}
-                    for channel in range(1, 7):
-                        channel_data = df[df['channel'] == channel]
-                        if not channel_data.empty:
-                            # Find the row with the maximum timestamp
-                            latest_entry = channel_data.loc[channel_data['timestamp'].idxmax()]
-                            latest_data[log_type][f'CH{channel}'] = {
-                                'value': latest_entry['value'],
-                                'timestamp': latest_entry['timestamp']
-                            }
-
-            # Flowmeter
-            flowmeter_df = self.get_flowmeter(log_date)
-            if not flowmeter_df.empty:
-                latest_flow_entry = flowmeter_df.loc[flowmeter_df['timestamp'].idxmax()]
-                latest_data['flow_rate'] = {
-                    'value': latest_flow_entry['flow_rate'],
-                    'timestamp': latest_flow_entry['timestamp']
-                }
-
-            return latest_data
+    def range(self, series, start=None, end=None):
+        """Returns a DataFrame of timestamp and value of one series between start and end (inclusive)."""
+        if series not in self.spans:
+            return pd.DataFrame(columns=['timestamp', 'value'])
+        low, high = self._bounds(series, start, end)
+        return pd.DataFrame({'timestamp': self.timestamps[low:high], 'value': self.values[low:high]})
+
+    def resample(self, series, seconds, start=None, end=None):
+        """Returns the mean, min, max and count of one series per bucket of `seconds`, between start and end.
+
+        The buckets are consecutive runs of the sorted rows, reduced with
+        np.*.reduceat; NaN readings are left out.
+        """
+        columns = ['timestamp', 'value', 'min', 'max', 'count']
+        if series not in self.spans:
+            return pd.DataFrame(columns=columns)
+        low, high = self._bounds(series, start, end)
+        timestamps, values = self.timestamps[low:high], self.values[low:high]
+        keep = ~np.isnan(values)
+        timestamps, values = timestamps[keep], values[keep]
+        if not len(values):
+            return pd.DataFrame(columns=columns)
+        bucket_ns = int(seconds * 1e9)
+        buckets = timestamps.astype(np.int64) // bucket_ns
+        first_rows = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+        counts = np.diff(np.append(first_rows, len(values)))
+        return pd.DataFrame({
+            'timestamp': (buckets[first_rows] * bucket_ns).astype('datetime64[ns]'),
+            'value': np.add.reduceat(values, first_rows) / counts,
+            'min': np.minimum.reduceat(values, first_rows),
+            'max': np.maximum.reduceat(values, first_rows),
+            'count': counts,
+        })
+
+class _TailedFile:
+    """Remembers how far an append-only log file has been read."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.inode = None
+        self.offset = 0
+        self._partial = b''
+
+    def reset(self):
+        self.offset = 0
+        self._partial = b''
+
+    def read_new_data(self):
+        """Returns the bytes of the complete lines appended since the previous call."""
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return b''
+
+        # The file was replaced (new inode) or truncated: start over from byte 0
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            self.reset()
+        self.inode = stat.st_ino
+
+        if stat.st_size == self.offset:
+            return b''
+
+        with open(self.file_path, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read()
+        self.offset += len(chunk)
+
+        # Keep a trailing line without newline until the writer finishes it
+        data = self._partial + chunk
+        end = data.rfind(b'\n') + 1
+        self._partial = data[end:]
+        return data[:end]
+
+class BlueForsLogTailer(BlueForsLogReader):
+    """BlueFors reader that keeps file offsets between calls.
+
+    read_new_readings returns every line appended since its previous call,
+    from the start of the files on the first call, and get_status_changes
+    the status lines that change a state.
+    A new log_date drops the old files and starts tailing the new day's files.
+    """
+
+    def __init__(self, folder_path):
+        super().__init__(folder_path)
+        self.log_date = None
+        self._files = {}
+        self._status = None
+
+    def _start_day(self, log_date):
+        self.log_date = log_date
+        folder = os.path.join(self.folder_path, log_date)
+        self._files = {}
+        for log_type in ["temperature", "resistance", "pressure"]:
+            for channel in range(1, 7):
+                file_name = f"CH{channel} {log_type[0].upper()} {log_date}.log"
+                self._files[(log_type, f'CH{channel}')] = _TailedFile(os.path.join(folder, file_name))
+        self._files[('flow_rate', None)] = _TailedFile(os.path.join(folder, f"Flowmeter {log_date}.log"))
+        self._status = StatusTailer(os.path.join(folder, f"Channels {log_date}.log"))
+
+    def get_status_changes(self, log_date):
+        """Returns the new status lines whose state differs from the line before, as a typed DataFrame."""
+        if log_date != self.log_date:
+            self._start_day(log_date)
+        return self._status.changes()
+
+    def read_new_readings(self, log_date):
+        """Returns every T/P/R and flowmeter reading appended since the previous call.
+
+        The result is {(log_type, channel): DataFrame of timestamp and value},
+        with channel 'CH1'... or '' for the flow rate. The first call for a
+        date reads each file from the start, so nothing written while the
+        monitor was down is missed.
+        """
+        if log_date != self.log_date:
+            self._start_day(log_date)
+
+        readings = {}
+        for (log_type, channel), tailed_file in self._files.items():
+            data = tailed_file.read_new_data()
+            if not data.strip():
+                continue
+            try:
+                df = parse_log_lines(io.BytesIO(data), ['date', 'time', 'value'])
+            except Exception as e:
+                print(f"Error parsing {tailed_file.file_path}: {e}")
+                continue
+            df = df.loc[df['value'].notna(), ['timestamp', 'value']]
+            if not df.empty:
+                readings[(log_type, channel or '')] = df.reset_index(drop=True)
+        return readings
 
 class TritonLogReader:
+    """Reads a whole Triton .vcl file into titles and one array per channel.
+
+    Unlike BlueForsLogReader, it does not use the Parquet cache: the records
+    are binary doubles already, which parsers.parse maps into an array faster
+    than the same columns are read back from Parquet.
+    """
+
     def __init__(self, file_name):
         self.file_path = file_name
         self.name = self.get_formatted_name()
@@ -128,25 +407,8 @@ class TritonLogReader:
     def get_formatted_name(self):
         name = os.path.split(self.file_path)[1].replace("vcl","csv")
         fpath = os.path.split(self.file_path)[0]
-        if sys.platform == "win32":
-            try:
-                save_path = fpath+r"\\data_csv\\"
-                try:
-                    os.makedirs(save_path)
-                except:
-                    pass
-                name = save_path + name
-            except:
-                raise SystemError()
-        else:
-            save_path = fpath+r"/data_csv/"
-            try:
-                os.makedirs(save_path)
-            except:
-                pass
-            name = save_path + name
-
-        return name
+        # data_csv/ is only created by to_csv
+        return os.path.join(fpath, "data_csv", name)
 
     def get_data(self):
         if not self.file_path:
@@ -164,6 +426,7 @@ class TritonLogReader:
 
     def to_csv(self) -> bool:
         df = self.get_df()
+        os.makedirs(os.path.dirname(self.name), exist_ok=True)
         df.to_csv(self.name, index=False)
         print("{} has been generated!".format(self.name))
 
@@ -222,3 +485,28 @@ class TritonLogReader:
             all_entries.append(entry)
 
         return all_entries
+
+
+class TritonLogTailer:
+    """Follows a growing Triton .vcl file without re-parsing it.
+
+    read_new_records resumes from the offset reached by the previous call;
+    a replaced or truncated file is read again from the first record.
+    """
+
+    def __init__(self, file_name):
+        self.file_path = file_name
+        self.inode = None
+        self.offset = None
+
+    def read_new_records(self):
+        """Returns a DataFrame of the records appended since the previous call."""
+        stat = os.stat(self.file_path)
+        # The file was replaced (new inode) or truncated: start over from the header
+        if stat.st_ino != self.inode or (self.offset is not None and stat.st_size < self.offset):
+            self.offset = None
+        self.inode = stat.st_ino
+
+        titles, data, self.offset = parse_from(self.file_path, self.offset)
+        return pd.DataFrame(dict(zip(titles, data)), columns=titles)
+
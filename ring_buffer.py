@@ -0,0 +1,151 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from serializers import TIMESTAMP_FORMAT
+
+DEFAULT_SIZE = 4096  # Readings kept per series
+DEFAULT_WINDOW_SECONDS = 600  # Seconds of readings the rolling metrics are computed over
+METRICS_KEY = "_metrics"  # Leading underscore: not a date (see app.fetch_log_dates)
+
+# Recent readings
+# ---------------
+# The live monitor keeps the last readings of every series in memory, one
+# RingBuffer each: a preallocated int64 array of nanosecond timestamps and a
+# float64 array of values, written in place, so appending is O(1) and needs no
+# allocation. Every cycle, the rolling metrics over the last
+# METRICS_WINDOW_SECONDS of each series that got readings are computed with
+# NumPy and published next to the latest snapshot:
+#
+#   /{pc}/_metrics/{series}: {'timestamp', 'window', 'count', 'mean', 'min', 'max', 'slope'}
+#
+# where {series} is named as in latest.py, 'timestamp' is the last reading's,
+# and 'slope' is the least-squares trend in units per second (left out when
+# the window holds fewer than two readings). A buffer holds METRICS_BUFFER_SIZE
+# readings, which bounds the window for fast-logging series.
+
+
+def metrics_enabled():
+    """True unless METRICS=0."""
+    return os.getenv("METRICS", "1") != "0"
+
+
+def metrics_path(pc):
+    return f"{pc}/{METRICS_KEY}"
+
+
+class RingBuffer:
+    """The last `size` readings of one series, oldest overwritten first."""
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self.times = np.zeros(size, dtype=np.int64)
+        self.values = np.full(size, np.nan)
+        self._next = 0  # Position of the next reading
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def last_time(self):
+        """Timestamp (ns) of the newest reading."""
+        return int(self.times[self._next - 1])  # -1 is the end of the arrays
+
+    def append(self, time_ns, value):
+        self.times[self._next] = time_ns
+        self.values[self._next] = value
+        self._next = (self._next + 1) % self.size
+        self._count = min(self._count + 1, self.size)
+
+    def extend(self, times_ns, values):
+        """Appends readings in time order with at most two slice assignments."""
+        times_ns = np.asarray(times_ns, dtype=np.int64)[-self.size:]
+        values = np.asarray(values, dtype=np.float64)[-self.size:]
+        count = len(values)
+        first = min(count, self.size - self._next)  # Readings that fit before the end of the arrays
+        self.times[self._next:self._next + first] = times_ns[:first]
+        self.values[self._next:self._next + first] = values[:first]
+        self.times[:count - first] = times_ns[first:]
+        self.values[:count - first] = values[first:]
+        self._next = (self._next + count) % self.size
+        self._count = min(self._count + count, self.size)
+
+    def arrays(self):
+        """Returns (times, values) in time order; views unless the buffer has wrapped around."""
+        if self._count < self.size:
+            return self.times[:self._count], self.values[:self._count]
+        return (np.concatenate((self.times[self._next:], self.times[:self._next])),
+                np.concatenate((self.values[self._next:], self.values[:self._next])))
+
+    def stats(self, window_seconds=None):
+        """Returns the count, mean, min, max and slope (per second) of the readings in the last window_seconds.
+
+        NaN readings are left out. Returns None if there are none.
+        """
+        times, values = self.arrays()
+        if not len(values):
+            return None
+        if window_seconds is not None:
+            start = np.searchsorted(times, times[-1] - int(window_seconds * 1e9), 'left')
+            times, values = times[start:], values[start:]
+        keep = ~np.isnan(values)
+        seconds, values = (times[keep] - times[-1]) / 1e9, values[keep]
+        if not len(values):
+            return None
+        mean = values.mean()
+        stats = {'count': int(len(values)), 'mean': float(mean), 'min': float(values.min()),
+                 'max': float(values.max())}
+        centered = seconds - seconds.mean()
+        spread = np.dot(centered, centered)
+        if spread > 0:
+            stats['slope'] = float(np.dot(centered, values - mean) / spread)
+        return stats
+
+
+class RecentReadings:
+    """A RingBuffer per series, fed by the monitor, and the rolling metrics of those that changed.
+
+    The buffer size and window default to the METRICS_BUFFER_SIZE and
+    METRICS_WINDOW_SECONDS environment variables.
+    """
+
+    def __init__(self, size=None, window_seconds=None):
+        self.size = size or int(os.getenv("METRICS_BUFFER_SIZE", DEFAULT_SIZE))
+        self.window_seconds = window_seconds or float(os.getenv("METRICS_WINDOW_SECONDS", DEFAULT_WINDOW_SECONDS))
+        self.buffers = {}
+        self._updated = set()  # Series with readings since the last serialize_metrics
+
+    def add(self, series, timestamps, values):
+        """Adds readings of one series in time order (timestamps as datetimes)."""
+        times_ns = pd.to_datetime(pd.Series(timestamps)).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        if not len(times_ns):
+            return
+        buffer = self.buffers.get(series)
+        if buffer is None:
+            buffer = self.buffers[series] = RingBuffer(self.size)
+        if len(times_ns) == 1:
+            buffer.append(times_ns[0], float(np.asarray(values, dtype=np.float64)[0]))
+        else:
+            buffer.extend(times_ns, values)
+        self._updated.add(series)
+
+    def metrics(self, series):
+        """Returns the metrics node of one series, or None if it has no readings in the window."""
+        buffer = self.buffers.get(series)
+        stats = buffer.stats(self.window_seconds) if buffer is not None else None
+        if stats is None:
+            return None
+        timestamp = pd.Timestamp(buffer.last_time).strftime(TIMESTAMP_FORMAT)
+        return {'timestamp': timestamp, 'window': self.window_seconds, **stats}
+
+    def serialize_metrics(self, pc):
+        """Builds the metrics writes of the series that got readings since the previous call."""
+        payloads = {}
+        for series in sorted(self._updated):
+            node = self.metrics(series)
+            if node is not None:
+                payloads[f"{metrics_path(pc)}/{series}"] = node
+        self._updated = set()
+        return payloads
@@ -0,0 +1,208 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from chunks import series_key
+from serializers import KEY_FORMAT, TIMESTAMP_FORMAT, triton_timestamps
+
+# Rollup tiers, coarsest last: name -> bucket length in seconds
+ROLLUP_TIERS = {"1m": 60, "10m": 600, "1h": 3600}
+ROLLUP_LOG_TYPES = ["temperature", "pressure", "resistance", "flow_rate"]
+
+# Rollups
+# -------
+# Alongside the raw data, the uploaders keep the min, max, mean and count of
+# every series per bucket of each tier:
+#
+#   /{pc}/_rollups/{tier}/{date}/{series}/{bucket}: {'timestamp', 'min', 'max', 'mean', 'count'}
+#
+# where {series} is named as in the chunked layout ('temperature/CH1',
+# 'flow_rate' or a Triton column), {bucket} is the bucket start as a node key
+# and 'timestamp' the bucket start as a timestamp string, for order_by_child
+# queries.
+
+
+def rollups_enabled():
+    """True unless ROLLUPS=0."""
+    return os.getenv("ROLLUPS", "1") != "0"
+
+
+def rollups_path(base_path, tier):
+    """Returns the rollup path of a tier for a '{pc}/{date}' base path of the node layout."""
+    pc, log_date = base_path.strip('/').split('/', 1)
+    return f"{pc}/_rollups/{tier}/{log_date}"
+
+
+def _to_seconds(timestamps):
+    return pd.to_datetime(pd.Series(timestamps)).to_numpy(dtype='datetime64[s]').astype(np.int64)
+
+
+def _bucket_node(bucket_start, minimum, maximum, mean, count):
+    timestamp = pd.Timestamp(int(bucket_start), unit='s')
+    return timestamp.strftime(KEY_FORMAT), {
+        'timestamp': timestamp.strftime(TIMESTAMP_FORMAT),
+        'min': float(minimum),
+        'max': float(maximum),
+        'mean': float(mean),
+        'count': int(count),
+    }
+
+
+def serialize_rollups(base_path, series, timestamps, values, new_rows=None):
+    """Builds {bucket path: bucket} writes of every tier for one series.
+
+    Buckets are computed from all the given samples, which must include every
+    earlier sample of the buckets being written. With a new_rows mask, only the
+    buckets that contain a new row are written, so a backfill that uploads the
+    rows after a watermark rewrites its partial first bucket from the whole file.
+    """
+    seconds = _to_seconds(timestamps)
+    values = np.asarray(values, dtype=float)
+    keep = ~np.isnan(values)
+    new_rows = np.ones(values.size, dtype=bool) if new_rows is None else np.asarray(new_rows, dtype=bool)
+    seconds, values, new_rows = seconds[keep], values[keep], new_rows[keep]
+    if not new_rows.any():
+        return {}
+    order = np.argsort(seconds, kind='stable')
+    seconds, values, new_rows = seconds[order], values[order], new_rows[order]
+
+    payloads = {}
+    for tier, bucket_seconds in ROLLUP_TIERS.items():
+        buckets = seconds - seconds % bucket_seconds
+        starts, first_rows, counts = np.unique(buckets, return_index=True, return_counts=True)
+        minimums = np.minimum.reduceat(values, first_rows)
+        maximums = np.maximum.reduceat(values, first_rows)
+        means = np.add.reduceat(values, first_rows) / counts
+        touched = np.logical_or.reduceat(new_rows, first_rows)
+        path = f"{rollups_path(base_path, tier)}/{series}"
+        for bucket in np.flatnonzero(touched).tolist():
+            key, node = _bucket_node(starts[bucket], minimums[bucket], maximums[bucket], means[bucket], counts[bucket])
+            payloads[f"{path}/{key}"] = node
+    return payloads
+
+
+def serialize_rollups_bluefors(df, log_type, base_path, new_rows=None):
+    """Rollups of a DataFrame from BlueForsLogReader.get_logs, for the T/P/R and flow rate logs."""
+    if df.empty or log_type not in ROLLUP_LOG_TYPES:
+        return {}
+    new_rows = pd.Series(True, index=df.index) if new_rows is None else new_rows
+    if log_type == "flow_rate":
+        return serialize_rollups(base_path, "flow_rate", df['timestamp'], df['flow_rate'], new_rows.to_numpy())
+    payloads = {}
+    for channel, channel_df in df.groupby('channel'):
+        payloads.update(serialize_rollups(base_path, f"{log_type}/CH{channel}", channel_df['timestamp'],
+                                          channel_df['value'], new_rows[channel_df.index].to_numpy()))
+    return payloads
+
+
+def serialize_rollups_triton(df, base_path, new_rows=None):
+    """Rollups of a DataFrame from TritonLogReader.get_df; zero readings are left out, as in the raw data."""
+    seconds = pd.to_numeric(df['Time(secs)'], errors='coerce')
+    present = seconds.notna().to_numpy()
+    df = df[present]
+    if df.empty:
+        return {}
+    new_rows = np.ones(len(df), dtype=bool) if new_rows is None else np.asarray(new_rows, dtype=bool)[present]
+    timestamps = triton_timestamps(df['Time(secs)'].to_numpy())
+    payloads = {}
+    for column in df.columns:
+        if column == 'Time(secs)':
+            continue
+        values = df[column].to_numpy(dtype=float)
+        keep = values != 0
+        payloads.update(serialize_rollups(base_path, series_key(column), timestamps[keep], values[keep],
+                                          new_rows[keep]))
+    return payloads
+
+
+def _combine(stats, minimum, maximum, total, count):
+    old_minimum, old_maximum, old_total, old_count = stats
+    return [min(old_minimum, minimum), max(old_maximum, maximum), old_total + total, old_count + count]
+
+
+class RollupWriter:
+    """Keeps the rollups of live readings up to date through a writer.
+
+    The statistics of the current bucket of each series and tier are kept in
+    memory and the bucket is rewritten with every reading. Nothing is read
+    back from the database: after a start, the monitor passes the readings
+    it had already uploaded to restore_many, so the current buckets continue
+    from them instead of being overwritten with the new readings only.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self._buckets = {}  # series path of a tier -> [bucket start, [min, max, sum, count]]
+
+    def _merge(self, series_path, bucket_start, minimum, maximum, total, count):
+        """Adds the statistics of some readings to a bucket and rewrites it."""
+        stats = self._buckets.get(series_path)
+        if stats is None or stats[0] != bucket_start:
+            stats = self._buckets[series_path] = [bucket_start, [minimum, maximum, total, count]]
+        else:
+            stats[1] = _combine(stats[1], minimum, maximum, total, count)
+        minimum, maximum, total, count = stats[1]
+        self.writer.set(f"{series_path}/{pd.Timestamp(bucket_start, unit='s').strftime(KEY_FORMAT)}",
+                        _bucket_node(bucket_start, minimum, maximum, total / count, count)[1])
+
+    def add(self, base_path, series, timestamp, value):
+        seconds = int(_to_seconds([timestamp])[0])
+        value = float(value)
+        if value != value:
+            return
+        for tier, bucket_seconds in ROLLUP_TIERS.items():
+            self._merge(f"{rollups_path(base_path, tier)}/{series}", seconds - seconds % bucket_seconds,
+                        value, value, value, 1)
+
+    def add_many(self, base_path, series, timestamps, values):
+        """Adds readings of one series in time order (e.g. a catch-up), rewriting each bucket once."""
+        for tier, bucket_stats in _tier_buckets(timestamps, values):
+            for bucket_start, minimum, maximum, total, count in bucket_stats:
+                self._merge(f"{rollups_path(base_path, tier)}/{series}", bucket_start, minimum, maximum, total, count)
+
+    def restore_many(self, base_path, series, timestamps, values):
+        """Starts the current bucket of each tier from readings already uploaded, in time order, without writing it."""
+        for tier, bucket_stats in _tier_buckets(timestamps, values):
+            if bucket_stats:
+                bucket_start, minimum, maximum, total, count = bucket_stats[-1]
+                self._buckets[f"{rollups_path(base_path, tier)}/{series}"] = [bucket_start,
+                                                                             [minimum, maximum, total, count]]
+
+
+def _tier_buckets(timestamps, values):
+    """Yields (tier, [(bucket start, min, max, sum, count), ...]) of readings in time order, NaNs left out."""
+    seconds = _to_seconds(timestamps)
+    values = np.asarray(values, dtype=float)
+    keep = ~np.isnan(values)
+    seconds, values = seconds[keep], values[keep]
+    if not seconds.size:
+        return
+    for tier, bucket_seconds in ROLLUP_TIERS.items():
+        buckets = seconds - seconds % bucket_seconds
+        first_rows = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+        counts = np.diff(np.append(first_rows, len(values)))
+        yield tier, list(zip(buckets[first_rows].tolist(), np.minimum.reduceat(values, first_rows).tolist(),
+                             np.maximum.reduceat(values, first_rows).tolist(),
+                             np.add.reduceat(values, first_rows).tolist(), counts.tolist()))
+
+
+# --- Reading ---
+
+def choose_tier(window_seconds, min_points):
+    """Returns the coarsest tier with at least min_points buckets in the window, or None for raw data."""
+    for tier, bucket_seconds in reversed(ROLLUP_TIERS.items()):
+        if window_seconds / bucket_seconds >= min_points:
+            return tier
+    return None
+
+
+def rollup_df(buckets):
+    """Converts {bucket key: bucket} of one series to a DataFrame sorted by timestamp.
+
+    The columns are timestamp, value (the mean), min, max and count.
+    """
+    rows = [bucket for bucket in (buckets or {}).values() if isinstance(bucket, dict) and 'timestamp' in bucket]
+    df = pd.DataFrame(rows, columns=['timestamp', 'mean', 'min', 'max', 'count'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df.rename(columns={'mean': 'value'}).sort_values('timestamp', ignore_index=True)
@@ -0,0 +1,135 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+KEY_FORMAT = '%Y-%m-%d_%H_%M_%S'  # TIMESTAMP_FORMAT with ' ' and ':' replaced, as used for node keys
+
+_FORBIDDEN_KEY_CHARACTERS = str.maketrans({character: '_' for character in '.$#[]/'})
+
+
+def series_key(name):
+    """Makes a Triton column name usable as a database key ('Flow(umol/s)' -> 'Flow(umol_s)')."""
+    return name.translate(_FORBIDDEN_KEY_CHARACTERS)
+
+
+def timestamp_key(timestamp):
+    """Returns the node key of one timestamp, e.g. '2022-07-20_10_00_00'."""
+    return timestamp.strftime(KEY_FORMAT)
+
+
+def triton_timestamps(seconds):
+    """Converts Triton 'Time(secs)' epoch seconds to naive local-time timestamps.
+
+    Same result as datetime.datetime.fromtimestamp, vectorized: the UTC offset is
+    looked up once per distinct hour, as local time only changes offset on the hour.
+    """
+    seconds = np.asarray(seconds, dtype=float)
+    hours, hour_index = np.unique(np.floor_divide(seconds, 3600), return_inverse=True)
+    offsets = np.array([time.localtime(int(hour) * 3600).tm_gmtoff for hour in hours.tolist()], dtype=float)
+    return pd.Series(pd.to_datetime(seconds + offsets[hour_index.reshape(-1)], unit='s'))
+
+
+def parse_log_timestamps(dates, times):
+    """Combines arrays of BlueFors 'YY-MM-DD' dates and 'HH:MM:SS' times into a DatetimeIndex.
+
+    The fields have a fixed width, so the digits are read straight from the
+    bytes; anything else falls back to pd.to_datetime, with NaT for lines
+    that are not valid timestamps.
+    """
+    try:
+        date_bytes = np.asarray(dates, dtype='S9').view(np.uint8).reshape(-1, 9)
+        time_bytes = np.asarray(times, dtype='S9').view(np.uint8).reshape(-1, 9)
+    except (TypeError, ValueError, UnicodeEncodeError):
+        date_bytes = time_bytes = None
+    if date_bytes is not None:
+        digits = np.hstack([date_bytes, time_bytes])[:, [0, 1, 3, 4, 6, 7, 9, 10, 12, 13, 15, 16]].astype(np.int64) - 48
+        well_formed = (((digits >= 0) & (digits <= 9)).all()
+                       and (date_bytes[:, [2, 5]] == ord('-')).all() and (time_bytes[:, [2, 5]] == ord(':')).all()
+                       and not date_bytes[:, 8].any() and not time_bytes[:, 8].any())
+        if well_formed:
+            year, month, day, hour, minute, second = (digits[:, 0::2] * 10 + digits[:, 1::2]).T
+            months = ((year + 30) * 12 + month - 1).astype('datetime64[M]')  # Months since 1970-01
+            days = months.astype('datetime64[D]') + (day - 1)
+            in_range = ((month >= 1) & (month <= 12) & (day >= 1) & (hour < 24) & (minute < 60) & (second < 60)).all()
+            if in_range and (days.astype('datetime64[M]') == months).all():  # No day past the end of its month
+                timestamps = days + (hour * 3600 + minute * 60 + second).astype('timedelta64[s]')
+                return pd.DatetimeIndex(timestamps.astype('datetime64[ns]'))
+    return pd.DatetimeIndex(pd.to_datetime(pd.Series(dates) + ' ' + pd.Series(times), format='%y-%m-%d %H:%M:%S',
+                                           errors='coerce'))
+
+
+def format_timestamps(timestamps):
+    """Returns (timestamp strings, node keys) of a datetime Series, as object arrays.
+
+    Each distinct timestamp is formatted once; BlueFors channels logged at the
+    same time and Triton records share the work.
+    """
+    codes, uniques = pd.factorize(timestamps)
+    strings = np.asarray(uniques.strftime(TIMESTAMP_FORMAT), dtype=object)
+    keys = np.array([string.replace(' ', '_').replace(':', '_') for string in strings.tolist()], dtype=object)
+    return strings[codes], keys[codes]
+
+
+def serialize_bluefors(df, log_type, base_path):
+    """Builds {path: payload} writes for a DataFrame from BlueForsLogReader.get_logs.
+
+    Timestamps, keys and paths are formatted column-wise, rows without a value
+    are dropped with a mask, and the payloads are built from the columns.
+    """
+    if df.empty:
+        return {}
+    value_column = 'flow_rate' if log_type == "flow_rate" else 'value'
+    if log_type != "status":
+        df = df[df[value_column].notna()]
+    timestamps, keys = format_timestamps(df['timestamp'])
+    if log_type in ["temperature", "pressure", "resistance"]:
+        channels = np.array([f"CH{channel}" for channel in range(7)], dtype=object)[df['channel'].to_numpy()]
+        paths = f"{base_path}/{log_type}/" + channels + '/' + keys
+        payloads = [{'timestamp': timestamp, 'value': value, 'channel': channel}
+                    for timestamp, value, channel in zip(timestamps.tolist(), df['value'].astype(float).tolist(),
+                                                         channels.tolist())]
+    elif log_type == "flow_rate":
+        paths = f"{base_path}/flow_rate/" + keys
+        payloads = [{'timestamp': timestamp, 'value': value}
+                    for timestamp, value in zip(timestamps.tolist(), df['flow_rate'].astype(float).tolist())]
+    elif log_type == "status":
+        paths = f"{base_path}/status/" + keys
+        states = df.drop(columns=['timestamp'])
+        records = states.to_dict('records')
+        if states.isna().any(axis=None):  # Lines without some of the names (the channel set changed)
+            records = [{name: state for name, state in record.items() if pd.notna(state)}
+                       for record in records]
+        payloads = [{'timestamp': timestamp, **record} for timestamp, record in zip(timestamps.tolist(), records)]
+    else:
+        raise ValueError(f"Unknown log type: {log_type}")
+    return dict(zip(paths.tolist(), payloads))
+
+
+def serialize_triton(df, base_path):
+    """Builds {path: payload} writes for a DataFrame from TritonLogReader.get_df.
+
+    Zero and NaN readings are left out of the payloads, and records left with
+    only a timestamp are dropped. Timestamps are local time, like the log files.
+    """
+    seconds = pd.to_numeric(df['Time(secs)'], errors='coerce')
+    df = df[seconds.notna()]
+    if df.empty:
+        return {}
+    timestamps, keys = format_timestamps(triton_timestamps(df['Time(secs)'].to_numpy()))
+    values = df.drop(columns=['Time(secs)'])
+    columns = [series_key(column) for column in values.columns]  # Firebase rejects keys like 'Flow(umol/s)'
+    data = values.to_numpy(dtype=float)
+    keep = (data != 0) & ~np.isnan(data)
+
+    payloads = [{'timestamp': timestamp} for timestamp in timestamps.tolist()]
+    # Fill the payloads one column at a time, only with the cells the mask keeps
+    for column_index, column in enumerate(columns):
+        rows = np.flatnonzero(keep[:, column_index])
+        for row, value in zip(rows.tolist(), data[rows, column_index].tolist()):
+            payloads[row][column] = value
+
+    has_data = keep.any(axis=1)
+    paths = f"{base_path}/" + keys[has_data]
+    return dict(zip(paths.tolist(), (payload for payload, kept in zip(payloads, has_data.tolist()) if kept)))
@@ -0,0 +1,208 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from serializers import parse_log_timestamps
+
+CHUNK_BYTES = 1 << 22  # Bytes parsed at a time
+
+# Status log
+# ----------
+# Each line of a BlueFors 'Channels YY-MM-DD.log' holds the state of the
+# valves, pumps and heat switches:
+#
+#   22-07-20,00:00:00,1,v1,0,v2,1,...,scroll1,1,turbo1,0,...
+#
+# i.e. date, time, a flag, then name,value pairs. The set of names can change
+# from one line to the next (e.g. after a configuration change), so the names
+# of every line are read, not only those of the first or last line. The flag
+# is not part of the state and is dropped.
+#
+# The file is parsed a block of lines at a time with pandas' C parser. States
+# that are all 0/1 become bool columns and other whole numbers int64 columns;
+# a column that some lines lack uses the nullable 'boolean'/'Int64' dtypes.
+
+
+def _parse_block(data):
+    """Parses complete status lines into a DataFrame of timestamp and float state columns."""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    line_ends = np.append(np.flatnonzero(raw == ord('\n')), len(raw) - 1)
+    width = int(np.diff(np.cumsum(raw == ord(','))[line_ends], prepend=0).max()) + 1  # Fields of the longest line
+    if width < 5:
+        return pd.DataFrame(columns=['timestamp'])
+    name_columns = list(range(3, width, 2))
+    value_columns = list(range(4, width, 2))
+    df = pd.read_csv(io.BytesIO(data), header=None, names=range(width),
+                     dtype={position: object for position in [0, 1] + name_columns})
+    timestamps = parse_log_timestamps(df[0].to_numpy(), df[1].to_numpy())
+    values = df[value_columns]
+    if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in values.dtypes):
+        values = values.apply(pd.to_numeric, errors='coerce')
+    values = values.to_numpy(dtype=np.float64)
+
+    # Usually every line has the same names; otherwise split the lines by their set of names
+    names = df[name_columns].to_numpy()
+    if (names == names[0]).all():
+        groups = [(names[0], np.arange(len(df)))]
+    else:
+        codes = np.column_stack([pd.factorize(column)[0] for column in names.T])  # Missing names get -1
+        _, first_rows, line_groups = np.unique(codes, axis=0, return_index=True, return_inverse=True)
+        line_groups = line_groups.ravel()
+        groups = [(names[first_row], np.flatnonzero(line_groups == group)) for group, first_row in enumerate(first_rows)]
+    frames = []
+    for line_names, rows in groups:
+        keep = [column for column, name in enumerate(line_names) if isinstance(name, str)]  # Not NaN
+        frame = pd.DataFrame(values[rows][:, keep], index=rows, columns=[line_names[column] for column in keep])
+        frames.append(frame.loc[:, ~frame.columns.duplicated(keep='last')])
+    states = frames[0] if len(frames) == 1 else pd.concat(frames).sort_index()
+    states.insert(0, 'timestamp', timestamps[states.index])
+    return states[states['timestamp'].notna()].reset_index(drop=True)  # Drops malformed lines
+
+
+def type_states(df):
+    """Converts the float state columns of a parsed status log to bool, int64 or their nullable dtypes."""
+    columns = [column for column in df.columns if column != 'timestamp' and df[column].dtype == np.float64]
+    if not columns:
+        return df
+    values = df[columns].to_numpy()
+    missing = np.isnan(values)
+    whole = ((values == np.round(values)) | missing).all(axis=0)
+    binary = ((values == 0) | (values == 1) | missing).all(axis=0)
+    any_missing = missing.any(axis=0)
+    typed = {}
+    for position, column in enumerate(columns):
+        column_values, column_missing = values[:, position], missing[:, position]
+        if not whole[position]:
+            typed[column] = column_values  # Not whole numbers; keep floats
+        elif not any_missing[position]:
+            typed[column] = column_values == 1 if binary[position] else column_values.astype(np.int64)
+        elif binary[position]:
+            typed[column] = pd.array(np.where(column_missing, None, column_values == 1), dtype='boolean')
+        else:
+            typed[column] = pd.array(np.where(column_missing, None, column_values), dtype='Int64')
+    return pd.DataFrame({column: typed[column] if column in typed else df[column] for column in df.columns},
+                        index=df.index)
+
+
+def parse_status_lines(data):
+    """Parses complete status lines (bytes) into a typed DataFrame, e.g. the last line of a log."""
+    return type_states(_parse_block(data))
+
+
+def _iter_blocks(file_path, offset, chunk_bytes, final):
+    """Yields (untyped DataFrame, offset after its lines) for the complete lines from offset on.
+
+    With final, a last line without a newline is parsed as well.
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        partial = b''
+        while True:
+            chunk = f.read(chunk_bytes)
+            if not chunk:
+                break
+            data = partial + chunk
+            end = data.rfind(b'\n') + 1
+            partial = data[end:]
+            if end:
+                offset += end
+                yield _parse_block(data[:end - 1]), offset
+        if final and partial.strip():
+            yield _parse_block(partial), offset + len(partial)
+
+
+def _concat(frames):
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def iter_status(file_path, offset=0, chunk_bytes=CHUNK_BYTES):
+    """Yields (typed DataFrame, offset after its lines) for each block of a status log, from offset on."""
+    for df, end in _iter_blocks(file_path, offset, chunk_bytes, final=True):
+        yield type_states(df), end
+
+
+def read_status(file_path, chunk_bytes=CHUNK_BYTES):
+    """Reads a whole status log into a DataFrame with a timestamp column and one typed column per name."""
+    if not os.path.exists(file_path):
+        print(f"File not found: {file_path}")
+        return pd.DataFrame()
+    try:
+        df = _concat([block for block, _ in _iter_blocks(file_path, 0, chunk_bytes, final=True)])
+    except Exception as e:
+        print(f"Error reading {file_path}: {e}")
+        return pd.DataFrame()
+    if df.empty:
+        print(f"No data found in {file_path}")
+    return type_states(df)
+
+
+def status_changes(df, previous=None):
+    """Returns the rows of a status DataFrame whose state differs from the row before.
+
+    previous is the (columns, values) of the row before the first one, e.g.
+    from an earlier read; without it, the first row is a change.
+    """
+    if df.empty:
+        return df
+    states = df.drop(columns=['timestamp'])
+    values = states.to_numpy(dtype=np.float64, na_value=np.nan)
+    first = np.full(values.shape[1], np.nan)
+    if previous is not None:
+        columns, row = previous
+        first = pd.Series(row, index=columns).reindex(states.columns).to_numpy(dtype=np.float64)
+    before = np.vstack([first, values[:-1]])
+    same = (values == before) | (np.isnan(values) & np.isnan(before))
+    changed = ~same.all(axis=1)
+    if previous is None:
+        changed[0] = True
+    return df[changed]
+
+
+class StatusTailer:
+    """Parses the lines appended to a status log since the previous call.
+
+    The file is read from offset (0, or one saved from an earlier run) and
+    each call resumes where the previous one stopped; a replaced or truncated
+    file is read again from the start. A trailing line without newline is
+    left for the next call.
+    """
+
+    def __init__(self, file_path, offset=0, chunk_bytes=CHUNK_BYTES):
+        self.file_path = file_path
+        self.offset = offset
+        self.chunk_bytes = chunk_bytes
+        self.inode = None
+        self._last = None  # (columns, values) of the last row read
+
+    def read_new(self):
+        """Returns a typed DataFrame of the new complete lines (empty if there are none)."""
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return pd.DataFrame()
+        if (self.inode is not None and stat.st_ino != self.inode) or stat.st_size < self.offset:
+            self.offset = 0
+            self._last = None
+        self.inode = stat.st_ino
+        if stat.st_size == self.offset:
+            return pd.DataFrame()
+        frames = []
+        for df, end in _iter_blocks(self.file_path, self.offset, self.chunk_bytes, final=False):
+            frames.append(df)
+            self.offset = end
+        return type_states(_concat(frames))
+
+    def changes(self):
+        """Returns the new lines whose state differs from the line before (all of them are read)."""
+        df = self.read_new()
+        if df.empty:
+            return df
+        changed = status_changes(df, self._last)
+        states = df.drop(columns=['timestamp'])
+        self._last = (list(states.columns), states.iloc[-1].to_numpy(dtype=np.float64, na_value=np.nan))
+        return changed
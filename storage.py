@@ -0,0 +1,374 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+DEFAULT_BACKEND = "firebase"
+DEFAULT_LOCAL_FILE = "local_db.sqlite"
+
+_storage = None
+
+
+def init_storage(credential=None, database_url=None, backend=None, path=None):
+    """Selects the database used by reference(), from STORAGE_BACKEND unless given.
+
+    "firebase" connects to the Realtime Database at database_url with credential
+    (a service account file path or dict). "local" stores everything in a SQLite
+    file (path, or STORAGE_FILE; ":memory:" keeps it in memory), for running and
+    benchmarking the pipeline without Firebase.
+    """
+    global _storage
+    backend = backend or os.getenv("STORAGE_BACKEND", DEFAULT_BACKEND)
+    if backend == "firebase":
+        _storage = FirebaseStorage(credential, database_url)
+    elif backend == "local":
+        _storage = LocalStorage(path or os.getenv("STORAGE_FILE", DEFAULT_LOCAL_FILE))
+    else:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    return _storage
+
+
+def is_initialized():
+    return _storage is not None
+
+
+def reference(path='/'):
+    """Returns a reference to path in the database selected by init_storage()."""
+    if _storage is None:
+        raise RuntimeError("init_storage() must be called before using the database")
+    return _storage.reference(path)
+
+
+# --- Firebase ---
+
+class FirebaseStorage:
+    """The Firebase Realtime Database; references are firebase_admin.db references."""
+
+    def __init__(self, credential=None, database_url=None):
+        import firebase_admin
+        from firebase_admin import credentials, db
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(credentials.Certificate(credential), {'databaseURL': database_url})
+        self._db = db
+
+    def reference(self, path='/'):
+        return self._db.reference(path)
+
+
+# --- Local SQLite ---
+
+_FORBIDDEN_PATH_CHARACTERS = '.$#[]'
+_FORBIDDEN_KEY_CHARACTERS = _FORBIDDEN_PATH_CHARACTERS + '/'  # A key of a value is a single segment
+
+
+def _split(path):
+    return [segment for segment in path.split('/') if segment]
+
+
+def _join(segments):
+    return '/'.join(segments)
+
+
+def _subtree_bounds(path):
+    # Every descendant path of 'a/b' sorts between 'a/b/' and 'a/b0' ('0' follows '/')
+    return (path + '/', path + '0') if path else ('', '\U0010ffff')
+
+
+def _check_segments(path):
+    """Raises ValueError if a segment of a written path holds a character Firebase does not allow in keys."""
+    for segment in _split(path):
+        if any(character in segment for character in _FORBIDDEN_PATH_CHARACTERS):
+            raise ValueError(f"Invalid key in path {path!r}: keys cannot contain . $ # [ ]")
+
+
+def _check_overlaps(paths):
+    """Raises ValueError if one path of a multi-path update is another or an ancestor of another."""
+    written = set()
+    for path in paths:
+        if path in written:
+            raise ValueError(f"Path {path!r} is written twice in one update")
+        written.add(path)
+    for path in written:
+        segments = path.split('/')
+        for depth in range(1, len(segments)):
+            ancestor = '/'.join(segments[:depth])
+            if ancestor in written:
+                raise ValueError(f"Path {ancestor!r} is an ancestor of {path!r} in the same update")
+
+
+def _flatten(path, value, leaves):
+    if isinstance(value, dict):
+        for key, child in value.items():
+            if any(character in str(key) for character in _FORBIDDEN_KEY_CHARACTERS):
+                raise ValueError(f"Invalid key {key!r} below {path!r}: keys cannot contain . $ # [ ] /")
+            _flatten(f"{path}/{key}" if path else str(key), child, leaves)
+    elif isinstance(value, (list, tuple)):
+        for index, child in enumerate(value):
+            _flatten(f"{path}/{index}" if path else str(index), child, leaves)
+    elif value is not None:
+        leaves.append((path, value))
+
+
+def _encode(value):
+    # Booleans are stored as integers with a type flag, other values as they are
+    if isinstance(value, bool):
+        return int(value), 'b'
+    if isinstance(value, (int, float, str)):
+        return value, None
+    raise TypeError(f"Cannot store value of type {type(value).__name__}")
+
+
+def _decode(value, value_type):
+    return bool(value) if value_type == 'b' else value
+
+
+def _sort_key(value):
+    # Firebase orders null < false < true < numbers < strings < objects
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, 0)
+
+
+def _unflatten(base, rows):
+    """Builds the nested value at base from (path, value, type) leaf rows."""
+    tree = None
+    prefix_length = len(base) + 1 if base else 0
+    for path, value, value_type in rows:
+        value = _decode(value, value_type)
+        if path == base:
+            return value
+        segments = path[prefix_length:].split('/')
+        if tree is None:
+            tree = {}
+        node = tree
+        for segment in segments[:-1]:
+            node = node.setdefault(segment, {})
+        node[segments[-1]] = value
+    return tree
+
+
+class LocalStorage:
+    """Realtime Database stand-in backed by one SQLite table of leaf values.
+
+    Each leaf (scalar) of the tree is a row keyed by its full path, together
+    with its parent and grandparent paths, so a subtree is one range scan on the
+    path and order_by_child() queries use an index on (grandparent, name, value).
+    set(), update() and get() follow Firebase: writing None or an empty dict
+    deletes, a write replaces everything below its path, and get() returns
+    nested dicts (or None).
+    """
+
+    def __init__(self, path=DEFAULT_LOCAL_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS nodes (
+                path TEXT PRIMARY KEY,
+                parent TEXT NOT NULL,
+                grandparent TEXT,
+                name TEXT NOT NULL,
+                value,
+                type TEXT
+            ) WITHOUT ROWID""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS nodes_by_child ON nodes (grandparent, name, value)")
+        self._conn.commit()
+
+    def reference(self, path='/'):
+        return LocalReference(self, _join(_split(path)))
+
+    def _write(self, values):
+        """Replaces the subtree at each path of a {path: value} dict, in one pass per statement."""
+        subtrees, ancestors, rows = [], set(), []
+        for path, value in values.items():
+            subtrees.append(_subtree_bounds(path))
+            segments = path.split('/')
+            # A leaf at the path or above it is replaced by the new subtree
+            ancestors.update('/'.join(segments[:depth]) for depth in range(1, len(segments) + 1))
+            leaves = []
+            _flatten(path, value, leaves)
+            for leaf_path, leaf_value in leaves:
+                parent, _, name = leaf_path.rpartition('/')
+                stored, value_type = _encode(leaf_value)
+                rows.append((leaf_path, parent, parent.rpartition('/')[0] if parent else None,
+                             name, stored, value_type))
+        self._conn.executemany("DELETE FROM nodes WHERE path >= ? AND path < ?", subtrees)
+        self._conn.executemany("DELETE FROM nodes WHERE path = ?", [(path,) for path in ancestors])
+        self._conn.executemany("INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def set(self, path, value):
+        _check_segments(path)
+        with self._lock, self._conn:
+            self._write({path: value})
+
+    def update(self, path, values):
+        """Writes each value of a {relative path: value} dict below path, in one transaction.
+
+        As in Firebase, the whole update is rejected (ValueError) if a path or
+        key holds a forbidden character, or if one path is an ancestor of another.
+        """
+        prefix = _split(path)
+        for child_path in values:
+            _check_segments(child_path)
+        paths = [_join(prefix + _split(child_path)) for child_path in values]
+        _check_overlaps(paths)
+        with self._lock, self._conn:
+            self._write(dict(zip(paths, values.values())))
+
+    def get(self, path):
+        low, high = _subtree_bounds(path)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, value, type FROM nodes WHERE path = ? OR (path >= ? AND path < ?) ORDER BY path",
+                (path, low, high)).fetchall()
+        return _unflatten(path, rows)
+
+    def get_shallow(self, path):
+        """Returns {child key: True for subtrees, the value for leaves}, skipping from child to child."""
+        low, high = _subtree_bounds(path)
+        children = {}
+        with self._lock:
+            row = self._conn.execute("SELECT value, type FROM nodes WHERE path = ?", (path,)).fetchone()
+            if row is not None:
+                return _decode(*row)
+            while True:
+                row = self._conn.execute(
+                    "SELECT path, value, type FROM nodes WHERE path >= ? AND path < ? ORDER BY path LIMIT 1",
+                    (low, high)).fetchone()
+                if row is None:
+                    break
+                key, _, rest = row[0][len(path) + 1 if path else 0:].partition('/')
+                children[key] = True if rest else _decode(row[1], row[2])
+                low = _join(_split(path) + [key]) + '0'
+        return children or None
+
+    def query(self, path, child, start_at=None, end_at=None, limit_to_first=None, limit_to_last=None):
+        """Children of path ordered by their `child` value, as an OrderedDict of key -> subtree.
+
+        Children without the value sort first, as in Firebase. Unless start_at
+        excludes them, the query may need them, and is then answered from the
+        whole subtree instead of the index.
+        """
+        if start_at is None and limit_to_last is None:
+            return self._query_subtree(path, child, end_at, limit_to_first, limit_to_last)
+        conditions, parameters = ["grandparent = ?", "name = ?"], [path, child]
+        if start_at is not None:
+            conditions.append("value >= ?")
+            parameters.append(_encode(start_at)[0])
+        if end_at is not None:
+            conditions.append("value <= ?")
+            parameters.append(_encode(end_at)[0])
+        selection = f"SELECT parent, value FROM nodes WHERE {' AND '.join(conditions)}"
+        if limit_to_last is not None:
+            selection = (f"SELECT * FROM ({selection} ORDER BY value DESC, parent DESC LIMIT {int(limit_to_last)}) "
+                         "ORDER BY value, parent")
+        else:
+            selection += " ORDER BY value, parent"
+            if limit_to_first is not None:
+                selection += f" LIMIT {int(limit_to_first)}"
+        with self._lock:
+            children = [row[0] for row in self._conn.execute(selection, parameters)]
+            if start_at is None and len(children) < limit_to_last:
+                children = None
+            else:
+                result = OrderedDict()
+                for child_path in children:
+                    low, high = _subtree_bounds(child_path)
+                    rows = self._conn.execute(
+                        "SELECT path, value, type FROM nodes WHERE path >= ? AND path < ? ORDER BY path",
+                        (low, high)).fetchall()
+                    result[child_path.rsplit('/', 1)[-1]] = _unflatten(child_path, rows)
+        if children is None:
+            return self._query_subtree(path, child, end_at, limit_to_first, limit_to_last)
+        return result
+
+    def _query_subtree(self, path, child, end_at, limit_to_first, limit_to_last):
+        data = self.get(path)
+        if not isinstance(data, dict):
+            return OrderedDict()
+
+        def child_value(item):
+            return item[1].get(child) if isinstance(item[1], dict) else None
+
+        items = [item for item in data.items()
+                 if end_at is None or (child_value(item) is not None and _sort_key(child_value(item)) <= _sort_key(end_at))]
+        items.sort(key=lambda item: (_sort_key(child_value(item)), item[0]))
+        if limit_to_first is not None:
+            items = items[:limit_to_first]
+        if limit_to_last is not None:
+            items = items[-limit_to_last:] if limit_to_last else []
+        return OrderedDict(items)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LocalReference:
+    """A path in a LocalStorage, with the firebase_admin.db.Reference methods used here."""
+
+    def __init__(self, storage, path):
+        self._storage = storage
+        self.path = '/' + path
+        self._path = path
+        self.key = _split(path)[-1] if path else None
+
+    def child(self, path):
+        return LocalReference(self._storage, _join(_split(self._path) + _split(path)))
+
+    def get(self, shallow=False):
+        return self._storage.get_shallow(self._path) if shallow else self._storage.get(self._path)
+
+    def set(self, value):
+        self._storage.set(self._path, value)
+
+    def update(self, values):
+        self._storage.update(self._path, values)
+
+    def delete(self):
+        self._storage.set(self._path, None)
+
+    def order_by_child(self, path):
+        return LocalQuery(self._storage, self._path, path)
+
+
+class LocalQuery:
+    """order_by_child() query on a LocalReference."""
+
+    def __init__(self, storage, path, child):
+        self._storage = storage
+        self._path = path
+        self._child = child
+        self._start_at = None
+        self._end_at = None
+        self._limit_to_first = None
+        self._limit_to_last = None
+
+    def start_at(self, start):
+        self._start_at = start
+        return self
+
+    def end_at(self, end):
+        self._end_at = end
+        return self
+
+    def limit_to_first(self, limit):
+        self._limit_to_first = limit
+        return self
+
+    def limit_to_last(self, limit):
+        self._limit_to_last = limit
+        return self
+
+    def get(self):
+        return self._storage.query(self._path, self._child, self._start_at, self._end_at,
+                                   self._limit_to_first, self._limit_to_last)
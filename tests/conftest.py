@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+
+import pytest
+
+# The modules live at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import storage  # noqa: E402
+
+
+class FlakyRef:
+    """Stands in for the root reference; the first `failures` update() calls raise."""
+
+    def __init__(self, failures=1):
+        self.failures = failures
+        self.data = {}
+
+    def update(self, batch):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unreachable")
+        self.data.update(batch)
+
+
+class Recorder:
+    """Stands in for a writer, keeping the flat {path: value} the database would hold."""
+
+    def __init__(self):
+        self.data = {}
+
+    def set(self, path, value):
+        if value is None:
+            self.data.pop(path, None)
+        else:
+            self.data[path] = value
+
+    def update(self, payloads):
+        for path, value in payloads.items():
+            self.set(path, value)
+
+    def children(self, path):
+        """Returns {child key: {rest of the path: value}} of the writes below path."""
+        children = {}
+        for written, value in self.data.items():
+            if written.startswith(path + '/'):
+                child, rest = written[len(path) + 1:].split('/', 1)
+                children.setdefault(child, {})[rest] = value
+        return children
+
+
+@pytest.fixture
+def flaky_ref():
+    """Returns the FlakyRef class, to build references that fail a given number of times."""
+    return FlakyRef
+
+
+@pytest.fixture
+def recorder():
+    return Recorder()
+
+
+@pytest.fixture
+def wait_until_sent():
+    """Returns a function that waits (up to a timeout) until an outbox has sent everything."""
+    def wait(outbox, timeout=10):
+        deadline = time.monotonic() + timeout
+        while outbox.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+    return wait
+
+
+@pytest.fixture
+def local_database(tmp_path, monkeypatch):
+    """Selects a fresh LocalStorage for storage.reference() and returns its root reference."""
+    monkeypatch.setattr(storage, '_storage', None)
+    storage.init_storage(backend="local", path=str(tmp_path / "db.sqlite"))
+    return storage.reference('/')
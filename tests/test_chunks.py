@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from chunks import ChunkAppender, decode_series, encode_segment, serialize_series
+
+SERIES = "test/_chunks/24-01-01/temperature/CH1"
+
+
+def times(start, count):
+    return pd.date_range(f"2024-01-01 {start}", periods=count, freq="10s")
+
+
+def test_compaction_leaves_one_segment_per_block(recorder):
+    writer = recorder
+    appender = ChunkAppender(writer, block_seconds=600)
+    for cycle in range(3):  # Three monitor cycles in the same block
+        appender.append_many(SERIES, times(f"00:0{cycle}:00", 3), [float(cycle)] * 3)
+    appender.append(SERIES, pd.Timestamp("2024-01-01 00:04:00"), 3.0)
+    appender.append_many(SERIES, times("00:10:00", 2), [4.0, 4.0])  # Moves on to the next block
+
+    blocks = writer.children(SERIES)
+    assert list(blocks["2024-01-01_00_00_00"]) == ["s0"]
+    assert list(blocks["2024-01-01_00_10_00"]) == ["s0"]
+    decoded_times, decoded_values = decode_series(blocks)
+    assert len(decoded_times) == 12
+    assert decoded_values.tolist() == [0.0] * 3 + [1.0] * 3 + [2.0] * 3 + [3.0] + [4.0] * 2
+
+
+def test_serialized_series_decodes_to_the_readings(recorder):
+    timestamps = pd.date_range("2024-01-01 00:00:00", periods=200, freq="7s")
+    values = np.linspace(-1.5, 2.5, 200)
+    values[5] = np.nan  # Left out, as in the other layouts
+    recorder.update(serialize_series(SERIES, timestamps[::-1], values[::-1], block_seconds=600))
+
+    decoded_times, decoded_values = decode_series(recorder.children(SERIES))
+    keep = ~np.isnan(values)
+    assert decoded_times.tolist() == timestamps[keep].to_numpy(dtype='datetime64[s]').tolist()
+    assert decoded_values.tolist() == values[keep].tolist()
+
+
+def test_encoded_segment_round_trips_exactly():
+    offsets = [0, 1, 599]
+    values = [1e-300, -0.0, 273.15]
+    block = encode_segment(offsets, values)
+    decoded_times, decoded_values = decode_series({"2024-01-01_00_00_00": {"s0": block}})
+    assert decoded_times.astype(np.int64).tolist() == [1704067200, 1704067201, 1704067799]
+    assert decoded_values.tolist() == values
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+import log_to_db
+import storage
+from date_index import IndexWriter
+from outbox import Outbox
+from rollups import RollupWriter
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch, local_database):
+    monkeypatch.setattr(log_to_db, 'PC_NAME', 'test', raising=False)
+    outbox = Outbox(str(tmp_path / "outbox.sqlite"), ref=local_database, idle_interval=0.01).start()
+    yield outbox
+    outbox.close()
+
+
+def readings(start, count, first_value=0.0):
+    timestamps = pd.date_range(f"2024-01-01 {start}", periods=count, freq="10s")
+    return pd.DataFrame({'timestamp': timestamps, 'value': [first_value + i for i in range(count)]})
+
+
+def test_monitor_writes_the_index_entry(outbox, wait_until_sent):
+    index = IndexWriter(outbox)
+    log_to_db.upload_readings_bluefors({('24-01-01', 'temperature', 'CH1'): readings("00:00:00", 3)}, outbox,
+                                       index=index)
+    outbox.flush()
+    wait_until_sent(outbox)
+
+    assert storage.reference("test/_index/24-01-01/temperature").get() == {
+        'count': 3, 'first': "2024-01-01 00:00:00", 'last': "2024-01-01 00:00:20"}
+
+
+def test_restart_counts_the_readings_uploaded_before(outbox, wait_until_sent):
+    index, rollups = IndexWriter(outbox), RollupWriter(outbox)
+    # Read from the start of the date after a restart: the first 4 were uploaded before it
+    log_to_db.restore_bluefors({('24-01-01', 'temperature', 'CH1'): readings("00:00:00", 4)}, rollups, index)
+    log_to_db.upload_readings_bluefors({('24-01-01', 'temperature', 'CH1'): readings("00:00:40", 2, 4.0)}, outbox,
+                                       rollups=rollups, index=index)
+    outbox.flush()
+    wait_until_sent(outbox)
+
+    assert storage.reference("test/_index/24-01-01/temperature").get() == {
+        'count': 6, 'first': "2024-01-01 00:00:00", 'last': "2024-01-01 00:00:50"}
+    bucket = storage.reference("test/_rollups/1m/24-01-01/temperature/CH1/2024-01-01_00_00_00").get()
+    assert (bucket['count'], bucket['min'], bucket['max'], bucket['mean']) == (6, 0.0, 5.0, 2.5)
@@ -0,0 +1,44 @@
+import sqlite3
+
+from outbox import Outbox
+
+
+def test_failed_batch_is_retried_and_acknowledged(tmp_path, flaky_ref, wait_until_sent):
+    ref = flaky_ref(failures=2)
+    outbox = Outbox(str(tmp_path / "outbox.sqlite"), ref=ref, batch_size=2, min_backoff=0.01, idle_interval=0.01)
+    outbox.update({"a/1": 1, "a/2": 2, "a/3": 3})
+    outbox.flush()
+    outbox.start()
+    wait_until_sent(outbox)
+    outbox.close()
+
+    assert ref.data == {"a/1": 1, "a/2": 2, "a/3": 3}
+    assert [acked_id for acked_id, _ in outbox.take_acks()] == [2, outbox.last_id()]
+
+
+class RejectingRef:
+    """Rejects, like Firebase, any write whose value has a key containing '/'."""
+
+    def __init__(self):
+        self.data = {}
+
+    def update(self, batch):
+        for value in batch.values():
+            if isinstance(value, dict) and any('/' in key for key in value):
+                raise ValueError("Invalid key")
+        self.data.update(batch)
+
+
+def test_rejected_write_goes_to_dead_letter_without_blocking_the_queue(tmp_path, wait_until_sent):
+    ref = RejectingRef()
+    outbox = Outbox(str(tmp_path / "outbox.sqlite"), ref=ref, batch_size=10, idle_interval=0.01)
+    outbox.update({"a/1": {'Flow(umol/s)': 1.0}, "a/2": {'value': 2.0}})
+    outbox.flush()
+    outbox.start()
+    wait_until_sent(outbox)
+    outbox.close()
+
+    assert ref.data == {"a/2": {'value': 2.0}}
+    assert (outbox.points_sent, outbox.points_rejected) == (1, 1)
+    with sqlite3.connect(outbox.path) as conn:
+        assert conn.execute("SELECT path, error FROM dead_letter").fetchall() == [("a/1", "Invalid key")]
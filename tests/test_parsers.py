@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+import parsers
+from benchmarks.generators import write_triton_vcl
+from benchmarks.run import load_fallback_parsers
+
+
+@pytest.fixture(scope="module")
+def fallback():
+    """parsers.py as loaded without NumPy."""
+    return load_fallback_parsers()
+
+
+@pytest.fixture
+def vcl_path(tmp_path):
+    return write_triton_vcl(str(tmp_path), duration=3600, interval=10.0)
+
+
+def assert_same_columns(numpy_data, fallback_data):
+    assert len(fallback_data) == len(numpy_data)
+    for numpy_column, fallback_column in zip(numpy_data, fallback_data):
+        assert fallback_column.tolist() == numpy_column.tolist()
+
+
+def test_fallback_matches_numpy_on_generated_logs(fallback, vcl_path):
+    titles, data = parsers.parse(vcl_path)
+    assert len(titles) == 24 and data.shape == (24, 360)
+    fallback_titles, fallback_data = fallback.parse(vcl_path)
+    assert fallback_titles == titles
+    assert_same_columns(data, fallback_data)
+
+    for parse_records in ("parse_from", "parse_last"):
+        titles, data, offset = getattr(parsers, parse_records)(vcl_path)
+        fallback_titles, fallback_data, fallback_offset = getattr(fallback, parse_records)(vcl_path)
+        assert (fallback_titles, fallback_offset) == (titles, offset)
+        assert_same_columns(data, fallback_data)
+
+
+@pytest.fixture(params=["numpy", "fallback"])
+def implementation(request, fallback):
+    return parsers if request.param == "numpy" else fallback
+
+
+RECORD_SIZE = 8 * 25  # Size, then one double per title
+DATA_OFFSET = 0x3000
+
+
+def test_parse_from_resumes_at_a_mid_file_offset(implementation, vcl_path):
+    _, data = parsers.parse(vcl_path)
+    offset = DATA_OFFSET + 100 * RECORD_SIZE
+    titles, resumed, end = implementation.parse_from(vcl_path, offset)
+    assert len(titles) == 24
+    assert_same_columns(data[:, 100:], resumed)
+    assert end == DATA_OFFSET + 360 * RECORD_SIZE
+    _, nothing_new, same_end = implementation.parse_from(vcl_path, end)
+    assert [len(column) for column in nothing_new] == [0] * 24 and same_end == end
+    with pytest.raises(ValueError):
+        implementation.parse_from(vcl_path, offset + 8)
+
+
+def test_parse_from_leaves_a_partial_record_for_the_next_call(implementation, vcl_path, tmp_path):
+    with open(vcl_path, 'rb') as f:
+        contents = f.read()
+    _, data = parsers.parse(vcl_path)
+    growing = tmp_path / "growing.vcl"
+    growing.write_bytes(contents[:DATA_OFFSET + 10 * RECORD_SIZE + 60])  # A record being written
+
+    _, first, offset = implementation.parse_from(str(growing))
+    assert_same_columns(data[:, :10], first)
+    assert offset == DATA_OFFSET + 10 * RECORD_SIZE
+    _, last, last_offset = implementation.parse_last(str(growing), 3)
+    assert_same_columns(data[:, 7:10], last)
+    assert last_offset == offset
+
+    with open(growing, 'ab') as f:
+        f.write(contents[DATA_OFFSET + 10 * RECORD_SIZE + 60:DATA_OFFSET + 12 * RECORD_SIZE])
+    _, appended, offset = implementation.parse_from(str(growing), offset)
+    assert_same_columns(data[:, 10:12], appended)
+    assert offset == DATA_OFFSET + 12 * RECORD_SIZE
+
+
+def test_parse_from_without_records(implementation, vcl_path, tmp_path):
+    with open(vcl_path, 'rb') as f:
+        header = f.read(DATA_OFFSET + 5)  # Not even the size of the first record
+    empty = tmp_path / "empty.vcl"
+    empty.write_bytes(header)
+    titles, data, offset = implementation.parse_from(str(empty))
+    assert len(titles) == 24 and [len(column) for column in data] == [0] * 24
+    assert offset == DATA_OFFSET
+
+
+def damaged_copy(vcl_path, tmp_path, truncate=0, faulty_record=None):
+    with open(vcl_path, 'rb') as f:
+        contents = bytearray(f.read())
+    if faulty_record is not None:
+        position = DATA_OFFSET + faulty_record * RECORD_SIZE
+        contents[position:position + 8] = b'\0' * 8  # A record size of 0
+    damaged = tmp_path / "damaged.vcl"
+    damaged.write_bytes(bytes(contents[:len(contents) - truncate]))
+    return str(damaged)
+
+
+@pytest.mark.parametrize("truncate, faulty_record, records, faulty_offset", [
+    (0, None, 360, None),
+    (RECORD_SIZE - 16, None, 359, DATA_OFFSET + 359 * RECORD_SIZE),  # Truncated final record
+    (5, None, 359, DATA_OFFSET + 359 * RECORD_SIZE),  # Not even a whole double
+    (0, 40, 40, DATA_OFFSET + 40 * RECORD_SIZE),
+])
+def test_parse_mmap_cuts_at_the_first_faulty_record(fallback, vcl_path, tmp_path,
+                                                    truncate, faulty_record, records, faulty_offset):
+    path = damaged_copy(vcl_path, tmp_path, truncate, faulty_record)
+    _, data = parsers.parse(vcl_path)
+    titles, mapped, offset = parsers.parse_mmap(path)
+    assert mapped.shape == (24, records) and offset == faulty_offset
+    np.testing.assert_array_equal(mapped, data[:, :records])
+
+    fallback_titles, fallback_mapped, fallback_offset = fallback.parse_mmap(path)
+    assert (fallback_titles, fallback_offset) == (titles, offset)
+    assert_same_columns(mapped, fallback_mapped)
@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generators import write_triton_vcl
+from reader import BlueForsLogReader, DayIndex, TritonLogTailer, read_last_line
+
+LOG_DATE = "22-07-20"
+
+
+def write_log(folder, file_name, times, values):
+    folder.mkdir(exist_ok=True)
+    with open(folder / file_name, 'w', newline='\n') as f:
+        f.writelines(f"{t.strftime('%y-%m-%d,%H:%M:%S')},{value}\n" for t, value in zip(times, values))
+
+
+def day_index(tmp_path):
+    folder = tmp_path / LOG_DATE
+    times = pd.date_range("2022-07-20", periods=30, freq="10s")
+    values = [float(i) for i in range(30)]
+    values[7] = float('nan')
+    order = list(range(20, 30)) + list(range(20))  # A restart wrote the file out of order
+    write_log(folder, f"CH1 T {LOG_DATE}.log", times[order], [values[i] for i in order])
+    write_log(folder, f"Flowmeter {LOG_DATE}.log", times[:3], [0.5, 0.6, 0.7])
+    return DayIndex(BlueForsLogReader(str(tmp_path), cache=False), LOG_DATE)
+
+
+def test_day_index_holds_every_series_sorted(tmp_path):
+    index = day_index(tmp_path)
+    assert index.series == ["temperature/CH1", "flow_rate"]
+    assert len(index) == 33
+    assert index.latest()["temperature/CH1"] == (pd.Timestamp("2022-07-20 00:04:50"), 29.0)
+    assert index.latest_entry()["flow_rate"]["value"] == 0.7
+
+
+def test_range_is_inclusive(tmp_path):
+    index = day_index(tmp_path)
+    df = index.range("temperature/CH1", "2022-07-20 00:01:00", "2022-07-20 00:01:30")
+    assert df['timestamp'].tolist() == list(pd.date_range("2022-07-20 00:01:00", periods=4, freq="10s"))
+    np.testing.assert_array_equal(df['value'], [6.0, np.nan, 8.0, 9.0])
+    assert len(index.range("temperature/CH1")) == 30
+    assert index.range("temperature/CH1", "2022-07-21").empty
+    assert index.range("pressure/CH1").empty
+
+
+def test_resample_skips_nan_readings(tmp_path):
+    index = day_index(tmp_path)
+    df = index.resample("temperature/CH1", 60, end="2022-07-20 00:02:30")
+    assert df['timestamp'].tolist() == list(pd.date_range("2022-07-20", periods=3, freq="min"))
+    assert df['count'].tolist() == [6, 5, 4]
+    assert df['min'].tolist() == [0.0, 6.0, 12.0]
+    assert df['max'].tolist() == [5.0, 11.0, 15.0]
+    assert df['value'].tolist() == [2.5, 44.0 / 5, 13.5]
+    assert index.resample("pressure/CH1", 60).empty
+
+
+def test_read_last_line_leaves_out_a_line_without_newline(tmp_path):
+    log = tmp_path / "CH1 T 22-07-20.log"
+    log.write_bytes(b"22-07-20,00:00:00,1.0\n22-07-20,00:00:10,2.0\n22-07-20,00:00")
+    assert read_last_line(str(log)) == ("22-07-20,00:00:10,2.0", 44)
+    log.write_bytes(b"22-07-20,00:00")
+    assert read_last_line(str(log)) == (None, 0)
+    assert read_last_line(str(tmp_path / "missing.log")) == (None, 0)
+
+
+def test_read_last_line_longer_than_a_block(tmp_path):
+    log = tmp_path / "Channels 22-07-20.log"
+    first = b"22-07-20,00:00:00,1," + b",".join(b"v%d,0" % i for i in range(10))
+    last = b"22-07-20,00:01:00,1," + b",".join(b"v%d,1" % i for i in range(2000))  # About 14 KiB
+    log.write_bytes(first + b"\n" + last + b"\n\n")
+    assert len(last) > 3 * 4096
+    line, offset = read_last_line(str(log))
+    assert line == last.decode()
+    assert offset == len(first) + len(last) + 3
+    assert read_last_line(str(log), block_size=7) == (line, offset)
+
+
+def test_triton_tailer_starts_over_when_the_file_is_replaced_or_truncated(tmp_path):
+    source = write_triton_vcl(str(tmp_path), duration=100, interval=10.0)
+    with open(source, 'rb') as f:
+        contents = f.read()
+    record_size = 8 * 25
+    vcl = tmp_path / "log.vcl"
+    vcl.write_bytes(contents[:-3 * record_size])
+    tailer = TritonLogTailer(str(vcl))
+    assert len(tailer.read_new_records()) == 7
+    assert tailer.read_new_records().empty
+
+    vcl.write_bytes(contents[:0x3000 + 2 * record_size])  # Truncated in place
+    assert len(tailer.read_new_records()) == 2
+
+    replacement = tmp_path / "new.vcl"
+    replacement.write_bytes(contents[:0x3000 + 4 * record_size])  # Longer than what was read
+    os.replace(replacement, vcl)
+    records = tailer.read_new_records()
+    assert len(records) == 4
+    assert records['Time(secs)'].tolist() == sorted(records['Time(secs)'].tolist())
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from ring_buffer import RecentReadings, RingBuffer
+
+
+def test_append_wraps_around_oldest_first():
+    buffer = RingBuffer(4)
+    for time in range(6):
+        buffer.append(time, float(time))
+    times, values = buffer.arrays()
+    assert len(buffer) == 4
+    assert times.tolist() == [2, 3, 4, 5]
+    assert values.tolist() == [2.0, 3.0, 4.0, 5.0]
+    assert buffer.last_time == 5
+
+
+def test_extend_across_the_end_matches_appends():
+    extended, appended = RingBuffer(5), RingBuffer(5)
+    for start, count in ((0, 3), (3, 4), (7, 12)):  # Wraps, then overflows the buffer
+        times = np.arange(start, start + count)
+        extended.extend(times, times * 0.5)
+        for time in times.tolist():
+            appended.append(time, time * 0.5)
+        assert [array.tolist() for array in extended.arrays()] == [array.tolist() for array in appended.arrays()]
+    assert extended.arrays()[0].tolist() == [14, 15, 16, 17, 18]
+    assert extended.last_time == 18
+
+
+def test_stats_over_the_window_after_wraparound():
+    buffer = RingBuffer(4)
+    buffer.extend(np.arange(6) * 10**9, [0.0, 1.0, 2.0, np.nan, 4.0, 5.0])
+    stats = buffer.stats(window_seconds=2)  # Readings at 3, 4 and 5 s; the NaN is left out
+    assert stats == {'count': 2, 'mean': 4.5, 'min': 4.0, 'max': 5.0, 'slope': 1.0}
+    assert buffer.stats()['count'] == 3
+
+
+def test_recent_readings_keeps_the_last_readings_per_series():
+    readings = RecentReadings(size=3, window_seconds=60)
+    readings.add("temperature/CH1", pd.date_range("2024-01-01", periods=5, freq="s"), np.arange(5.0))
+    readings.add("temperature/CH1", [pd.Timestamp("2024-01-01 00:00:05")], [5.0])
+    assert readings.buffers["temperature/CH1"].arrays()[1].tolist() == [3.0, 4.0, 5.0]
+    assert readings.metrics("temperature/CH1")['count'] == 3
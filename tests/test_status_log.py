@@ -0,0 +1,43 @@
+import pandas as pd
+
+from status_log import StatusTailer, parse_status_lines, read_status
+
+LINES = [
+    b"22-07-20,00:00:00,1,v1,0,v2,1,scroll1,1",
+    b"22-07-20,00:01:00,1,v1,1,v2,1,scroll1,1",
+    b"22-07-20,00:02:00,1,v1,1,turbo1,2,v2,0",  # scroll1 gone, turbo1 added, order changed
+    b"22-07-20,00:03:00,1,v1,0,v2,0,scroll1,0,turbo1,3",
+]
+
+
+def test_lines_with_different_names_are_aligned_by_name():
+    df = parse_status_lines(b"\n".join(LINES))
+    assert list(df.columns) == ['timestamp', 'v1', 'v2', 'scroll1', 'turbo1']
+    assert df['timestamp'].tolist() == list(pd.date_range("2022-07-20", periods=4, freq="min"))
+    assert df['v1'].dtype == bool and df['v1'].tolist() == [False, True, True, False]
+    assert df['v2'].tolist() == [True, True, False, False]
+    assert str(df['scroll1'].dtype) == 'boolean'
+    assert df['scroll1'].tolist() == [True, True, pd.NA, False]
+    assert str(df['turbo1'].dtype) == 'Int64'
+    assert df['turbo1'].tolist() == [pd.NA, pd.NA, 2, 3]
+
+
+def test_blocks_split_where_the_names_change(tmp_path):
+    log = tmp_path / "Channels 22-07-20.log"
+    log.write_bytes(b"\n".join(LINES) + b"\n")
+    whole = parse_status_lines(b"\n".join(LINES))
+    in_blocks = read_status(str(log), chunk_bytes=50)  # About one line per block
+    pd.testing.assert_frame_equal(in_blocks[whole.columns], whole)
+
+
+def test_tailer_reports_changes_across_name_changes(tmp_path):
+    log = tmp_path / "Channels 22-07-20.log"
+    log.write_bytes(b"\n".join(LINES[:2]) + b"\n" + LINES[2][:10])  # Third line still being written
+    tailer = StatusTailer(str(log))
+    assert len(tailer.changes()) == 2
+
+    with open(log, 'ab') as f:
+        f.write(LINES[2][10:] + b"\n" + LINES[3] + b"\n")
+    changes = tailer.changes()
+    assert changes['timestamp'].dt.minute.tolist() == [2, 3]
+    assert changes['turbo1'].tolist() == [2, 3]
@@ -0,0 +1,62 @@
+import pytest
+
+
+FRIDGE = {
+    "a": {"timestamp": "2024-01-01 00:00:03", "value": 3},
+    "b": {"timestamp": "2024-01-01 00:00:01", "value": 1},
+    "c": {"timestamp": "2024-01-01 00:00:02", "value": 2},
+    "d": {"timestamp": "2024-01-01 00:00:05", "value": 5},
+    "e": {"value": 0},  # No timestamp: sorts first
+}
+
+
+def query(local_database):
+    ref = local_database.child("fridge")
+    ref.set(FRIDGE)
+    return ref.order_by_child("timestamp")
+
+
+def test_order_by_child_sorts_missing_values_first(local_database):
+    assert list(query(local_database).get()) == ["e", "b", "c", "a", "d"]
+
+
+def test_start_at_and_end_at_are_inclusive(local_database):
+    result = query(local_database).start_at("2024-01-01 00:00:02").end_at("2024-01-01 00:00:03").get()
+    assert list(result) == ["c", "a"]
+    assert result["a"] == FRIDGE["a"]
+
+
+def test_end_at_excludes_children_without_the_value(local_database):
+    assert list(query(local_database).end_at("2024-01-01 00:00:02").get()) == ["b", "c"]
+
+
+def test_limit_to_first(local_database):
+    assert list(query(local_database).limit_to_first(2).get()) == ["e", "b"]
+    assert list(query(local_database).start_at("2024-01-01 00:00:02").limit_to_first(2).get()) == ["c", "a"]
+
+
+def test_limit_to_last(local_database):
+    assert list(query(local_database).limit_to_last(2).get()) == ["a", "d"]
+    assert list(query(local_database).limit_to_last(5).get()) == ["e", "b", "c", "a", "d"]  # Needs the missing one
+    assert list(query(local_database).end_at("2024-01-01 00:00:03").limit_to_last(1).get()) == ["a"]
+
+
+def test_update_rejects_forbidden_characters(local_database):
+    local_database.set({"fridge": {"a": 1}})
+    for values in ({"fridge/b.c": 1}, {"fridge/b": {"P1 (mbar)/s": 1}}, {"fridge/b": {"c": {"d#": 1}}}):
+        with pytest.raises(ValueError):
+            local_database.update(values)
+    with pytest.raises(ValueError):
+        local_database.child("fridge").set({"x[0]": 1})
+    assert local_database.get() == {"fridge": {"a": 1}}
+
+
+def test_update_rejects_overlapping_paths(local_database):
+    local_database.set({"fridge": {"a": {"b": 1}}})
+    with pytest.raises(ValueError):
+        local_database.update({"fridge/a": {"b": 2}, "fridge/a/c": 3})
+    with pytest.raises(ValueError):
+        local_database.child("fridge").update({"a/c": 3, "/a/c/": 4})
+    assert local_database.get() == {"fridge": {"a": {"b": 1}}}
+    local_database.update({"fridge/a/b": 2, "fridge/ab": 3, "fridge/a!": 4})  # Siblings only
+    assert local_database.get() == {"fridge": {"a": {"b": 2}, "ab": 3, "a!": 4}}
@@ -0,0 +1,52 @@
+import pytest
+
+import upload_all_logs
+from benchmarks.generators import write_bluefors_logs
+from db_writer import BatchWriter
+from manifest import UploadManifest
+
+
+class NoSnapshot:
+    """Stands in for LatestSnapshot without a database."""
+
+    def newer(self, payloads):
+        return payloads
+
+
+@pytest.fixture
+def log_date(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_all_logs, 'PC_NAME', 'test')
+    monkeypatch.setattr(upload_all_logs, 'get_fridge_type', lambda pc_name: "BlueFors")
+    monkeypatch.setattr(upload_all_logs, 'LatestSnapshot', lambda pc: NoSnapshot())
+    monkeypatch.setenv("PARQUET_CACHE", "0")
+    return write_bluefors_logs(str(tmp_path / "logs"), duration=3600, interval=10.0)[0]
+
+
+def test_failed_batch_does_not_advance_manifest(tmp_path, log_date, flaky_ref):
+    manifest = UploadManifest(str(tmp_path / "manifest.sqlite"))
+    ref = flaky_ref(failures=1)
+    writer = BatchWriter(ref=ref, batch_size=500)
+    upload_all_logs.upload_single_day_data(str(tmp_path / "logs"), log_date, writer, manifest)
+
+    assert writer.failed_batches
+    assert manifest.get_source('test', log_date) == {}
+
+    # The next run uploads the file again instead of skipping it as unchanged
+    upload_all_logs.upload_single_day_data(str(tmp_path / "logs"), log_date, writer, manifest)
+    recorded = manifest.get_source('test', log_date)
+    assert recorded[('temperature', 'CH1')]['last_timestamp'].endswith("00:59:51")
+    assert len([path for path in ref.data if path.startswith(f"test/{log_date}/temperature/CH1/")]) == 360
+
+
+def test_batches_status_tracks_each_range(flaky_ref):
+    writer = BatchWriter(ref=flaky_ref(failures=1), batch_size=2, max_workers=2)
+    first = writer.next_batch()
+    writer.set("a/1", 1)
+    writer.set("a/2", 2)  # Fills batch 0, which fails
+    writer.set("b/1", 1)
+    assert writer.last_batch() == 1
+    assert writer.batches_status(1, 1) is None  # Still pending
+    writer.close()
+    assert writer.batches_status(first, 0) is False
+    assert writer.batches_status(1, 1) is True
+    assert writer.batches_status(2, 1) is True  # A file with no writes
@@ -1,14 +1,20 @@
 import datetime
 import os
 import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
-import firebase_admin
-import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
-from firebase_admin import credentials, db
 
+from chunks import serialize_chunks_bluefors, serialize_chunks_triton, storage_layout
+from date_index import serialize_index_bluefors, serialize_index_triton
+from latest import LatestSnapshot, serialize_latest_bluefors, serialize_latest_triton
+from db_writer import BatchWriter, PayloadCollector
+from manifest import UploadManifest, file_fingerprint
 from reader import BlueForsLogReader, TritonLogReader  # Import both readers
+from rollups import rollups_enabled, serialize_rollups_bluefors, serialize_rollups_triton
+from serializers import TIMESTAMP_FORMAT, serialize_bluefors, serialize_triton, triton_timestamps
+from storage import init_storage
 
 # --- Configuration ---
 load_dotenv()
@@ -17,10 +23,17 @@ DATABASE_URL = os.getenv('DB_URL')
 PC_NAME = os.getenv('PC_NAME')
 LOGS_PARENT_DIRECTORY = os.getenv('LOGFILE_DIR', 'logs')  # Default value
 FRIDGE_TYPE = os.getenv("FRIDGE_TYPE", "BlueFors")
-
-# --- Firebase Setup ---
-cred = credentials.Certificate(CREDENTIALS_FILE)
-firebase_admin.initialize_app(cred, {'databaseURL': DATABASE_URL})
+BACKFILL_PARSE_WORKERS = int(os.getenv("BACKFILL_PARSE_WORKERS", os.cpu_count() or 1))
+BACKFILL_UPLOAD_THREADS = int(os.getenv("BACKFILL_UPLOAD_THREADS", "8"))
+STORAGE_LAYOUT = storage_layout()  # "nodes", "chunks" or "both"; see chunks.py
+ROLLUPS = rollups_enabled()  # Keep min/max/mean/count tiers alongside the raw data; see rollups.py
+
+# --- Database Setup ---
+# Done from __main__ rather than at import, so the backfill worker processes
+# (which import this module) do not connect to the database.
+def init_database():
+    """Connects to Firebase, or the local database if STORAGE_BACKEND=local."""
+    init_storage(CREDENTIALS_FILE, DATABASE_URL)
 
 # --- Helper Function to Determine Fridge Type ---
 def get_fridge_type(pc_name: str) -> str:
@@ -29,231 +42,369 @@ def get_fridge_type(pc_name: str) -> str:
     else:
         return "BlueFors"
 
+BLUEFORS_LOG_TYPES = ["temperature", "pressure", "resistance", "flow_rate", "status"]
+
+def triton_log_date(log_file_name):
+    """Returns the YY-MM-DD date of a Triton log file named like 'log 240119 141920.vcl'."""
+    log_date = log_file_name.replace(" ", "_").replace(".", "_").split('_')[1]
+    return f"{log_date[:2]}-{log_date[2:4]}-{log_date[4:6]}"
+
 # --- Upload Functions ---
 
-def upload_data_bluefors(data, log_date, ref):
-    """Uploads BlueFors data to a given Firebase reference."""
-    for log_type, channels in data.items():
-        if log_type == 'flow_rate':
-            timestamp_str = channels['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-            value = channels['value']
-            ref.child('flow_rate').child(timestamp_str.replace(":", "_").replace(" ", "_")).set({
-                'timestamp': timestamp_str,
-                'value': float(value)
-            })
-        else:
-            for channel, channel_data in channels.items():
-                timestamp_str = channel_data['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-                value = channel_data['value']
-                ref.child(log_type).child(channel).child(timestamp_str.replace(":", "_").replace(" ", "_")).set({
-                    'timestamp': timestamp_str,
-                    'value': float(value),
-                    'channel': channel  # Include channel here
-                })
-
-def upload_data_triton(data_df, log_file_name, ref):
+def upload_data_triton(data_df, base_path, writer):
     """Uploads Triton data (entire DataFrame) to Firestore, filtering zeros."""
-
-    # Iterate through DataFrame rows
-    for index, row in data_df.iterrows():
-        try:
-            # Correctly handle the 'Time(secs)' column and convert to datetime
-            timestamp_secs = row['Time(secs)']
-            if not isinstance(timestamp_secs, (int, float, np.number)):
-                print(f"Skipping row with invalid timestamp: {timestamp_secs}")
+    payloads = serialize_triton(data_df, base_path) if STORAGE_LAYOUT != "chunks" else {}
+    if STORAGE_LAYOUT != "nodes":
+        payloads.update(serialize_chunks_triton(data_df, base_path))
+    if not payloads:
+        print("No non-zero data to upload (besides timestamp).")
+    writer.update(payloads)
+
+# --- Upload Manifest ---
+
+def bluefors_manifest_keys():
+    """Returns the (log_type, channel) manifest keys of a BlueFors date, one per log file."""
+    keys = []
+    for log_type in BLUEFORS_LOG_TYPES:
+        if log_type in ["temperature", "pressure", "resistance"]:
+            keys.extend((log_type, f"CH{channel}") for channel in range(1, 7))
+        else:
+            keys.append((log_type, ''))
+    return keys
+
+def changed_files(manifest, source, files):
+    """Compares {(log_type, channel): file_path} against the manifest.
+
+    Returns {(log_type, channel): (watermark, fingerprint)} for the files that
+    exist and changed since their last completed upload.
+    """
+    recorded = manifest.get_source(PC_NAME, source)
+    changed = {}
+    for key, file_path in files.items():
+        fingerprint = file_fingerprint(file_path)
+        if fingerprint is None:
+            continue
+        row = recorded.get(key)
+        if row and (row['size'], row['mtime']) == fingerprint:
+            continue
+        changed[key] = (row['last_timestamp'] if row else None, fingerprint)
+    return changed
+
+def bluefors_files(log_reader, log_date):
+    return {(log_type, channel): log_reader.get_file_path(log_date, log_type, channel[2:] or None)
+            for log_type, channel in bluefors_manifest_keys()}
+
+def after_watermarks(timestamps, channels, log_type, watermarks):
+    """Returns a mask of the rows of listed channels newer than their channel's watermark."""
+    limits = {channel: pd.Timestamp(watermark) if watermark else pd.Timestamp.min
+              for (watermark_type, channel), watermark in watermarks.items() if watermark_type == log_type}
+    return timestamps > pd.to_datetime(channels.map(limits))
+
+def record_uploaded(manifest, source, changed, uploaded):
+    """Advances the manifest for the files of one date or Triton file after its writes succeeded."""
+    for (log_type, channel), (watermark, fingerprint) in changed.items():
+        manifest.record(PC_NAME, source, log_type, channel, uploaded.get((log_type, channel), watermark), fingerprint)
+
+def upload_triton_file(log_file_path, base_path, writer, watermark=None, latest=None):
+    """Uploads the records of one Triton .vcl file newer than watermark (all by default).
+
+    The latest snapshot is written through latest (a LatestSnapshot) when
+    given, so it only moves forward; without one, it is written as is. Returns {('triton', ''): timestamp of the last record}.
+    """
+    reader = TritonLogReader(log_file_path)
+    full_df = data_df = reader.get_df()  # Get the ENTIRE DataFrame
+    new_rows = None
+    if watermark:
+        # Keys have one-second resolution, so skip the whole watermark second
+        watermark_secs = datetime.datetime.strptime(watermark, TIMESTAMP_FORMAT).timestamp()
+        new_rows = (data_df['Time(secs)'] >= watermark_secs + 1).to_numpy()
+        data_df = data_df[new_rows]
+    if not full_df.empty:
+        # Recomputed even with nothing new, so files uploaded by the monitor get an exact entry
+        writer.update(serialize_index_triton(full_df, base_path, os.path.basename(log_file_path)))
+    if not data_df.empty: # Check if not empty.
+        upload_data_triton(data_df, base_path, writer) # Pass the dataframe.
+        if ROLLUPS:
+            # From the whole file, so the bucket the watermark falls in is rewritten complete
+            writer.update(serialize_rollups_triton(full_df, base_path, new_rows))
+        snapshot = serialize_latest_triton(data_df, PC_NAME)
+        writer.update(latest.newer(snapshot) if latest else snapshot)
+        last_timestamp = triton_timestamps([data_df['Time(secs)'].max()])[0].strftime(TIMESTAMP_FORMAT)
+        return {('triton', ''): last_timestamp}
+    print("No data to upload.")
+    return {}
+
+def upload_bluefors_date(log_reader, log_date, base_path, writer, watermarks=None, latest=None):
+    """Uploads every BlueFors log type for one date directory.
+
+    With watermarks ({(log_type, channel): timestamp or None}), only the listed
+    files are uploaded, and only their rows after the timestamp. The latest
+    snapshot is written as in upload_triton_file. Returns
+    {(log_type, channel): timestamp of the last row read}.
+    """
+    uploaded = {}
+    for log_type in BLUEFORS_LOG_TYPES:
+        if watermarks is not None and not any(key[0] == log_type for key in watermarks):
+            continue
+        df = log_reader.get_logs(log_date, log_type)
+        if df.empty:
+            print(f"  No {log_type} data for {log_date}")
+            continue
+
+        if log_type in ["temperature", "pressure", "resistance"]:
+            channels = "CH" + df['channel'].astype(str)
+        else:
+            channels = pd.Series('', index=df.index)
+        full_df, new_rows = df, None
+        # Recomputed even with nothing new, so dates uploaded by the monitor get an exact entry
+        writer.update(serialize_index_bluefors(full_df, log_type, base_path))
+        if watermarks is not None:
+            new_rows = after_watermarks(df['timestamp'], channels, log_type, watermarks)
+            df = df[new_rows]
+            if df.empty:
                 continue
+        for channel, last_timestamp in df['timestamp'].groupby(channels[df.index]).max().items():
+            uploaded[(log_type, channel)] = last_timestamp.strftime(TIMESTAMP_FORMAT)
+
+        print(f"  Uploading {log_type} data...")
+        # Status is not numeric, so it stays one node per sample in every layout
+        if STORAGE_LAYOUT != "chunks" or log_type == "status":
+            writer.update(serialize_bluefors(df, log_type, base_path))
+        if STORAGE_LAYOUT != "nodes":
+            writer.update(serialize_chunks_bluefors(df, log_type, base_path))
+        if ROLLUPS:
+            # From the whole file, so the bucket the watermark falls in is rewritten complete
+            writer.update(serialize_rollups_bluefors(full_df, log_type, base_path, new_rows))
+        snapshot = serialize_latest_bluefors(df, log_type, PC_NAME)
+        writer.update(latest.newer(snapshot) if latest else snapshot)
+    return uploaded
+
+def source_base_path(fridge_type, name):
+    """Returns the database path of a BlueFors date directory or Triton file."""
+    return f'{PC_NAME}/{triton_log_date(name) if fridge_type == "Oxford" else name}'
+
+def source_files(fridge_type, parent_dir, name):
+    """Returns {(log_type, channel): file_path} of a BlueFors date directory or Triton file."""
+    if fridge_type == "Oxford":
+        return {('triton', ''): os.path.join(parent_dir, name)}
+    return bluefors_files(BlueForsLogReader(parent_dir), name)
 
-            timestamp_datetime = datetime.datetime.fromtimestamp(timestamp_secs)
-            timestamp_str = timestamp_datetime.strftime('%Y-%m-%d %H:%M:%S')
-        except (ValueError, TypeError) as e:
-            print(f"Error converting timestamp for row {index}: {e}")
-            continue  # Skip to the next row if timestamp conversion fails
-
-        data_to_upload = {'timestamp': timestamp_str}
-
-        for col in data_df.columns:
-            if col != 'Time(secs)':  # Correctly check against 'Time(secs)'
-                value = row[col]
-                if isinstance(value, (int, float, str, bool)):
-                    # Filter out zero values (and non-numeric values)
-                    if isinstance(value, (int, float)) and value == 0:
-                        continue  # Skip zero values
-                    data_to_upload[col] = value
-                elif isinstance(value, np.number):
-                    #Filter out zero values
-                    if float(value) == 0:
-                        continue
-                    data_to_upload[col] = float(value)
-                else:
-                    try:
-                        data_to_upload[col] = str(value)
-                    except:
-                        print(f"Could not convert value for {col} to string. Skipping.")
-        if len(data_to_upload) > 1:  # if more than only timestamp
-            ref.child(timestamp_str.replace(":", "_").replace(" ", "_")).set(data_to_upload)
-        else:
-            print("No non-zero data to upload (besides timestamp).")
+def upload_source(fridge_type, parent_dir, name, base_path, writer, watermarks=None, latest=None):
+    """Uploads one BlueFors date directory or Triton file; see upload_bluefors_date."""
+    if fridge_type == "Oxford":
+        return upload_triton_file(os.path.join(parent_dir, name), base_path, writer,
+                                  watermarks.get(('triton', '')) if watermarks else None, latest)
+    return upload_bluefors_date(BlueForsLogReader(parent_dir), name, base_path, writer, watermarks, latest)
+
+def upload_with_manifest(fridge_type, parent_dir, name, writer, manifest=None, latest=None):
+    """Uploads one date directory or file, sending only what the manifest has not seen."""
+    base_path = source_base_path(fridge_type, name)
+    if manifest is None:
+        upload_source(fridge_type, parent_dir, name, base_path, writer, latest=latest)
+        return
+    changed = changed_files(manifest, name, source_files(fridge_type, parent_dir, name))
+    if not changed:
+        print(f"  {name} is unchanged since the last upload, skipping")
+        return
+    uploaded = upload_source(fridge_type, parent_dir, name, base_path, writer,
+                             {key: watermark for key, (watermark, _) in changed.items()}, latest)
+    # flush() also reports the batches that failed while upload_source was queueing
+    if writer.flush():
+        record_uploaded(manifest, name, changed, uploaded)
+    else:
+        print(f"  Some writes of {name} failed; it will be uploaded again next time")
 
-def upload_all_data(parent_dir):
-    """Uploads all log entries from all dates/files in the parent directory."""
+def list_sources(fridge_type, parent_dir):
+    """Returns the Triton .vcl files or BlueFors date directories in parent_dir."""
+    if fridge_type == "Oxford":
+        return [log_file for log_file in sorted(os.listdir(parent_dir)) if log_file.endswith(".vcl")]
+    return [log_date for log_date in sorted(os.listdir(parent_dir))
+            if os.path.isdir(os.path.join(parent_dir, log_date))]
+
+def upload_all_data(parent_dir, writer=None, manifest=None):
+    """Uploads all log entries from all dates/files in the parent directory.
+
+    With a manifest, files unchanged since their last upload are skipped and
+    only rows newer than the recorded watermark are sent.
+    """
     fridge_type = get_fridge_type(PC_NAME)
+    writer = writer or BatchWriter()
+    latest = LatestSnapshot(PC_NAME)
 
-    if fridge_type == "Oxford":
-        log_reader = TritonLogReader
-        for log_file in os.listdir(parent_dir):
-            if log_file.endswith(".vcl"):
-                log_file_path = os.path.join(parent_dir, log_file)
-                print(f"Processing log file: {log_file}")
-                log_date = log_file.replace(" ", "_").replace(".", "_").split('_')[1]
-                log_date = f"{log_date[:2]}-{log_date[2:4]}-{log_date[4:6]}"
-                ref = db.reference(f'/{PC_NAME}/{log_date}')
-
-                try:
-                    reader = log_reader(log_file_path)
-                    data_df = reader.get_df()  # Get the ENTIRE DataFrame
-                    if not data_df.empty: # Check if not empty.
-                        upload_data_triton(data_df, log_file, ref) # Pass the dataframe.
-                except Exception as e:
-                    print(f"Error processing {log_file}: {e}")
+    for name in list_sources(fridge_type, parent_dir):
+        print(f"Processing {'log file' if fridge_type == 'Oxford' else 'log date'}: {name}")
+        try:
+            upload_with_manifest(fridge_type, parent_dir, name, writer, manifest, latest)
+        except Exception as e:
+            print(f"Error processing {name}: {e}")
 
-    else:  # Assume BlueFors
-        log_reader = BlueForsLogReader(parent_dir)
-        for log_date in os.listdir(parent_dir):
-            log_date_path = os.path.join(parent_dir, log_date)
-            if not os.path.isdir(log_date_path):
-                continue
+    writer.flush()
+    writer.report()
 
-            print(f"Processing log date: {log_date}")
-            ref = db.reference(f'/{PC_NAME}/{log_date}')
-
-            for log_type in ["temperature", "pressure", "resistance", "flow_rate", "status"]:
-                df = log_reader.get_logs(log_date, log_type)
-                if df.empty:
-                    print(f"  No {log_type} data for {log_date}")
-                    continue
-
-                print(f"  Uploading {log_type} data...")
-                if log_type in ["temperature", "pressure", "resistance"]:
-                    for channel in range(1, 7):
-                        channel_data = df[df['channel'] == channel]
-                        if channel_data.empty:
-                            continue
-
-                        for _, row in channel_data.iterrows():
-                            timestamp_str = row['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-                            value = row['value']
-                            ref.child(log_type).child(f"CH{channel}").child(timestamp_str.replace(":", "_").replace(" ", "_")).set({
-                                'timestamp': timestamp_str,
-                                'value': float(value),
-                                'channel': f"CH{channel}"
-                            })
-                elif log_type == "flow_rate":
-                    for _, row in df.iterrows():
-                        timestamp_str = row['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-                        value = row['flow_rate']
-                        ref.child('flow_rate').child(timestamp_str.replace(":", "_").replace(" ", "_")).set({
-                            'timestamp': timestamp_str,
-                            'value': float(value)
-                        })
-                elif log_type == "status":
-                    for _, row in df.iterrows():
-                        timestamp_str = row['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-                        data_to_upload = {'timestamp': timestamp_str}
-                        for col in df.columns:
-                            if col != 'timestamp':
-                                data_to_upload[col] = row[col]
-                        ref.child('status').child(timestamp_str.replace(":", "_").replace(" ", "_")).set(data_to_upload)
-
-def upload_single_day_data(parent_dir, log_date):
+def upload_single_day_data(parent_dir, log_date, writer=None, manifest=None):
     """Uploads data for a single day (or file, for Triton)."""
     fridge_type = get_fridge_type(PC_NAME)
-    # Sanitize the log_date for Firebase *before* creating the reference.
-    if fridge_type == "Oxford":
-      sanitized_log_date = log_date.replace(" ", "_").replace(".", "_").split('_')[1]
-      sanitized_log_date = f"{sanitized_log_date[:2]}-{sanitized_log_date[2:4]}-{sanitized_log_date[4:6]}"
-    else: #bluefors
-      sanitized_log_date = log_date
-    ref = db.reference(f'/{PC_NAME}/{sanitized_log_date}')
+    writer = writer or BatchWriter()
 
     if fridge_type == "Oxford":
-        log_reader = TritonLogReader
         log_file_path = os.path.join(parent_dir, log_date)  # log_date is filename
         if not log_file_path.endswith(".vcl") or not os.path.isfile(log_file_path):
             print(f"Invalid file or file not found: {log_file_path}")
             return
-
         print(f"Processing log file: {log_date}")
-
-        try:
-            reader = log_reader(log_file_path)
-            data_df = reader.get_df()  # Get the entire DataFrame
-            if not data_df.empty: #check if not empty
-                upload_data_triton(data_df, log_date, ref) # Pass whole dataframe
-            else:
-                print("No data to upload.")
-
-        except Exception as e:
-            print(f"Error processing {log_date}: {e}")
-
     else:  # Assume BlueFors
-        log_reader = BlueForsLogReader(parent_dir)
         log_date_path = os.path.join(parent_dir, log_date)
         if not os.path.isdir(log_date_path):
             print(f"Invalid log date directory: {log_date_path}")
             return
-
         print(f"Processing log date: {log_date}")
 
-        for log_type in ["temperature", "pressure", "resistance", "flow_rate", "status"]:
-            df = log_reader.get_logs(log_date, log_type)
-            if df.empty:
-                print(f"  No {log_type} data for {log_date}")
-                continue
+    try:
+        upload_with_manifest(fridge_type, parent_dir, log_date, writer, manifest, LatestSnapshot(PC_NAME))
+    except Exception as e:
+        print(f"Error processing {log_date}: {e}")
+
+    writer.flush()
+    writer.report()
+
+# --- Parallel Backfill ---
+
+def collect_payloads(fridge_type, parent_dir, name, base_path, watermarks=None):
+    """Parses one BlueFors date directory or Triton file into {path: value} payloads.
+
+    Runs in a worker process of upload_all_data_parallel, so it returns the error
+    message instead of raising.
+    """
+    payloads = PayloadCollector()
+    try:
+        uploaded = upload_source(fridge_type, parent_dir, name, base_path, payloads, watermarks)
+    except Exception as e:
+        return name, payloads, {}, f"{e}"
+    return name, payloads, uploaded, None
+
+class BackfillProgress:
+    """Prints files remaining, upload throughput and ETA of a parallel backfill."""
+
+    def __init__(self, files_total, writer, interval=5.0):
+        self.files_total = files_total
+        self.files_done = 0
+        self.writer = writer
+        self.interval = interval
+        self.start_time = time.monotonic()
+        self.last_print_time = self.start_time
+
+    def file_done(self):
+        self.files_done += 1
+
+    def print_progress(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_print_time < self.interval:
+            return
+        self.last_print_time = now
+        elapsed = now - self.start_time
+        remaining = self.files_total - self.files_done
+        eta = elapsed / self.files_done * remaining if self.files_done else float('nan')
+        print(f"[{elapsed:7.0f} s] {self.files_done}/{self.files_total} files done, {remaining} remaining, "
+              f"{self.writer.points_sent} points sent ({self.writer.points_sent / max(elapsed, 1e-9):.0f} points/s), "
+              f"ETA {eta:.0f} s")
+
+def record_confirmed(manifest, writer, awaiting, changed_by_name):
+    """Advances the manifest for the files whose batches have all been sent; returns the files still waiting.
+
+    Batches mix the writes of consecutive files, so each file is tracked by
+    its range of batch numbers instead of waiting for every batch in flight.
+    """
+    still_waiting = []
+    for name, uploaded, first_batch, last_batch in awaiting:
+        status = writer.batches_status(first_batch, last_batch)
+        if status is None:
+            still_waiting.append((name, uploaded, first_batch, last_batch))
+        elif status:
+            record_uploaded(manifest, name, changed_by_name[name], uploaded)
+        else:
+            print(f"Some writes of {name} failed; it will be uploaded again next time")
+    return still_waiting
+
+def upload_all_data_parallel(parent_dir, parse_workers=None, upload_threads=None, manifest=None):
+    """Uploads all log entries like upload_all_data, parsing and uploading concurrently.
+
+    Each BlueFors date directory or Triton .vcl file is parsed in its own task on a
+    pool of parse_workers processes, and the batches are sent from upload_threads
+    threads. Both default to the BACKFILL_PARSE_WORKERS / BACKFILL_UPLOAD_THREADS
+    environment variables.
+    """
+    parse_workers = parse_workers or BACKFILL_PARSE_WORKERS
+    upload_threads = upload_threads or BACKFILL_UPLOAD_THREADS
+    fridge_type = get_fridge_type(PC_NAME)
 
-            print(f"  Uploading {log_type} data...")
-            if log_type in ["temperature", "pressure", "resistance"]:
-                for channel in range(1, 7):
-                    channel_data = df[df['channel'] == channel]
-                    if channel_data.empty:
-                        continue
-
-                    for _, row in channel_data.iterrows():
-                        timestamp_str = row['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-                        value = row['value']
-                        ref.child(log_type).child(f"CH{channel}").child(timestamp_str.replace(":", "_").replace(" ", "_")).set({
-                            'timestamp': timestamp_str,
-                            'value': float(value),
-                            'channel': f"CH{channel}"
-                        })
-            elif log_type == "flow_rate":
-                for _, row in df.iterrows():
-                    timestamp_str = row['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-                    value = row['flow_rate']
-                    ref.child('flow_rate').child(timestamp_str.replace(":", "_").replace(" ", "_")).set({
-                        'timestamp': timestamp_str,
-                        'value': float(value)
-                    })
-            elif log_type == "status":
-                for _, row in df.iterrows():
-                    timestamp_str = row['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-                    data_to_upload = {'timestamp': timestamp_str}
-                    for col in df.columns:
-                        if col != 'timestamp':
-                            data_to_upload[col] = row[col]
-                    ref.child('status').child(timestamp_str.replace(":", "_").replace(" ", "_")).set(data_to_upload)
+    tasks = []
+    changed_by_name = {}
+    for name in list_sources(fridge_type, parent_dir):
+        watermarks = None
+        if manifest is not None:
+            changed_by_name[name] = changed_files(manifest, name, source_files(fridge_type, parent_dir, name))
+            if not changed_by_name[name]:
+                continue
+            watermarks = {key: watermark for key, (watermark, _) in changed_by_name[name].items()}
+        tasks.append((name, source_base_path(fridge_type, name), watermarks))
+
+    writer = BatchWriter(max_workers=upload_threads)
+    awaiting = []  # (name, uploaded, first batch, last batch) of the files whose batches are not all confirmed
+    latest = LatestSnapshot(PC_NAME)  # The workers can't read the database; their snapshot writes are checked here
+    progress = BackfillProgress(len(tasks), writer)
+    print(f"Backfilling {len(tasks)} files with {parse_workers} parse processes and {upload_threads} upload threads")
+
+    with ProcessPoolExecutor(parse_workers) as pool:
+        pending_tasks = iter(tasks)
+        running = set()
+
+        def submit_next():
+            task = next(pending_tasks, None)
+            if task is not None:
+                running.add(pool.submit(collect_payloads, fridge_type, parent_dir, *task))
+
+        # Keep a bounded number of parsed files waiting for upload
+        for _ in range(2 * parse_workers):
+            submit_next()
+        while running:
+            done, running = wait(running, timeout=progress.interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, payloads, uploaded, error = future.result()
+                if error:
+                    print(f"Error processing {name}: {error}")
+                first_batch = writer.next_batch()
+                for path, value in latest.newer(payloads).items():
+                    writer.set(path, value)
+                if manifest is not None and not error:
+                    awaiting.append((name, uploaded, first_batch, writer.last_batch()))
+                progress.file_done()
+                submit_next()
+            awaiting = record_confirmed(manifest, writer, awaiting, changed_by_name)
+            progress.print_progress()
+
+    writer.close()
+    record_confirmed(manifest, writer, awaiting, changed_by_name)
+    progress.print_progress(force=True)
+    writer.report()
 
 def main():
+    # Skips files and rows that were already uploaded; pass manifest=None to resend everything
+    manifest = UploadManifest()
+
     # Example Usage (choose one):
 
     # 1. Upload all data:
-    # upload_all_data(LOGS_PARENT_DIRECTORY)
+    # upload_all_data(LOGS_PARENT_DIRECTORY, manifest=manifest)
+    # or, parsing and uploading in parallel:
+    # upload_all_data_parallel(LOGS_PARENT_DIRECTORY, manifest=manifest)
 
     # 2. Upload data for a single day (BlueFors):
-    #upload_single_day_data(LOGS_PARENT_DIRECTORY, "22-07-21")
+    #upload_single_day_data(LOGS_PARENT_DIRECTORY, "22-07-21", manifest=manifest)
 
     # 3. Upload data for a single day (Oxford):
-    upload_single_day_data(LOGS_PARENT_DIRECTORY, "log 240119 141920.vcl") #Pass filename for Oxford
+    upload_single_day_data(LOGS_PARENT_DIRECTORY, "log 240119 141920.vcl", manifest=manifest) #Pass filename for Oxford
     print("Data upload complete.")
 
 if __name__ == "__main__":
+    init_database()
     main()
\ No newline at end of file
@@ -0,0 +1,174 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+def _scan(paths):
+    """Returns {file_path: (size, mtime)} for watched files and the files in watched directories."""
+    fingerprints = {}
+    for path in paths:
+        if os.path.isdir(path):
+            try:
+                entries = [entry for entry in os.scandir(path) if entry.is_file()]
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                fingerprints[entry.path] = (stat.st_size, stat.st_mtime)
+        else:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            fingerprints[path] = (stat.st_size, stat.st_mtime)
+    return fingerprints
+
+
+class PollingWatcher:
+    """Detects file changes by comparing size/mtime every `interval` seconds.
+
+    Works everywhere; used when inotify is not available (e.g. on Windows).
+    """
+
+    def __init__(self, interval=1.0, debounce=0.2):
+        self.interval = interval
+        self.debounce = debounce
+        self.paths = []
+        self._fingerprints = {}
+
+    def watch(self, paths):
+        """Watches these files and directories (non-recursively) instead of the previous ones."""
+        paths = [os.path.abspath(path) for path in paths]
+        if paths != self.paths:
+            self.paths = paths
+            self._fingerprints = _scan(paths)
+
+    def _changes(self):
+        fingerprints = _scan(self.paths)
+        changed = {path: fingerprint[1] for path, fingerprint in fingerprints.items()
+                   if self._fingerprints.get(path) != fingerprint}
+        self._fingerprints = fingerprints
+        return changed
+
+    def wait(self, timeout):
+        """Blocks until watched files change or timeout seconds pass.
+
+        Returns {file_path: mtime} of the changed files, empty on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            changed = self._changes()
+            if changed:
+                # Let a burst of writes settle so it is handled once
+                time.sleep(self.debounce)
+                for path, mtime in self._changes().items():
+                    changed[path] = mtime
+                return changed
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return {}
+            time.sleep(min(self.interval, remaining))
+
+
+class InotifyWatcher:
+    """Detects file changes with Linux inotify, so writes are seen as they happen.
+
+    A burst of events is debounced: wait() returns once no event arrived for
+    `debounce` seconds, or `max_delay` seconds after the first event.
+    """
+
+    def __init__(self, debounce=0.2, max_delay=0.8):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.paths = []
+        self._watches = {}  # wd -> watched path
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def watch(self, paths):
+        """Watches these files and directories (non-recursively) instead of the previous ones."""
+        paths = [os.path.abspath(path) for path in paths]
+        if paths == self.paths:
+            return
+        for wd in list(self._watches):
+            self._libc.inotify_rm_watch(self._fd, wd)
+        self._watches = {}
+        for path in paths:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path),
+                                              IN_MODIFY | IN_CLOSE_WRITE | IN_CREATE | IN_MOVED_TO)
+            if wd < 0:
+                print(f"Cannot watch {path}: {os.strerror(ctypes.get_errno())}")
+                continue
+            self._watches[wd] = path
+        self.paths = paths
+
+    def _read_events(self, changed):
+        try:
+            buffer = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(buffer):
+            wd, _, _, name_length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = buffer[offset:offset + name_length].rstrip(b'\0')
+            offset += name_length
+            watched_path = self._watches.get(wd)
+            if watched_path is None:
+                continue
+            path = os.path.join(watched_path, os.fsdecode(name)) if name else watched_path
+            changed[path] = None
+
+    def wait(self, timeout):
+        """Blocks until watched files change or timeout seconds pass.
+
+        Returns {file_path: mtime} of the changed files, empty on timeout.
+        """
+        changed = {}
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return changed
+        first_event_time = time.monotonic()
+        self._read_events(changed)
+        while True:
+            remaining = first_event_time + self.max_delay - time.monotonic()
+            if remaining <= 0 or not select.select([self._fd], [], [], min(self.debounce, remaining))[0]:
+                break
+            self._read_events(changed)
+        for path in list(changed):
+            try:
+                changed[path] = os.stat(path).st_mtime
+            except OSError:
+                del changed[path]
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+def create_watcher(poll_interval=1.0):
+    """Returns an InotifyWatcher where inotify is available, a PollingWatcher otherwise."""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError, TypeError) as e:
+            print(f"inotify unavailable ({e}), polling for changes instead")
+    return PollingWatcher(poll_interval)